@@ -0,0 +1,66 @@
+"""Compare two benchmark result files and flag regressions.
+
+python benchmarks/compare.py baseline.json current.json --threshold 0.2
+
+Exits non-zero if any metric got worse by more than the threshold. Metrics
+ending in _per_s are better when higher, everything else is a cost.
+"""
+
+import argparse
+import json
+import sys
+
+# Bookkeeping values that aren't performance measurements
+IGNORED = {"count", "machines"}
+
+
+def flatten(results: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool) and key not in IGNORED:
+            flat[name] = float(value)
+    return flat
+
+
+def change(name: str, before: float, after: float) -> float:
+    """Relative change where positive always means worse"""
+    if before == 0:
+        return 0.0
+    delta = (after - before) / before
+    return -delta if name.endswith("_per_s") else delta
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Relative change counted as a regression")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = flatten(json.load(f)["results"])
+    with open(args.current) as f:
+        current = flatten(json.load(f)["results"])
+
+    regressions = []
+    print(f"{'metric':<58}{'baseline':>14}{'current':>14}{'change':>10}")
+    for name in sorted(baseline.keys() & current.keys()):
+        worse = change(name, baseline[name], current[name])
+        flag = ""
+        if worse > args.threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        elif worse < -args.threshold:
+            flag = "  improved"
+        print(f"{name:<58}{baseline[name]:>14.3f}{current[name]:>14.3f}{worse:>+10.1%}{flag}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
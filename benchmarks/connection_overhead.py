@@ -0,0 +1,64 @@
+"""Per-call SDK overhead for Connection methods, with the network stubbed out.
+
+Measures everything the SDK does around a request (sync wrapper, routing,
+headers) by swapping the API client for one that returns immediately.
+
+    python benchmarks/connection_overhead.py [--calls 100000]
+"""
+
+import argparse
+import asyncio
+import time
+
+from pig import Client, Connection
+
+
+class NullAPIClient:
+    """API client that skips the network entirely"""
+
+    async def get(self, url, headers=None, expect_json=True, coalesce=True):
+        return {"x": 0, "y": 0, "width": 1024, "height": 768}
+
+    async def post(self, url, data=None, headers=None, expect_json=True):
+        return {}
+
+
+def make_connection() -> Connection:
+    client = Client(api_key="SK-bench")
+    client._api_client = NullAPIClient()
+    return Connection(client.machines.get(id="M-BENCH", fetch=False), "C-BENCH")
+
+
+async def bench_aio(conn: Connection, calls: int) -> float:
+    start = time.perf_counter()
+    for i in range(calls):
+        await conn.mouse_move.aio(i, i)
+    return (time.perf_counter() - start) / calls
+
+
+def bench_sync(conn: Connection, calls: int) -> float:
+    start = time.perf_counter()
+    for i in range(calls):
+        conn.mouse_move(i, i)
+    return (time.perf_counter() - start) / calls
+
+
+def run(calls: int) -> dict:
+    conn = make_connection()
+    return {
+        "aio_us_per_call": asyncio.run(bench_aio(conn, calls)) * 1e6,
+        # asyncio.run per call dominates, so fewer iterations are plenty
+        "sync_us_per_call": bench_sync(conn, max(1, calls // 100)) * 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=100_000)
+    args = parser.parse_args()
+    for name, value in run(args.calls).items():
+        print(f"{name:<20} {value:8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Encode/decode cost of each installed JSON codec on typical SDK payloads.
+
+python benchmarks/json_codec.py [--iterations 20000]
+"""
+
+import argparse
+import time
+
+from pig.codec import JSONCodec, MsgspecCodec, OrjsonCodec
+
+# Request bodies sent by Connection input methods
+INPUT_EVENTS = [
+    {"x": 512, "y": 384},
+    {"button": "left", "down": True, "x": 512, "y": 384},
+    {"text": "ctrl+c ctrl+v"},
+    {"text": "The quick brown fox jumps over the lazy dog"},
+]
+
+# Response body of GET /machines for a mid-sized fleet
+MACHINE_LIST = [
+    {
+        "id": f"M-6HNGAXR-NT0B3VA-{i:07d}",
+        "state": "Running" if i % 3 else "Stopped",
+        "created_at": "2025-02-10T23:31:00.000000Z",
+        "image_id": "I-BASE",
+        "team_id": "T-0001",
+        "pause_bots": False,
+    }
+    for i in range(200)
+]
+
+
+def available_codecs():
+    codecs = []
+    for codec in (JSONCodec, OrjsonCodec, MsgspecCodec):
+        try:
+            codecs.append(codec())
+        except ImportError:
+            pass
+    return codecs
+
+
+def time_per_op(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def bench_codec(codec: JSONCodec, iterations: int) -> dict:
+    encoded_events = [codec.dumps(event) for event in INPUT_EVENTS]
+    encoded_list = codec.dumps(MACHINE_LIST)
+    list_iterations = max(1, iterations // 100)
+    return {
+        "input_event_encode_us": time_per_op(lambda: [codec.dumps(event) for event in INPUT_EVENTS], iterations) / len(INPUT_EVENTS),
+        "input_event_decode_us": time_per_op(lambda: [codec.loads(body) for body in encoded_events], iterations) / len(INPUT_EVENTS),
+        "machine_list_encode_us": time_per_op(lambda: codec.dumps(MACHINE_LIST), list_iterations),
+        "machine_list_decode_us": time_per_op(lambda: codec.loads(encoded_list), list_iterations),
+    }
+
+
+def run(iterations: int) -> dict:
+    return {codec.name: bench_codec(codec, iterations) for codec in available_codecs()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20_000)
+    args = parser.parse_args()
+
+    results = run(args.iterations)
+    metrics = next(iter(results.values())).keys()
+    print(f"{'codec':<10}" + "".join(f"{metric:>26}" for metric in metrics))
+    for name, values in results.items():
+        print(f"{name:<10}" + "".join(f"{values[metric]:>26.2f}" for metric in metrics))
+
+
+if __name__ == "__main__":
+    main()
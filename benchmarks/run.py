@@ -0,0 +1,189 @@
+"""SDK benchmark suite, run against the local fake server.
+
+Writes JSON results that can be compared across commits with compare.py:
+
+python benchmarks/run.py --output before.json
+python benchmarks/run.py --output after.json
+python benchmarks/compare.py before.json after.json
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import connection_overhead
+import json_codec
+
+from pig import Client, Connection
+from pig.fake_server import FakePig
+from pig.metrics import Histogram
+
+
+def summarize(histogram: Histogram) -> dict:
+    return {
+        "count": histogram.count,
+        "mean_ms": histogram.mean * 1e3,
+        "p50_ms": histogram.percentile(50) * 1e3,
+        "p95_ms": histogram.percentile(95) * 1e3,
+        "p99_ms": histogram.percentile(99) * 1e3,
+    }
+
+
+PRIMITIVES = {
+    "key": lambda conn: conn.key.aio("a"),
+    "type": lambda conn: conn.type.aio("hello"),
+    "mouse_move": lambda conn: conn.mouse_move.aio(100, 100),
+    "left_click": lambda conn: conn.left_click.aio(100, 100),
+    "right_click": lambda conn: conn.right_click.aio(100, 100),
+    "double_click": lambda conn: conn.double_click.aio(100, 100),
+    "left_click_drag": lambda conn: conn.left_click_drag.aio(200, 200),
+    "cursor_position": lambda conn: conn.cursor_position.aio(),
+    "dimensions": lambda conn: conn.dimensions.aio(refresh=True),
+    "screenshot": lambda conn: conn.screenshot.aio(),
+}
+
+
+async def bench_primitives(client: Client, machine_id: str, iterations: int) -> dict:
+    """Sequential latency of each Connection primitive"""
+    machine = await client.machines.get.aio(machine_id, fetch=False)
+    results = {}
+    async with machine.connect.aio() as conn:
+        for name, action in PRIMITIVES.items():
+            histogram = Histogram()
+            for _ in range(iterations):
+                started = time.perf_counter()
+                await action(conn)
+                histogram.observe(time.perf_counter() - started)
+            results[name] = summarize(histogram)
+    return results
+
+
+async def bench_screenshots(client: Client, machine_id: str, count: int, concurrency: int) -> dict:
+    """Screenshot throughput with several requests in flight"""
+    machine = await client.machines.get.aio(machine_id, fetch=False)
+    frames = 0
+    received = 0
+
+    async with machine.connect.aio() as conn:
+
+        async def worker(n: int):
+            nonlocal frames, received
+            for _ in range(n):
+                received += len(await conn.screenshot.aio())
+                frames += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*[worker(count // concurrency) for _ in range(concurrency)])
+        elapsed = time.perf_counter() - started
+    return {"frames_per_s": frames / elapsed, "mb_per_s": received / elapsed / 1e6}
+
+
+async def bench_connection_churn(client: Client, machine_id: str, count: int) -> dict:
+    """Connection create + delete round trips"""
+    machine = await client.machines.get.aio(machine_id, fetch=False)
+    histogram = Histogram()
+    for _ in range(count):
+        started = time.perf_counter()
+        conn: Connection = await client.connections.create.aio(machine)
+        await client.connections.delete.aio(machine.id, conn.id)
+        histogram.observe(time.perf_counter() - started)
+    return {**summarize(histogram), "cycles_per_s": count / histogram.sum}
+
+
+async def bench_fanout(client: Client, machine_ids: list, actions: int) -> dict:
+    """Concurrent input actions across many machines at once"""
+
+    async def drive(machine_id: str):
+        machine = await client.machines.get.aio(machine_id, fetch=False)
+        async with machine.connect.aio() as conn:
+            for i in range(actions):
+                await conn.mouse_move.aio(i, i)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[drive(machine_id) for machine_id in machine_ids])
+    elapsed = time.perf_counter() - started
+    return {"machines": len(machine_ids), "actions_per_s": len(machine_ids) * actions / elapsed, "elapsed_ms": elapsed * 1e3}
+
+
+def bench_threaded_sync(fake: FakePig, shared_loop: bool, machines: int, calls: int) -> float:
+    """Sync calls per second from a pool of threads, one machine per thread"""
+    client = fake.client(shared_loop=shared_loop)
+    machine_ids = [fake.add_machine() for _ in range(machines)]
+
+    def drive(machine_id: str):
+        conn = client.connections.get(machine_id, "C-BENCH", fetch=False)
+        for i in range(calls):
+            conn.mouse_move(i, i)
+
+    started = time.perf_counter()
+    client.map(drive, machine_ids, workers=machines)
+    elapsed = time.perf_counter() - started
+    client.close()
+    return machines * calls / elapsed
+
+
+def run_threaded_benchmarks(args) -> dict:
+    with FakePig(latency=args.latency) as fake:
+        return {
+            "per_call_loop_calls_per_s": bench_threaded_sync(fake, False, machines=8, calls=args.iterations),
+            "shared_loop_calls_per_s": bench_threaded_sync(fake, True, machines=8, calls=args.iterations),
+        }
+
+
+async def run_server_benchmarks(args) -> dict:
+    async with FakePig(latency=args.latency) as fake:
+        machine_ids = [fake.add_machine() for _ in range(args.machines)]
+        client = fake.client()
+        return {
+            "primitives": await bench_primitives(client, machine_ids[0], args.iterations),
+            "screenshots": await bench_screenshots(client, machine_ids[0], args.iterations * 4, concurrency=4),
+            "connection_churn": await bench_connection_churn(client, machine_ids[0], args.iterations),
+            "fanout": await bench_fanout(client, machine_ids, args.iterations),
+        }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=50, help="Iterations per primitive")
+    parser.add_argument("--machines", type=int, default=20, help="Machines for the fan-out benchmark")
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated server latency in seconds")
+    parser.add_argument("--output", "-o", help="Write JSON results to this file")
+    args = parser.parse_args()
+
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+        "results": {
+            "overhead": connection_overhead.run(calls=args.iterations * 1000),
+            "json_codec": json_codec.run(iterations=args.iterations * 100),
+            **asyncio.run(run_server_benchmarks(args)),
+            "threaded_sync": run_threaded_benchmarks(args),
+        },
+    }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
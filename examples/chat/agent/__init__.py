@@ -1,4 +1,4 @@
 from .chat_agent import ChatAgent
 from .pig_agent import PigAgent
 
-__all__ = ["ChatAgent", "PigAgent"]
\ No newline at end of file
+__all__ = ["ChatAgent", "PigAgent"]
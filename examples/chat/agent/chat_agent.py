@@ -1,37 +1,43 @@
-from datetime import datetime
-from email import message
+import asyncio
+
+from langchain_core.messages import AIMessageChunk, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.tools import tool
+from langgraph.graph import END, START, StateGraph
 
 # from agent.src.pig_subgraph import tools
 from .pig_agent import PigAgent
-from .utils import ensure_tools_resolved
-
-from langgraph.graph import MessagesState
-from langchain_core.runnables import RunnableConfig
-from langchain_core.messages import ToolMessage, AIMessage, HumanMessage, AIMessageChunk, HumanMessageChunk, SystemMessage
-from langgraph.graph import END, START, StateGraph
-from langchain_core.tools import tool
-from langgraph.prebuilt import ToolNode
+from .state import ToolCallState, message_update, unresolved_tool_messages
 
 
-class ChatAgent():
+class ChatAgent:
     def __init__(
-        self, 
-        pig_client, 
+        self,
+        pig_client,
         pig_machine_id,
-        chat_llm, 
+        chat_llm,
         chat_system_prompt,
         computer_use_llm,
-        computer_use_system_prompt
+        computer_use_system_prompt,
+        screenshot_retention=None,
+        trajectory_cache=None,
+        task_succeeded=None,
     ):
         self.chat_llm = chat_llm
         self.chat_system_prompt = chat_system_prompt
         self.computer_use_system_prompt = computer_use_system_prompt
-        self.pig_agent = PigAgent(pig_client, pig_machine_id, computer_use_llm)
+        self.pig_agent = PigAgent(
+            pig_client,
+            pig_machine_id,
+            computer_use_llm,
+            screenshot_retention=screenshot_retention,
+            trajectory_cache=trajectory_cache,
+            task_succeeded=task_succeeded,
+        )
 
         self.chat_llm = self.chat_llm.bind_tools([self.call_pig_agent])
 
         self.graph = (
-            StateGraph(MessagesState)
+            StateGraph(ToolCallState)
             .add_node("call_model", self.call_model)
             .add_node("prompt_user", self.prompt_user)
             .add_node("call_pig_agent", self.call_pig_agent_node)
@@ -43,33 +49,33 @@ class ChatAgent():
         )
 
     # Router
-    def route(self, state: MessagesState) -> str:
+    def route(self, state: ToolCallState) -> str:
         if not state["messages"]:
             return "call_model"
         last_message = state["messages"][-1]
         if last_message.tool_calls:
-            # Assumes only one tool call
-            return last_message.tool_calls[0]["name"]
+            # call_pig_agent is the only tool
+            return "call_pig_agent"
 
         return "prompt_user"
 
     # Nodes
-    def call_model(self, state: MessagesState):
+    async def call_model(self, state: ToolCallState):
 
-        messages = ensure_tools_resolved(state["messages"])
+        ignored = unresolved_tool_messages(state)
+        messages = state["messages"] + ignored if ignored else state["messages"]
 
-        response = self.chat_llm.invoke(
-            messages
-        )
-        return {"messages": [response]}
+        response = await self.chat_llm.ainvoke(messages)
+        return message_update(*ignored, response)
 
-    def prompt_user(self, state: MessagesState):
-        user_input = input()
+    async def prompt_user(self, state: ToolCallState):
+        # input() blocks, so wait for it on a thread to keep the event loop free
+        user_input = await asyncio.get_running_loop().run_in_executor(None, input)
         print()
         return {"messages": [HumanMessage(user_input)]}
 
     # Tool Nodes
-    
+
     @tool
     @staticmethod
     def call_pig_agent(task: str) -> str:
@@ -78,32 +84,34 @@ class ChatAgent():
         pass
 
     # Actual Tool function we call (since we use self)
-    def call_pig_agent_node(self, state: MessagesState):
-        tool_call = state["messages"][-1].tool_calls[0]
-        task = tool_call["args"].get("task")
-
-        result = self.pig_agent.graph.invoke({"messages": [
-            SystemMessage(content=self.computer_use_system_prompt),
-            HumanMessage(task)
-        ]},
-        {'recursion_limit': 500}
-        )
-    
-        return {
-            "messages": ToolMessage(
-                tool_call_id=tool_call["id"],
-                content=result["messages"][-1].content
+    async def call_pig_agent_node(self, state: ToolCallState):
+        # Tasks share one machine, so several calls in a turn run one after another
+        tool_messages = []
+        for tool_call in state["messages"][-1].tool_calls:
+            task = tool_call["args"].get("task")
+
+            result = await self.pig_agent.graph.ainvoke(
+                {"messages": [SystemMessage(content=self.computer_use_system_prompt), HumanMessage(task)]}, {"recursion_limit": 500}
             )
-        }
 
+            tool_messages.append(ToolMessage(tool_call_id=tool_call["id"], content=result["messages"][-1].content))
 
+        return message_update(*tool_messages)
 
     def run(self):
+        asyncio.run(self.arun())
+
+    async def arun(self):
+        # The computer-use agent keeps one connection for the whole chat, deleted when it ends
+        async with self.pig_agent:
+            await self.stream_chat()
+
+    async def stream_chat(self):
         print("\033[34m" + "How could I help you?\nTry something like: 'describe the screen' or 'open the file explorer'\n" + "\033[0m")
 
         initial_state = {"messages": [SystemMessage(content=self.chat_system_prompt)]}
         prev_content_type = None
-        for message_chunk, _ in self.graph.stream(
+        async for message_chunk, _ in self.graph.astream(
             initial_state,
             stream_mode="messages",
         ):
@@ -1,22 +1,74 @@
-from langgraph.graph import MessagesState, StateGraph, START, END
+import asyncio
+import itertools
+from typing import Callable, Dict, List, Optional, Tuple
+
+from aiohttp import ClientConnectionError
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
 from langchain_core.tools import tool
-from langchain_core.messages import ToolMessage, HumanMessage
-import base64
-from typing import Optional, Tuple, Dict, List
-from .utils import ensure_tools_resolved
+from langgraph.graph import END, START, StateGraph
+
+from pig import APIError, CoordinateMapper
+
+from .state import PigAgentState, ScreenshotRetention, message_update, not_run_tool_message, unresolved_tool_messages
+from .trajectory import TrajectoryCache, fingerprint, fingerprints_match
 
-class PigAgent():
-    def __init__(self, pig_client, pig_machine_id, computer_use_llm):
+# Tools that only read state. Neighbouring reads can't affect each other, so they run concurrently
+READ_TOOLS = {"get_dimensions", "cursor_position", "screenshot"}
+
+
+class PigAgent:
+    def __init__(
+        self,
+        pig_client,
+        pig_machine_id,
+        computer_use_llm,
+        screenshot_retention: Optional[ScreenshotRetention] = None,
+        prefetch_delay: Optional[float] = 0.5,
+        prefetch_max_age: float = 1.0,
+        observe_actions: Optional[float] = None,
+        trajectory_cache: Optional[TrajectoryCache] = None,
+        checkpoint_timeout: float = 10,
+        task_succeeded: Optional[Callable[[str, str], bool]] = None,
+        model_size: Tuple[int, int] = (1024, 768),
+        letterbox: bool = True,
+    ):
         self.client = pig_client
         self.machine_id = pig_machine_id
         self.computer_use_llm = computer_use_llm
         self.connection = None
         self.dims = None
-        
-        # Model's trained dimensions (Claude's assumption)
-        self.model_trained_w, self.model_trained_h = 1024, 768
-        # Actual screen dimensions will be set in create_connection
-        self.screen_w, self.screen_h = None, None
+
+        # Only the latest few screenshots are kept at full size, so long tasks don't grow every model call
+        self.screenshot_retention = screenshot_retention or ScreenshotRetention()
+
+        # The model nearly always asks for a screenshot after acting, so one is taken while it thinks,
+        # prefetch_delay seconds after the last action to let the screen settle. None disables this
+        self.prefetch_delay = prefetch_delay
+        # The frame is discarded on any input, but not if the screen changes by itself, e.g. a page loading, so
+        # it's only reused for prefetch_max_age seconds after capture. Longer windows save more captures on slow
+        # model calls, at the risk of the model acting on an outdated screen
+        self.prefetch_max_age = prefetch_max_age
+
+        # When set, the last action of each turn returns a screenshot taken this many seconds after it,
+        # saving the model a turn spent asking for one
+        self.observe_actions = observe_actions
+
+        # Successful runs are recorded here, and replayed without the model when the same task starts from the same screen.
+        # Replay waits up to checkpoint_timeout seconds for each screen the model saw, and hands over to the model if one never shows
+        self.trajectory_cache = trajectory_cache
+        self.checkpoint_timeout = checkpoint_timeout
+        # task_succeeded(task, answer) decides which runs are recorded. The model's answer alone can't tell a finished
+        # task from one it gave up on, so without it every run whose actions all went through is recorded, and
+        # replays are always checked by the model before ending
+        self.task_succeeded = task_succeeded
+
+        # The model's coordinates are in its trained screenshot size (Claude's is 1024x768). With letterbox, as in
+        # CoordinateMapper, screenshots are scaled to that size before the model sees them, preserving the aspect
+        # ratio (requires Pillow). letterbox=False sends them unscaled and stretches coordinates on each axis
+        self.model_size = model_size
+        self.letterbox = letterbox
+        # Set in create_connection, once the screen dimensions are known
+        self.coordinates = None
 
         tools = [
             self.get_dimensions,
@@ -28,71 +80,228 @@ class PigAgent():
             self.left_click,
             self.right_click,
             self.double_click,
-            self.left_click_drag
+            self.left_click_drag,
         ]
         self.computer_use_llm = self.computer_use_llm.bind_tools(tools)
 
+        # Implementations of the tools above, by name
+        self.tool_handlers = {
+            "get_dimensions": self.get_dimensions_tool,
+            "cursor_position": self.cursor_position_tool,
+            "screenshot": self.screenshot_tool,
+            "type_text": self.type_text_tool,
+            "key_press": self.key_press_tool,
+            "mouse_move": self.mouse_move_tool,
+            "left_click": self.left_click_tool,
+            "right_click": self.right_click_tool,
+            "double_click": self.double_click_tool,
+            "left_click_drag": self.left_click_drag_tool,
+        }
+
         self.graph = (
-            StateGraph(MessagesState)
+            StateGraph(PigAgentState)
             .add_node("call_model", self.call_model)
-            .add_node("get_dimensions", self.get_dimensions_node)
-            .add_node("cursor_position", self.cursor_position_node)
-            .add_node("screenshot", self.screenshot_node)
-            .add_node("type_text", self.type_text_node)
-            .add_node("key_press", self.key_press_node)
-            .add_node("mouse_move", self.mouse_move_node)
-            .add_node("left_click", self.left_click_node)
-            .add_node("right_click", self.right_click_node)
-            .add_node("double_click", self.double_click_node)
-            .add_node("left_click_drag", self.left_click_drag_node)
+            .add_node("tools", self.tools_node)
             .add_node("create_connection", self.create_connection)
+            .add_node("replay", self.replay)
             .add_edge(START, "create_connection")
-            .add_edge("create_connection", "call_model")
-            .add_conditional_edges(
-                "call_model", 
-                self.route, 
-            )
-            .add_edge("get_dimensions", "call_model")
-            .add_edge("cursor_position", "call_model")
-            .add_edge("screenshot", "call_model")
-            .add_edge("type_text", "call_model")
-            .add_edge("key_press", "call_model")
-            .add_edge("mouse_move", "call_model")
-            .add_edge("left_click", "call_model")
-            .add_edge("right_click", "call_model")
-            .add_edge("double_click", "call_model")
-            .add_edge("left_click_drag", "call_model")
+            .add_edge("create_connection", "replay")
+            .add_edge("replay", "call_model")
+            .add_conditional_edges("call_model", self.route, ["tools", END])
+            .add_edge("tools", "call_model")
             .compile()
         )
 
-    def create_connection(self, state: MessagesState):
-        machine = self.client.machines.get(self.machine_id)
-        self.connection = self.client.connections.create(machine)
-        self.dims = self.connection.dimensions()
-        
-        # Set screen dimensions for coordinate scaling
-        self.screen_w, self.screen_h = self.dims
-
-    def call_model(self, state: MessagesState):
-
-        messages = ensure_tools_resolved(state["messages"])
-        
-        response = self.computer_use_llm.invoke(messages)
-        return {"messages": [response]}
-    
-    # Router
-    def route(self, state: MessagesState) -> str:
-        if not state["messages"]:
-            return "call_model"
-        last_message = state["messages"][-1]
-        if last_message.tool_calls:
-            # assume one tool call
-            return last_message.tool_calls[0]["name"] # requires tool name to map to a node of the same name, with implementation
+    # Nodes are async, so waits on the machine and the model overlap with other agents in the same process
+    async def create_connection(self, state: PigAgentState):
+        # One connection serves every task, it's only replaced after failing
+        if self.connection is not None:
+            return
+        machine = await self.client.machines.get.aio(self.machine_id)
+        self.connection = await self.client.connections.create.aio(machine)
+        if self.dims is None:
+            self.dims = await self.connection.dimensions.aio()
+            self.coordinates = CoordinateMapper(self.dims, self.model_size, letterbox=self.letterbox)
+
+    async def close(self):
+        """Deletes the agent's connection. Safe to call more than once, and a later task reconnects"""
+        connection, self.connection = self.connection, None
+        if connection is not None:
+            await self.client.connections.delete.aio(connection.machine.id, connection.id)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    def is_connection_error(self, error: Exception) -> bool:
+        # The connection was closed on the server, or the machine can't be reached
+        if isinstance(error, APIError):
+            return error.status_code in (404, 410)
+        return isinstance(error, (ClientConnectionError, asyncio.TimeoutError))
 
+    async def call_model(self, state: PigAgentState):
+
+        # Answer any tool calls that were skipped, from state rather than rescanning the history
+        ignored = unresolved_tool_messages(state)
+        messages = state["messages"] + ignored if ignored else state["messages"]
+
+        response = await self.computer_use_llm.ainvoke(messages)
+        if not response.tool_calls:
+            await self.record_trajectory(state, response)
+        return message_update(*ignored, response)
+
+    # Router
+    def route(self, state: PigAgentState) -> str:
+        if state["messages"][-1].tool_calls:
+            return "tools"
         return END
 
-    
-    # Tools
+    def task(self, state: PigAgentState) -> str:
+        # The first human message with plain text content is the task
+        return next(message.content for message in state["messages"] if isinstance(message, HumanMessage) and isinstance(message.content, str))
+
+    # Replays a recorded run of this task from this screen, if there is one, checking the screen at each step the model looked at
+    async def replay(self, state: PigAgentState) -> Dict:
+        if self.trajectory_cache is None:
+            return {}
+        task = self.task(state)
+        start = fingerprint(await self.connection.screenshot.aio())
+        trajectory = self.trajectory_cache.lookup(task, start)
+        if trajectory is None:
+            return {"start_fingerprint": start}
+
+        replayed = []
+        for step in trajectory["steps"]:
+            if "checkpoint" in step:
+                reached = await self.wait_for_screen(step["checkpoint"])
+            else:
+                try:
+                    await self.run_tool(step)
+                    reached = True
+                except Exception:
+                    reached = False
+            if not reached:
+                note = HumanMessage(
+                    f"{len(replayed)} steps of an earlier run of this task were replayed, then the screen stopped matching that run. "
+                    "Take a screenshot to see where things stand, and carry on from there."
+                )
+                return message_update(note, start_fingerprint=start, trajectory=replayed)
+            replayed.append(step)
+
+        # The recorded run may not have done the task, so the model checks the result rather than ending with the recorded answer
+        note = HumanMessage(
+            f"All {len(replayed)} steps of an earlier run of this task were replayed, which ended with: {trajectory['result']}\n"
+            "Take a screenshot to check the task is actually done, and finish it if not."
+        )
+        return message_update(note, start_fingerprint=start, trajectory=replayed)
+
+    async def wait_for_screen(self, checkpoint: str) -> bool:
+        # The screen may take a while to catch up with actions replayed faster than the model made them
+        deadline = asyncio.get_running_loop().time() + self.checkpoint_timeout
+        while True:
+            if fingerprints_match(fingerprint(await self.connection.screenshot.aio()), checkpoint, self.trajectory_cache.max_distance):
+                return True
+            if asyncio.get_running_loop().time() >= deadline:
+                return False
+            await asyncio.sleep(0.5)
+
+    async def record_trajectory(self, state: PigAgentState, response: AIMessage):
+        steps = state.get("trajectory", [])
+        if self.trajectory_cache is None or state.get("start_fingerprint") is None:
+            return
+        # Only runs where every action succeeded are worth repeating
+        if not any("name" in step for step in steps) or any(step.get("failed") for step in steps):
+            return
+        if self.task_succeeded is not None and not self.task_succeeded(self.task(state), response.content):
+            return
+        await self.trajectory_cache.arecord(self.task(state), state["start_fingerprint"], steps, response.content)
+
+    # Runs every tool call of the model's last turn, saving a model round trip per extra action
+    async def tools_node(self, state: PigAgentState) -> Dict:
+        tool_calls = state["messages"][-1].tool_calls
+        try:
+            await self.create_connection(state)  # reconnects if the last turn lost the connection
+        except Exception as e:
+            # Every tool call still needs a result, so the model can decide what to do rather than the task dying
+            content = f"Not run: couldn't connect to the machine ({type(e).__name__}: {e})"
+            return message_update(*(not_run_tool_message(tool_call["id"], content) for tool_call in tool_calls), trajectory=[{"failed": True}])
+        results = await self.run_tool_calls(tool_calls)
+        prefetch = self.prefetch_delay is not None and tool_calls[-1]["name"] not in READ_TOOLS and results[-1][1] is None
+        if prefetch and self.connection is not None:
+            self.connection.prefetch_screenshot(delay=self.prefetch_delay)
+
+        tool_messages, image_messages, steps = [], [], []
+        for tool_call, (content, screenshot, ok) in zip(tool_calls, results):
+            if not ok:
+                steps.append({"failed": True})
+            elif tool_call["name"] not in READ_TOOLS:
+                steps.append({"name": tool_call["name"], "args": tool_call["args"]})
+            if screenshot is not None and self.trajectory_cache is not None:
+                steps.append({"checkpoint": fingerprint(screenshot)})
+            if screenshot is not None and tool_call["name"] != "screenshot":
+                content += ". A screenshot taken after this action follows"
+            if ok is None:
+                tool_messages.append(not_run_tool_message(tool_call["id"], content))
+            else:
+                tool_messages.append(ToolMessage(tool_call_id=tool_call["id"], content=content))
+            if screenshot is not None:
+                if self.letterbox:
+                    screenshot = self.coordinates.resize_screenshot(screenshot)
+                image_messages.append(self.screenshot_retention.image_message(screenshot))
+
+        # Replacing older screenshots by ID swaps them out in place in the history
+        new_ids = [message.id for message in image_messages]
+        pruned = self.screenshot_retention.prune(state.get("screenshot_ids", []), new_ids)
+
+        # Tool results must directly follow the model's turn, so images go after all of them
+        return message_update(*tool_messages, *image_messages, *pruned, screenshot_ids=new_ids, trajectory=steps)
+
+    async def run_tool_calls(self, tool_calls: List[Dict]) -> List[Tuple[str, Optional[bytes], Optional[bool]]]:
+        """Run tool calls in order, returning (result text, screenshot or None, succeeded) for each,
+        with succeeded None for calls that were skipped.
+
+        Input actions run one at a time, in order. Runs of neighbouring reads
+        run concurrently. Once an action fails the rest are skipped, since the
+        model planned them expecting it to succeed.
+        """
+        results = []
+        for is_read, group in itertools.groupby(tool_calls, key=lambda tool_call: tool_call["name"] in READ_TOOLS):
+            group = list(group)
+            if is_read:
+                outcomes = await asyncio.gather(*[self.run_tool(tool_call) for tool_call in group], return_exceptions=True)
+            else:
+                outcomes = []
+                for tool_call in group:
+                    observe = self.observe_actions is not None and tool_call is tool_calls[-1]
+                    try:
+                        outcomes.append(await self.run_tool(tool_call, observe=observe))
+                    except Exception as e:
+                        outcomes.append(e)
+                        break
+            results.extend((f"Error: {outcome}", None, False) if isinstance(outcome, Exception) else (*outcome, True) for outcome in outcomes)
+            errors = [outcome for outcome in outcomes if isinstance(outcome, Exception)]
+            if any(self.is_connection_error(e) for e in errors):
+                # A fresh connection is made before the next tools run
+                try:
+                    await self.close()
+                except Exception:
+                    pass  # most likely already gone
+            if errors:
+                break
+        results.extend(("Skipped: an earlier action in this turn failed", None, None) for _ in tool_calls[len(results) :])
+        return results
+
+    async def run_tool(self, tool_call: Dict, observe: bool = False) -> Tuple[str, Optional[bytes]]:
+        handler = self.tool_handlers.get(tool_call["name"])
+        if handler is None:
+            raise ValueError(f"Unknown tool {tool_call['name']}")
+        if observe:
+            return await handler(**tool_call["args"], observe=True)
+        return await handler(**tool_call["args"])
+
+    # Tool schemas, for the model. Implementations follow
     @tool
     @staticmethod
     def get_dimensions() -> str:
@@ -100,17 +309,6 @@ class PigAgent():
         Returns the width and height of the screen in pixels."""
         pass
 
-    def get_dimensions_node(self, state: MessagesState) -> Dict:
-        tool_call = state["messages"][-1].tool_calls[0]
-
-        # Actual implementation
-        return {
-            "messages": ToolMessage(
-                tool_call_id=tool_call["id"],
-                content=f"Screen dimensions: width={self.dims[0]}, height={self.dims[1]} pixels"
-            )
-        }
-        
     @tool
     @staticmethod
     def cursor_position() -> str:
@@ -120,23 +318,7 @@ class PigAgent():
         3. Get cursor position for relative movements
         Returns a string with format 'Mouse coordinates: x=<x>, y=<y>'"""
         pass
-        
-    def cursor_position_node(self, state: MessagesState) -> Dict:
-        tool_call = state["messages"][-1].tool_calls[0]
-        
-        # Get current cursor position in screen coordinates
-        x, y = self.connection.cursor_position()
-        
-        # Convert to model coordinates
-        model_x, model_y = self.to_model_coordinates(x, y)
-        
-        return {
-            "messages": ToolMessage(
-                tool_call_id=tool_call["id"],
-                content=f"Mouse coordinates: x={model_x}, y={model_y}"
-            )
-        }
-        
+
     @tool
     @staticmethod
     def screenshot() -> List[Dict]:
@@ -146,28 +328,7 @@ class PigAgent():
         3. Debugging user interface interactions
         Returns a base64 encoded PNG image"""
         pass
-        
-    def screenshot_node(self, state: MessagesState) -> Dict:
-        tool_call = state["messages"][-1].tool_calls[0]
-        
-        # Capture screenshot
-        screenshot_bytes = self.connection.screenshot()
-        image_data = base64.b64encode(screenshot_bytes).decode()
-        
-        return {
-            "messages": [
-            ToolMessage(
-                tool_call_id=tool_call["id"],
-                content = "screenshot captured, see following user message for contents"
-            ), 
-            HumanMessage(
-                content=[{
-                    "type": "image_url", 
-                    "image_url": {"url": f"data:image/png;base64,{image_data}"}}
-                ])
-            ]
-        }
-        
+
     @tool
     @staticmethod
     def type_text(text: str) -> str:
@@ -175,29 +336,15 @@ class PigAgent():
         Use this for text input rather than key_press when typing normal text.
         The text will be typed exactly as provided, including spaces and special characters.
         Does not automatically press the enter/return key after typing.
-        
+
         Args:
             text: The text to type
-            
+
         Returns:
             Confirmation message with the text that was typed.
         """
         pass
-        
-    def type_text_node(self, state: MessagesState) -> Dict:
-        tool_call = state["messages"][-1].tool_calls[0]
-        text = tool_call["args"].get("text", "")
-        
-        # Type the text
-        self.connection.type(text)
-        
-        return {
-            "messages": ToolMessage(
-                tool_call_id=tool_call["id"],
-                content=f"Typed text: {text}"
-            )
-        }
-        
+
     @tool
     @staticmethod
     def key_press(combo: str) -> str:
@@ -208,63 +355,31 @@ class PigAgent():
         - Modifier combinations: 'ctrl+c', 'shift+alt+Tab'
         - Multiple combos: 'ctrl+c ctrl+v'
         Use this for keyboard shortcuts and special keys rather than regular text input.
-        
+
         Args:
             combo: The key combination to press
-            
+
         Returns:
             Confirmation message with the key combo that was pressed.
         """
         pass
-        
-    def key_press_node(self, state: MessagesState) -> Dict:
-        tool_call = state["messages"][-1].tool_calls[0]
-        combo = tool_call["args"].get("combo", "")
-        
-        # Press the key combination
-        self.connection.key(combo)
-        
-        return {
-            "messages": ToolMessage(
-                tool_call_id=tool_call["id"],
-                content=f"Pressed key combo: {combo}"
-            )
-        }
-        
+
     @tool
     @staticmethod
     def mouse_move(x: int, y: int) -> str:
         """Move the mouse cursor to absolute screen coordinates (x,y).
         Coordinate system: (0,0) is top-left of screen, x increases right, y increases down.
         Use cursor_position() first to help calculate relative movements.
-        
+
         Args:
             x: The x-coordinate to move to
             y: The y-coordinate to move to
-            
+
         Returns:
             Confirmation message with the coordinates the mouse moved to.
         """
         pass
-        
-    def mouse_move_node(self, state: MessagesState) -> Dict:
-        tool_call = state["messages"][-1].tool_calls[0]
-        model_x = tool_call["args"].get("x")
-        model_y = tool_call["args"].get("y")
-        
-        # Convert from model coordinates to screen coordinates
-        screen_x, screen_y = self.to_screen_coordinates(model_x, model_y)
-        
-        # Move the mouse
-        self.connection.mouse_move(screen_x, screen_y)
-        
-        return {
-            "messages": ToolMessage(
-                tool_call_id=tool_call["id"],
-                content=f"Moved mouse to: x={model_x}, y={model_y}"
-            )
-        }
-        
+
     @tool
     @staticmethod
     def left_click(x: Optional[int] = None, y: Optional[int] = None) -> str:
@@ -272,34 +387,16 @@ class PigAgent():
         1. If x,y provided: First moves to (x,y), then clicks
         2. If no coordinates: Clicks at current cursor position
         Use for most standard UI interactions like button clicks.
-        
+
         Args:
             x: Optional x-coordinate to click at
             y: Optional y-coordinate to click at
-            
+
         Returns:
             Confirmation message with the coordinates that were clicked.
         """
         pass
-        
-    def left_click_node(self, state: MessagesState) -> Dict:
-        tool_call = state["messages"][-1].tool_calls[0]
-        model_x = tool_call["args"].get("x")
-        model_y = tool_call["args"].get("y")
-        
-        # Convert from model coordinates to screen coordinates
-        screen_x, screen_y = self.to_screen_coordinates(model_x, model_y)
-        
-        # Perform left click
-        self.connection.left_click(screen_x, screen_y)
-        
-        return {
-            "messages": ToolMessage(
-                tool_call_id=tool_call["id"],
-                content=f"Left clicked at: x={model_x if model_x is not None else 'current'}, y={model_y if model_y is not None else 'current'}"
-            )
-        }
-        
+
     @tool
     @staticmethod
     def right_click(x: Optional[int] = None, y: Optional[int] = None) -> str:
@@ -307,34 +404,16 @@ class PigAgent():
         1. If x,y provided: First moves to (x,y), then clicks
         2. If no coordinates: Clicks at current cursor position
         Use for context menus and alternative actions.
-        
+
         Args:
             x: Optional x-coordinate to click at
             y: Optional y-coordinate to click at
-            
+
         Returns:
             Confirmation message with the coordinates that were clicked.
         """
         pass
-        
-    def right_click_node(self, state: MessagesState) -> Dict:
-        tool_call = state["messages"][-1].tool_calls[0]
-        model_x = tool_call["args"].get("x")
-        model_y = tool_call["args"].get("y")
-        
-        # Convert from model coordinates to screen coordinates
-        screen_x, screen_y = self.to_screen_coordinates(model_x, model_y)
-        
-        # Perform right click
-        self.connection.right_click(screen_x, screen_y)
-        
-        return {
-            "messages": ToolMessage(
-                tool_call_id=tool_call["id"],
-                content=f"Right clicked at: x={model_x if model_x is not None else 'current'}, y={model_y if model_y is not None else 'current'}"
-            )
-        }
-        
+
     @tool
     @staticmethod
     def double_click(x: Optional[int] = None, y: Optional[int] = None) -> str:
@@ -342,34 +421,16 @@ class PigAgent():
         1. If x,y provided: First moves to (x,y), then double clicks
         2. If no coordinates: Double clicks at current cursor position
         Use for actions that typically require double clicks like file opening.
-        
+
         Args:
             x: Optional x-coordinate to double-click at
             y: Optional y-coordinate to double-click at
-            
+
         Returns:
             Confirmation message with the coordinates that were double-clicked.
         """
         pass
-        
-    def double_click_node(self, state: MessagesState) -> Dict:
-        tool_call = state["messages"][-1].tool_calls[0]
-        model_x = tool_call["args"].get("x")
-        model_y = tool_call["args"].get("y")
-        
-        # Convert from model coordinates to screen coordinates
-        screen_x, screen_y = self.to_screen_coordinates(model_x, model_y)
-        
-        # Perform double click
-        self.connection.double_click(screen_x, screen_y)
-        
-        return {
-            "messages": ToolMessage(
-                tool_call_id=tool_call["id"],
-                content=f"Double clicked at: x={model_x if model_x is not None else 'current'}, y={model_y if model_y is not None else 'current'}"
-            )
-        }
-        
+
     @tool
     @staticmethod
     def left_click_drag(x: int, y: int) -> str:
@@ -379,61 +440,71 @@ class PigAgent():
         2. Moves cursor to target x,y
         3. Releases left button
         Use for drag-and-drop operations or selection areas.
-        
+
         Args:
             x: The x-coordinate to drag to
             y: The y-coordinate to drag to
-            
+
         Returns:
             Confirmation message with the coordinates that were dragged to.
         """
         pass
-        
-    def left_click_drag_node(self, state: MessagesState) -> Dict:
-        tool_call = state["messages"][-1].tool_calls[0]
-        model_x = tool_call["args"].get("x")
-        model_y = tool_call["args"].get("y")
-        
+
+    # Tool implementations. Each returns the result text, and a screenshot if it took one.
+    # With observe, actions also take one once the screen has settled
+
+    async def get_dimensions_tool(self) -> Tuple[str, None]:
+        return f"Screen dimensions: width={self.dims[0]}, height={self.dims[1]} pixels", None
+
+    async def cursor_position_tool(self) -> Tuple[str, None]:
+        # Get current cursor position in screen coordinates, then convert to model coordinates
+        x, y = await self.connection.cursor_position.aio()
+        model_x, model_y = self.to_model_coordinates(x, y)
+        return f"Mouse coordinates: x={model_x}, y={model_y}", None
+
+    async def screenshot_tool(self) -> Tuple[str, bytes]:
+        screenshot_bytes = await self.connection.screenshot.aio(max_age=self.prefetch_max_age)
+        return "screenshot captured, see following user message for contents", screenshot_bytes
+
+    async def type_text_tool(self, text: str = "", observe: bool = False) -> Tuple[str, Optional[bytes]]:
+        screenshot = await self.connection.type.aio(text, observe=observe, settle=self.observe_actions or 0)
+        return f"Typed text: {text}", screenshot
+
+    async def key_press_tool(self, combo: str = "", observe: bool = False) -> Tuple[str, Optional[bytes]]:
+        screenshot = await self.connection.key.aio(combo, observe=observe, settle=self.observe_actions or 0)
+        return f"Pressed key combo: {combo}", screenshot
+
+    async def mouse_move_tool(self, x: int = None, y: int = None, observe: bool = False) -> Tuple[str, Optional[bytes]]:
         # Convert from model coordinates to screen coordinates
-        screen_x, screen_y = self.to_screen_coordinates(model_x, model_y)
-        
-        # Perform click and drag
-        self.connection.left_click_drag(screen_x, screen_y)
-        
-        return {
-            "messages": ToolMessage(
-                tool_call_id=tool_call["id"],
-                content=f"Dragged mouse from current position to: x={model_x}, y={model_y}"
-            )
-        }
+        screen_x, screen_y = self.to_screen_coordinates(x, y)
+        screenshot = await self.connection.mouse_move.aio(screen_x, screen_y, observe=observe, settle=self.observe_actions or 0)
+        return f"Moved mouse to: x={x}, y={y}", screenshot
+
+    async def left_click_tool(self, x: Optional[int] = None, y: Optional[int] = None, observe: bool = False) -> Tuple[str, Optional[bytes]]:
+        screen_x, screen_y = self.to_screen_coordinates(x, y)
+        screenshot = await self.connection.left_click.aio(screen_x, screen_y, observe=observe, settle=self.observe_actions or 0)
+        return f"Left clicked at: x={x if x is not None else 'current'}, y={y if y is not None else 'current'}", screenshot
+
+    async def right_click_tool(self, x: Optional[int] = None, y: Optional[int] = None, observe: bool = False) -> Tuple[str, Optional[bytes]]:
+        screen_x, screen_y = self.to_screen_coordinates(x, y)
+        screenshot = await self.connection.right_click.aio(screen_x, screen_y, observe=observe, settle=self.observe_actions or 0)
+        return f"Right clicked at: x={x if x is not None else 'current'}, y={y if y is not None else 'current'}", screenshot
 
+    async def double_click_tool(self, x: Optional[int] = None, y: Optional[int] = None, observe: bool = False) -> Tuple[str, Optional[bytes]]:
+        screen_x, screen_y = self.to_screen_coordinates(x, y)
+        screenshot = await self.connection.double_click.aio(screen_x, screen_y, observe=observe, settle=self.observe_actions or 0)
+        return f"Double clicked at: x={x if x is not None else 'current'}, y={y if y is not None else 'current'}", screenshot
+
+    async def left_click_drag_tool(self, x: int = None, y: int = None, observe: bool = False) -> Tuple[str, Optional[bytes]]:
+        screen_x, screen_y = self.to_screen_coordinates(x, y)
+        screenshot = await self.connection.left_click_drag.aio(screen_x, screen_y, observe=observe, settle=self.observe_actions or 0)
+        return f"Dragged mouse from current position to: x={x}, y={y}", screenshot
 
-    
     # Coordinate conversion utilities
     def to_screen_coordinates(self, model_x: Optional[int], model_y: Optional[int]) -> Tuple[Optional[int], Optional[int]]:
-        """Convert model coordinates (1024x768) to actual screen coordinates."""
-        if model_x is None or model_y is None:
-            return None, None
-            
-        screen_x = int(model_x * self.screen_w / self.model_trained_w)
-        screen_y = int(model_y * self.screen_h / self.model_trained_h)
-        
-        # Clamp to screen bounds
-        screen_x = max(0, min(screen_x, self.screen_w - 1))
-        screen_y = max(0, min(screen_y, self.screen_h - 1))
-        
-        return screen_x, screen_y
-    
+        """Convert model coordinates to actual screen coordinates."""
+        return self.coordinates.to_screen(model_x, model_y)
+
     def to_model_coordinates(self, screen_x: Optional[int], screen_y: Optional[int]) -> Tuple[Optional[int], Optional[int]]:
-        """Convert actual screen coordinates to model coordinates (1024x768)."""
-        if screen_x is None or screen_y is None:
-            return None, None
-            
-        model_x = int(screen_x * self.model_trained_w / self.screen_w)
-        model_y = int(screen_y * self.model_trained_h / self.screen_h)
-        
-        # Clamp to model bounds
-        model_x = max(0, min(model_x, self.model_trained_w - 1))
-        model_y = max(0, min(model_y, self.model_trained_h - 1))
-        
-        return model_x, model_y
+        """Convert actual screen coordinates to model coordinates."""
+        return self.coordinates.to_model(screen_x, screen_y)
@@ -1,13 +1,12 @@
 from datetime import datetime
 
-
 chat_system_prompt = """You are a helpful AI assistant.
 
 You are incredibly concise, and work with tools such as the Pig Agent tool.
 Your role is to act as an interface between the user and this tool.
 
 With each chat message, silently invoke the Pig task needed, and succinctly summarize the result.
-You may only call one tool per chat message.
+Prefer one Pig task per chat message; several tasks in one message run one after another.
 
 System time: {}""".format(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
 
@@ -23,7 +22,7 @@ pig_system_prompt = """<SYSTEM_CAPABILITY>
 * Use the key "super" instead of "windows", for example "super+r".
 * The type text input tool does not hit the "enter" key, you must do that yourself if you want.
 * Do not use Task Manager or other privileged apps. Your input will start breaking if you try to use it.
-* Only call one tool at a time.
+* You may call several tools in one turn when you're confident of the outcome, e.g. click a text field, type, press return, then screenshot. They run in order, and if one fails the rest are skipped.
 </SYSTEM_CAPABILITY>
 
 <Example>
@@ -45,4 +44,4 @@ An example of good work would be:
 - screenshot
 - "I see that terminal is open, I plan to execute commands"
 </Example>
-""".format(datetime.now().strftime("%Y-%m-%d"))
\ No newline at end of file
+""".format(datetime.now().strftime("%Y-%m-%d"))
@@ -0,0 +1,229 @@
+import asyncio
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from pig import AiohttpTransport, Client, MetricsRegistry, Transport
+
+from .pig_agent import PigAgent
+from .state import tool_call_ran
+
+# Task latency buckets, from half a second to about 25 minutes
+TASK_BUCKETS = tuple(0.5 * 2 ** (i / 2) for i in range(32))
+# Buckets for per-task counts like steps and model calls, from 1 to about 1000
+COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 20, 30, 50, 75, 100, 150, 200, 300, 500, 1000)
+
+
+class TaskResult:
+    """Outcome of one scheduled task"""
+
+    def __init__(self, index: int, task: str, machine_id: str):
+        self.index = index
+        self.task = task
+        self.machine_id = machine_id
+        self.answer = None  # the agent's final message content
+        self.error: Optional[BaseException] = None
+        self.timed_out = False
+        self.latency = 0.0
+        self.model_calls = 0
+        self.steps = 0  # tool calls run, leaving out ones skipped or ignored
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class SchedulerReport:
+    """Per-task results in task order, with latency and failure stats in metrics, and step and model call counts in counts"""
+
+    def __init__(self, results: List[TaskResult], metrics: MetricsRegistry, counts: MetricsRegistry, elapsed: float):
+        self.results = results
+        self.metrics = metrics
+        self.counts = counts
+        self.elapsed = elapsed
+
+    @property
+    def failed(self) -> List[TaskResult]:
+        return [result for result in self.results if not result.ok]
+
+    def summary(self) -> Dict[str, Any]:
+        latency = self.metrics.histogram("agent.task").snapshot()
+        failures: Dict[str, int] = {}
+        for result in self.failed:
+            kind = "timeout" if result.timed_out else type(result.error).__name__
+            failures[kind] = failures.get(kind, 0) + 1
+        return {
+            "tasks": len(self.results),
+            "succeeded": len(self.results) - len(self.failed),
+            "failures": failures,
+            "latency_p50": latency["p50"],
+            "latency_p95": latency["p95"],
+            "mean_steps": self.counts.histogram("agent.steps").mean,
+            "mean_model_calls": self.counts.histogram("agent.model_calls").mean,
+            "elapsed": self.elapsed,
+        }
+
+
+class _BoundedLLM:
+    """Wraps a chat model so at most the semaphore's worth of calls are in flight, across every agent"""
+
+    def __init__(self, llm, semaphore: asyncio.Semaphore):
+        self.llm = llm
+        self.semaphore = semaphore
+
+    def bind_tools(self, tools):
+        return _BoundedLLM(self.llm.bind_tools(tools), self.semaphore)
+
+    async def ainvoke(self, messages, *args, **kwargs):
+        async with self.semaphore:
+            return await self.llm.ainvoke(messages, *args, **kwargs)
+
+
+class _TaskTimeout(asyncio.TimeoutError):
+    """A task ran past the scheduler's task_timeout, as opposed to a timeout raised inside the task"""
+
+
+class _BoundedTransport(Transport):
+    """Wraps a transport so at most the semaphore's worth of requests are in flight, across every transport sharing it"""
+
+    def __init__(self, transport: Transport, semaphore: asyncio.Semaphore):
+        self.transport = transport
+        self.semaphore = semaphore
+
+    async def request(self, method, url, body, headers, trace_ctx=None):
+        async with self.semaphore:
+            return await self.transport.request(method, url, body, headers, trace_ctx)
+
+    def instrument(self, metrics):
+        self.transport.instrument(metrics)
+
+    async def close(self):
+        await self.transport.close()
+
+
+class AgentScheduler:
+    """Runs many independent computer-use tasks concurrently over a pool of machines.
+
+    Each task leases a free machine, runs a PigAgent on it, and returns the
+    machine to the pool, so up to len(machine_ids) tasks run at once. Agents
+    keep their machine's connection between tasks. Tasks taking longer than
+    task_timeout seconds are cancelled, and their machine reconnects for the
+    next task. At most llm_concurrency model calls and api_concurrency Pig
+    API requests are in flight at a time. client_options are passed to the
+    Client, as for FleetRunner; agent_options to each PigAgent.
+
+        scheduler = AgentScheduler(machine_ids, computer_use_llm, pig_system_prompt, task_timeout=600)
+        report = asyncio.run(scheduler.run(tasks))
+        print(report.summary())
+    """
+
+    def __init__(
+        self,
+        machine_ids: List[str],
+        computer_use_llm,
+        system_prompt: str,
+        task_timeout: Optional[float] = 600,
+        llm_concurrency: int = 8,
+        api_concurrency: int = 32,
+        client_options: Optional[Dict[str, Any]] = None,
+        agent_options: Optional[Dict[str, Any]] = None,
+        recursion_limit: int = 500,
+    ):
+        self.machine_ids = list(machine_ids)
+        self.computer_use_llm = computer_use_llm
+        self.system_prompt = system_prompt
+        self.task_timeout = task_timeout
+        self.llm_concurrency = llm_concurrency
+        self.api_concurrency = api_concurrency
+        self.client_options = client_options or {}
+        self.agent_options = agent_options or {}
+        self.recursion_limit = recursion_limit
+
+    async def run(self, tasks: Iterable[str], on_result: Optional[Callable[[TaskResult], None]] = None) -> SchedulerReport:
+        """Run every task, returning once all are done. on_result(result) is called as each finishes"""
+        tasks = list(tasks)
+        metrics = MetricsRegistry(buckets=TASK_BUCKETS)
+        counts = MetricsRegistry(buckets=COUNT_BUCKETS)
+        options = dict(self.client_options)
+        # One pooled session for the whole run by default. Requests are bounded by a semaphore rather than the
+        # pool's connection limit, so transports passed in client_options are held to api_concurrency too
+        api_semaphore = asyncio.Semaphore(self.api_concurrency)
+        transport = options.get("transport") or AiohttpTransport(persistent=True, limit=self.api_concurrency)
+        options["transport"] = _BoundedTransport(transport, api_semaphore)
+        if options.get("transports"):
+            options["transports"] = {machine_type: _BoundedTransport(t, api_semaphore) for machine_type, t in options["transports"].items()}
+        client = Client(**options)
+        llm = _BoundedLLM(self.computer_use_llm, asyncio.Semaphore(self.llm_concurrency))
+
+        pool: asyncio.Queue = asyncio.Queue()
+        agents = [PigAgent(client, machine_id, llm, **self.agent_options) for machine_id in self.machine_ids]
+        for agent in agents:
+            pool.put_nowait(agent)
+
+        async def run_one(index: int, task: str) -> TaskResult:
+            agent = await pool.get()
+            result = TaskResult(index, task, agent.machine_id)
+            started = time.monotonic()
+            try:
+                state = await self._run_with_timeout(agent, task)
+                result.answer = state["messages"][-1].content
+                result.model_calls = sum(isinstance(message, AIMessage) for message in state["messages"])
+                result.steps = sum(tool_call_ran(message) for message in state["messages"])
+            except _TaskTimeout as e:
+                result.error, result.timed_out = e, True
+            except Exception as e:
+                result.error = e
+            finally:
+                result.latency = time.monotonic() - started
+                if result.error is not None:
+                    # The machine is in an unknown state, so start the next task on a fresh connection
+                    try:
+                        await agent.close()
+                    except Exception:
+                        pass
+                pool.put_nowait(agent)
+
+            outcome = "timeout" if result.timed_out else "error" if result.error is not None else "ok"
+            metrics.observe("agent.task", result.latency, outcome=outcome)
+            metrics.increment("agent.tasks", outcome=outcome)
+            if result.ok:
+                counts.observe("agent.steps", result.steps)
+                counts.observe("agent.model_calls", result.model_calls)
+            if on_result is not None:
+                on_result(result)
+            return result
+
+        started = time.monotonic()
+        try:
+            results = await asyncio.gather(*[run_one(index, task) for index, task in enumerate(tasks)])
+        finally:
+            for agent in agents:
+                try:
+                    await agent.close()
+                except Exception:
+                    pass
+            await client.close.aio()
+        return SchedulerReport(list(results), metrics, counts, time.monotonic() - started)
+
+    async def _run_with_timeout(self, agent: PigAgent, task: str) -> Dict:
+        # Unlike wait_for, a TimeoutError raised inside the task, e.g. by aiohttp, is told apart from the deadline expiring
+        run = asyncio.ensure_future(self.run_task(agent, task))
+        try:
+            done, _ = await asyncio.wait({run}, timeout=self.task_timeout)
+        except asyncio.CancelledError:
+            run.cancel()
+            raise
+        if not done:
+            run.cancel()
+            try:
+                await run
+            except (asyncio.CancelledError, Exception):
+                pass
+            raise _TaskTimeout(f"Task ran past the {self.task_timeout}s timeout")
+        return run.result()
+
+    async def run_task(self, agent: PigAgent, task: str) -> Dict:
+        return await agent.graph.ainvoke(
+            {"messages": [SystemMessage(content=self.system_prompt), HumanMessage(task)]}, {"recursion_limit": self.recursion_limit}
+        )
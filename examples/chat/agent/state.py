@@ -0,0 +1,125 @@
+import base64
+import io
+import operator
+import uuid
+from collections import OrderedDict
+from typing import Annotated, Dict, List, Optional, Sequence
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langgraph.graph import MessagesState
+
+
+def track_tool_calls(pending: List[str], messages: Sequence[BaseMessage]) -> List[str]:
+    """Reducer for pending_tool_calls: tool calls on new AI messages open, new ToolMessages close them.
+    Only looks at the messages being added, never the whole history
+    """
+    pending = list(pending or [])
+    for message in messages:
+        if isinstance(message, AIMessage):
+            pending.extend(tool_call["id"] for tool_call in message.tool_calls)
+        elif isinstance(message, ToolMessage) and message.tool_call_id in pending:
+            pending.remove(message.tool_call_id)
+    return pending
+
+
+class ToolCallState(MessagesState):
+    # IDs of tool calls the model made that have no ToolMessage yet
+    pending_tool_calls: Annotated[List[str], track_tool_calls]
+
+
+def message_update(*messages: BaseMessage, **updates) -> Dict:
+    """State update adding messages, keeping pending_tool_calls in step with them"""
+    return {"messages": list(messages), "pending_tool_calls": list(messages), **updates}
+
+
+# Artifact of ToolMessages answering tool calls that never ran. Artifacts aren't sent to the model
+NOT_RUN = "not run"
+
+
+def not_run_tool_message(tool_call_id: str, content: str) -> ToolMessage:
+    """Result for a tool call that was never run, e.g. skipped after an earlier one failed"""
+    return ToolMessage(tool_call_id=tool_call_id, content=content, artifact=NOT_RUN)
+
+
+def tool_call_ran(message: BaseMessage) -> bool:
+    """Whether message is the result of a tool call that actually ran, successfully or not"""
+    return isinstance(message, ToolMessage) and message.artifact != NOT_RUN
+
+
+def unresolved_tool_messages(state: ToolCallState) -> List[ToolMessage]:
+    """Placeholder results for tool calls that were never answered, which the model APIs require"""
+    return [not_run_tool_message(tool_call_id, "tool call ignored") for tool_call_id in state.get("pending_tool_calls", [])]
+
+
+class PigAgentState(ToolCallState):
+    # IDs of the screenshot messages added so far, oldest first
+    screenshot_ids: Annotated[List[str], operator.add]
+    # Steps taken so far, for the trajectory cache: actions, and fingerprints of screenshots the model saw
+    trajectory: Annotated[List[Dict], operator.add]
+    # Fingerprint of the screen the task started from, set when caching trajectories
+    start_fingerprint: Optional[str]
+
+
+class ScreenshotRetention:
+    """Keeps only the most recent screenshots at full resolution.
+
+    Every screenshot stays in the message history, so without pruning a long task
+    sends hundreds of full-size images with each model call. Once more than
+    keep_last screenshots have been taken, older ones are replaced in place by a
+    thumbnail_width-wide thumbnail, or by a short text placeholder when
+    thumbnail_width is None or Pillow isn't installed.
+    """
+
+    def __init__(self, keep_last: Optional[int] = 3, thumbnail_width: Optional[int] = None):
+        self.keep_last = keep_last  # None keeps every screenshot
+        self.thumbnail_width = thumbnail_width
+        self._recent = OrderedDict()  # message ID -> PNG bytes, for thumbnailing once pruned
+
+    def image_message(self, png: bytes) -> HumanMessage:
+        """A new screenshot message, with an ID so it can be replaced later"""
+        message_id = str(uuid.uuid4())
+        if self.keep_last is not None and self.thumbnail_width:
+            self._recent[message_id] = png
+        return HumanMessage(id=message_id, content=[_image_block(png, "image/png")])
+
+    def prune(self, screenshot_ids: List[str], new_ids: Sequence[str]) -> List[HumanMessage]:
+        """Replacements for the screenshots that fall out of the window now that new_ids were taken, including
+        any of new_ids when a turn takes more than keep_last. Send them after the new screenshots, which they replace.
+        Only ever looks at the few IDs crossing the boundary, so it costs the same however long the history is
+        """
+        if self.keep_last is None:
+            return []
+        ids = list(screenshot_ids) + list(new_ids)
+        # Earlier calls already pruned everything before the window as it was
+        first = max(0, len(screenshot_ids) - self.keep_last)
+        last = max(first, len(ids) - self.keep_last)
+        pruned = [self._compacted(message_id) for message_id in ids[first:last]]
+        # Only screenshots still in the window can be thumbnailed later
+        while len(self._recent) > self.keep_last:
+            self._recent.popitem(last=False)
+        return pruned
+
+    def _compacted(self, message_id: str) -> HumanMessage:
+        png = self._recent.pop(message_id, None)
+        thumbnail = _thumbnail(png, self.thumbnail_width) if png is not None else None
+        if thumbnail is not None:
+            content = [{"type": "text", "text": "Earlier screenshot, downscaled:"}, _image_block(thumbnail, "image/jpeg")]
+        else:
+            content = "[Earlier screenshot removed to save context. Take a new screenshot to see the current screen.]"
+        return HumanMessage(id=message_id, content=content)
+
+
+def _image_block(data: bytes, media_type: str) -> dict:
+    return {"type": "image_url", "image_url": {"url": f"data:{media_type};base64,{base64.b64encode(data).decode()}"}}
+
+
+def _thumbnail(png: bytes, width: int) -> Optional[bytes]:
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    image = Image.open(io.BytesIO(png)).convert("RGB")
+    image.thumbnail((width, width * image.height // image.width))
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=70)
+    return output.getvalue()
@@ -0,0 +1,108 @@
+import asyncio
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+from typing import Dict, List, Optional
+
+
+def fingerprint(png: bytes) -> str:
+    """A cheap screen fingerprint: a 64-bit average hash when Pillow is installed, else a hash of the exact bytes.
+    The average hash shrugs off small changes like the taskbar clock ticking over
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        return "sha256:" + hashlib.sha256(png).hexdigest()
+    pixels = list(Image.open(io.BytesIO(png)).convert("L").resize((8, 8)).getdata())
+    average = sum(pixels) / len(pixels)
+    bits = "".join("1" if pixel > average else "0" for pixel in pixels)
+    return "ahash:" + format(int(bits, 2), "016x")
+
+
+def fingerprints_match(a: str, b: str, max_distance: int = 4) -> bool:
+    """Whether two fingerprints show the same screen, allowing max_distance differing bits for average hashes"""
+    if a.startswith("ahash:") and b.startswith("ahash:"):
+        return bin(int(a[6:], 16) ^ int(b[6:], 16)).count("1") <= max_distance
+    return a == b
+
+
+def task_key(task: str) -> str:
+    return " ".join(task.lower().split())
+
+
+class TrajectoryCache:
+    """Action sequences of successful PigAgent runs, for replaying repeat tasks without the model.
+
+    Trajectories are keyed by task text and the fingerprint of the screen the
+    task started from. Each is a list of steps: {"name": ..., "args": ...} for
+    an action, or {"checkpoint": fingerprint} for a screenshot the model saw
+    at that point, which replay checks the screen against, plus the model's
+    final answer. With path set, trajectories are loaded from and saved to
+    that JSON file.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_per_task: int = 5, max_distance: int = 4):
+        self.path = path
+        self.max_per_task = max_per_task
+        self.max_distance = max_distance
+        self.trajectories: Dict[str, List[Dict]] = {}  # task key -> trajectories, newest last
+        self._save_lock = threading.Lock()
+        self._version = self._saved_version = 0  # bumped by every change, to skip writing a snapshot older than the file
+        if path is not None:
+            self.load()
+
+    def lookup(self, task: str, start: str) -> Optional[Dict]:
+        """The newest trajectory for task that started from a screen matching start, if any"""
+        for trajectory in reversed(self.trajectories.get(task_key(task), [])):
+            if fingerprints_match(trajectory["start"], start, self.max_distance):
+                return trajectory
+        return None
+
+    def record(self, task: str, start: str, steps: List[Dict], result) -> None:
+        """Store a successful run, replacing any earlier one from the same starting screen"""
+        self._add(task, start, steps, result)
+        if self.path is not None:
+            self.save()
+
+    async def arecord(self, task: str, start: str, steps: List[Dict], result) -> None:
+        """record for async code: the file is written on a worker thread, so other agents on the loop don't wait on it"""
+        self._add(task, start, steps, result)
+        if self.path is not None:
+            snapshot = {key: list(trajectories) for key, trajectories in self.trajectories.items()}
+            await asyncio.get_running_loop().run_in_executor(None, self._write, snapshot, self._version)
+
+    def _add(self, task: str, start: str, steps: List[Dict], result) -> None:
+        trajectories = [t for t in self.trajectories.get(task_key(task), []) if not fingerprints_match(t["start"], start, self.max_distance)]
+        trajectories.append({"start": start, "steps": steps, "result": result})
+        self.trajectories[task_key(task)] = trajectories[-self.max_per_task :]
+        self._version += 1
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                self.trajectories = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def save(self):
+        self._write(self.trajectories, self._version)
+
+    def _write(self, trajectories: Dict[str, List[Dict]], version: int):
+        # Written atomically, so a crash never leaves a partial file
+        with self._save_lock:
+            if version < self._saved_version:
+                return  # a newer snapshot was written by another thread first
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=directory, prefix=".trajectories-")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(trajectories, f)
+                os.replace(tmp, self.path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+            self._saved_version = version
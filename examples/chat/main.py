@@ -1,17 +1,17 @@
-from agent import ChatAgent
-from agent.prompts import chat_system_prompt, pig_system_prompt
 import os
+
 from langchain_anthropic import ChatAnthropic
 from langchain_openai import ChatOpenAI
+
+from agent import ChatAgent
+from agent.prompts import chat_system_prompt, pig_system_prompt
 from pig import Client
 
 # Choose our LLMs, compatible with Langchain Chat models.
-chat_llm = ChatOpenAI(model="gpt-4o") # For the outer chat loop
+chat_llm = ChatOpenAI(model="gpt-4o")  # For the outer chat loop
 
-computer_use_llm = ChatAnthropic( # For computer use agent
-    model="claude-3-7-sonnet-20250219", 
-    temperature=0.1, 
-    max_retries=50
+computer_use_llm = ChatAnthropic(  # For computer use agent
+    model="claude-3-7-sonnet-20250219", temperature=0.1, max_retries=50
 )
 
 # Initialize our Pig client.
@@ -28,8 +28,8 @@ agent = ChatAgent(
     chat_llm=chat_llm,
     chat_system_prompt=chat_system_prompt,
     computer_use_llm=computer_use_llm,
-    computer_use_system_prompt=pig_system_prompt
+    computer_use_system_prompt=pig_system_prompt,
 )
 
 # Run the agent with system prompts. Will prompt for user input, and print the output.
-agent.run()
\ No newline at end of file
+agent.run()
@@ -1,19 +1,38 @@
 from .api_client import APIClient, APIError
+from .cache import ResponseCache
+from .codec import JSONCodec
 from .connections import Connection, Connections
+from .coordinates import CoordinateMapper
+from .group import ConnectionGroup, GroupError, GroupResult
 from .machines import LocalMachine, Machine, MachineType, RemoteMachine
+from .metrics import MetricsRegistry
 from .pig import Client
 from .sync_wrapper import AsyncContextError, _MakeSync
+from .transport import AiohttpTransport, HTTPXTransport, InMemoryTransport, Transport, TransportResponse, UnixSocketTransport
 
 __all__ = [
     "APIClient",
     "APIError",
+    "JSONCodec",
     "Client",
     "Connection",
     "Connections",
+    "CoordinateMapper",
+    "ConnectionGroup",
+    "GroupResult",
+    "GroupError",
     "Machine",
     "RemoteMachine",
     "LocalMachine",
     "MachineType",
+    "MetricsRegistry",
+    "ResponseCache",
+    "Transport",
+    "TransportResponse",
+    "AiohttpTransport",
+    "HTTPXTransport",
+    "UnixSocketTransport",
+    "InMemoryTransport",
     "AsyncContextError",
     "_MakeSync",
 ]
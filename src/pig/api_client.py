@@ -1,9 +1,14 @@
+import asyncio
+import copy
 import os
-from typing import Any, Dict, Optional, Union
+import time
+import weakref
+from typing import Any, Dict, List, Optional, Tuple, Union
 
-from aiohttp import ClientSession, ClientTimeout
-from aiohttp.client import ClientResponse
-from aiohttp_retry import ExponentialRetry, RetryClient
+from .cache import CachedResponse, ResponseCache
+from .codec import JSONCodec, default_codec
+from .metrics import MetricsRegistry, request_tags
+from .transport import AiohttpTransport, Transport, TransportResponse
 
 try:
     from importlib.metadata import version
@@ -26,54 +31,79 @@ class APIError(Exception):
         self.message = message
         super().__init__(f"HTTP {status_code}: {message}")
 
+    def __reduce__(self):
+        # Rebuild from the original arguments so errors survive pickling, e.g. from a worker process
+        return type(self), (self.status_code, self.message)
+
 
 class APIClient:
-    def __init__(self, api_key: str) -> None:
+    # Retry policy: exponential backoff on 503 only, indefinitely
+    retry_statuses = frozenset({503})
+    retry_start = 0.1
+    retry_factor = 1.3  # Exponential backoff factor
+    retry_max = 60  # Max delay of 60 seconds between retries
+
+    def __init__(
+        self,
+        api_key: str,
+        codec: Optional[JSONCodec] = None,
+        metrics: Optional[MetricsRegistry] = None,
+        transport: Optional[Transport] = None,
+        cache: Optional[ResponseCache] = None,
+    ) -> None:
         self.api_key = api_key
-
-    def _session(self) -> RetryClient:
-        retry_options = ExponentialRetry(
-            attempts=float("inf"),  # Infinite retries
-            start_timeout=0.1,
-            max_timeout=60,  # Max delay of 60 seconds between retries
-            factor=1.3,  # Exponential backoff factor
-            statuses={503},  # Only retry on 503 status
-            retry_all_server_errors=False,
-        )
-
-        session = ClientSession(
-            headers={
-                "Authorization": f"Bearer {self.api_key}",
-                "X-Client-Language": "python",
-                "X-Client-Version": __version__,
-            },
-            timeout=ClientTimeout(total=900),  # 15 minute total timeout
-        )
-
-        retry_client = RetryClient(client_session=session, retry_options=retry_options)
-        return retry_client
-
-    async def _handle_response(self, response: ClientResponse, expect_json: bool = True) -> Union[Dict[str, Any], bytes]:
+        self.codec = codec or default_codec()
+        self.metrics = metrics
+        self.transport = transport or AiohttpTransport()
+        self.cache = cache  # set to a ResponseCache to revalidate JSON GETs with ETag / Last-Modified
+        self._mounts: List[Tuple[str, Transport]] = []
+        # In-flight coalesced GETs, per event loop since tasks can't be awaited across loops
+        self._inflight: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple[Any, ...], asyncio.Future]]" = weakref.WeakKeyDictionary()
+        self._default_headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "X-Client-Language": "python",
+            "X-Client-Version": __version__,
+        }
+        if metrics is not None:
+            self.transport.instrument(metrics)
+
+    def mount(self, prefix: str, transport: Transport) -> None:
+        """Send requests for URLs starting with prefix through transport instead of the default"""
+        if self.metrics is not None:
+            transport.instrument(self.metrics)
+        self._mounts.append((prefix, transport))
+        self._mounts.sort(key=lambda mount: len(mount[0]), reverse=True)  # longest prefix wins
+
+    def _transport_for(self, url: str) -> Transport:
+        for prefix, transport in self._mounts:
+            if url.startswith(prefix):
+                return transport
+        return self.transport
+
+    async def close(self) -> None:
+        """Release pooled connections held for the running event loop"""
+        for transport in {id(t): t for t in [self.transport, *(t for _, t in self._mounts)]}.values():
+            await transport.close()
+
+    def _handle_response(self, response: TransportResponse, expect_json: bool = True) -> Union[Dict[str, Any], bytes]:
+        body = response.body
         try:
             if response.status >= 400:
-                error_body = await response.text()
                 try:
-                    error_json = await response.json()
-                    error_msg = error_json.get("detail", error_body)
+                    error_msg = self.codec.loads(body).get("detail", body.decode(errors="replace"))
                 except Exception:
-                    error_msg = error_body
+                    error_msg = body.decode(errors="replace")
                 raise APIError(response.status, error_msg)
 
             # Handle successful responses
-            if not response.content or response.content_length == 0:
+            if not body:
                 return {}
 
             if expect_json:
                 if not response.content_type.startswith("application/json"):
                     raise APIError(response.status, f"Expected JSON response but got content-type: {response.content_type}")
-                return await response.json() if response.content else {}
+                return self.codec.loads(body)
 
-            body = await response.read()
             return body
 
         except APIError:
@@ -81,26 +111,114 @@ class APIClient:
         except Exception as e:
             raise APIError(response.status, str(e)) from e
 
-    async def get(self, url: str, headers: Optional[Dict[str, Any]] = None, expect_json: bool = True) -> Union[Dict[str, Any], ClientResponse]:
-        async with self._session() as session:
-            async with session.get(url, headers=headers) as response:
-                return await self._handle_response(response, expect_json)
+    def _revalidated(self, key: str, entry: Optional[CachedResponse], response: TransportResponse, tags: Optional[Dict[str, str]]) -> TransportResponse:
+        """Serve a 304 from the cache, and store or drop cacheable 200s"""
+        if response.status == 304 and entry is not None:
+            if tags is not None:
+                self.metrics.increment("pig.http.not_modified", **tags)
+            return TransportResponse(200, {"Content-Type": entry.content_type}, entry.body)
+        if response.status == 200:
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            no_store = "no-store" in response.headers.get("Cache-Control", "")
+            if (etag or last_modified) and not no_store and response.content_type == "application/json":
+                self.cache.put(key, CachedResponse(etag, last_modified, response.content_type, response.body))
+            elif entry is not None:
+                self.cache.discard(key)
+        return response
+
+    async def _request(
+        self, method: str, url: str, data: Optional[Any] = None, headers: Optional[Dict[str, Any]] = None, expect_json: bool = True
+    ) -> Union[Dict[str, Any], bytes]:
+        body = None
+        request_headers = {**self._default_headers, **headers} if headers else self._default_headers
+        if data is not None:
+            body = self.codec.dumps(data)
+            request_headers = {**request_headers, "Content-Type": "application/json"}
+
+        cache_key = cache_entry = None
+        send_headers = request_headers
+        if self.cache is not None and method == "GET" and expect_json:
+            cache_key = self.cache.key(url, request_headers)
+            cache_entry = self.cache.get(cache_key)
+            if cache_entry is not None:
+                send_headers = dict(request_headers)
+                if cache_entry.etag:
+                    send_headers["If-None-Match"] = cache_entry.etag
+                if cache_entry.last_modified:
+                    send_headers["If-Modified-Since"] = cache_entry.last_modified
+
+        transport = self._transport_for(url)
+        tags = request_tags(url, headers) if self.metrics is not None else None
+        started = time.perf_counter()
+        attempt = 0
+        try:
+            while True:
+                attempt += 1
+                response = await transport.request(method, url, body, send_headers, tags)
+                if response.status not in self.retry_statuses:
+                    if cache_key is not None:
+                        response = self._revalidated(cache_key, cache_entry, response, tags)
+                    return self._handle_response(response, expect_json)
+                if tags is not None:
+                    self.metrics.increment("pig.http.retries", **tags)
+                await asyncio.sleep(min(self.retry_start * self.retry_factor**attempt, self.retry_max))
+        finally:
+            if tags is not None:
+                # Wall time including retries and backoff
+                self.metrics.observe("pig.http.total", time.perf_counter() - started, **tags)
+
+    async def _coalesced_get(self, url: str, headers: Optional[Dict[str, Any]], expect_json: bool) -> Union[Dict[str, Any], bytes]:
+        """Share one in-flight GET, and its result or error, among concurrent identical callers. Each gets its own copy of the result"""
+        loop = asyncio.get_running_loop()
+        inflight = self._inflight.get(loop)
+        if inflight is None:
+            inflight = self._inflight[loop] = {}
+        key = (url, tuple(sorted(headers.items())) if headers else (), expect_json)
+        task = inflight.get(key)
+        if task is None:
+            task = inflight[key] = asyncio.ensure_future(self._request("GET", url, headers=headers, expect_json=expect_json))
+
+            def done(task: asyncio.Future) -> None:
+                if inflight.get(key) is task:  # a write may have dropped it, and a newer GET taken its place
+                    del inflight[key]
+                if not task.cancelled():
+                    task.exception()  # mark retrieved, in case every caller was cancelled
+
+            task.add_done_callback(done)
+        elif self.metrics is not None:
+            self.metrics.increment("pig.http.coalesced", **request_tags(url, headers))
+        # Shielded so one caller being cancelled doesn't fail the others
+        result = await asyncio.shield(task)
+        return result if isinstance(result, bytes) else copy.deepcopy(result)
+
+    async def _write(self, method: str, url: str, **kwargs: Any) -> Union[Dict[str, Any], bytes]:
+        try:
+            return await self._request(method, url, **kwargs)
+        finally:
+            # GETs in flight may have started before this write, so later reads must not join them
+            inflight = self._inflight.get(asyncio.get_running_loop())
+            if inflight:
+                inflight.clear()
+
+    async def get(self, url: str, headers: Optional[Dict[str, Any]] = None, expect_json: bool = True, coalesce: bool = True) -> Union[Dict[str, Any], bytes]:
+        """GET url. Concurrent identical GETs share one request, each receiving its own copy of the result.
+        A GET never joins one that started before a write on the same client finished; pass coalesce=False
+        when the read must start after the call does regardless, e.g. after input sent elsewhere.
+        """
+        if coalesce:
+            return await self._coalesced_get(url, headers, expect_json)
+        return await self._request("GET", url, headers=headers, expect_json=expect_json)
 
     async def post(
         self, url: str, data: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, Any]] = None, expect_json: bool = True
-    ) -> Union[Dict[str, Any], ClientResponse]:
-        async with self._session() as session:
-            async with session.post(url, json=data, headers=headers) as response:
-                return await self._handle_response(response, expect_json)
+    ) -> Union[Dict[str, Any], bytes]:
+        return await self._write("POST", url, data=data, headers=headers, expect_json=expect_json)
 
     async def put(
         self, url: str, data: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, Any]] = None, expect_json: bool = True
-    ) -> Union[Dict[str, Any], ClientResponse]:
-        async with self._session() as session:
-            async with session.put(url, json=data, headers=headers) as response:
-                return await self._handle_response(response, expect_json)
-
-    async def delete(self, url: str, headers: Optional[Dict[str, Any]] = None, expect_json: bool = True) -> Union[Dict[str, Any], ClientResponse]:
-        async with self._session() as session:
-            async with session.delete(url, headers=headers) as response:
-                return await self._handle_response(response, expect_json)
+    ) -> Union[Dict[str, Any], bytes]:
+        return await self._write("PUT", url, data=data, headers=headers, expect_json=expect_json)
+
+    async def delete(self, url: str, headers: Optional[Dict[str, Any]] = None, expect_json: bool = True) -> Union[Dict[str, Any], bytes]:
+        return await self._write("DELETE", url, headers=headers, expect_json=expect_json)
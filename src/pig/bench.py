@@ -0,0 +1,153 @@
+import asyncio
+import random
+import time
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+from tabulate import tabulate
+
+from .connections import Connection
+from .metrics import Histogram
+
+# Actions a benchmark can mix, each given a connection and a random source
+ACTIONS: Dict[str, Callable[[Connection, random.Random], Awaitable[Any]]] = {
+    "key": lambda conn, rng: conn.key.aio("shift"),
+    "type": lambda conn, rng: conn.type.aio("pig"),
+    "mouse_move": lambda conn, rng: conn.mouse_move.aio(rng.randrange(800), rng.randrange(600)),
+    "left_click": lambda conn, rng: conn.left_click.aio(rng.randrange(800), rng.randrange(600)),
+    "cursor_position": lambda conn, rng: conn.cursor_position.aio(),
+    "dimensions": lambda conn, rng: conn.dimensions.aio(refresh=True),
+    "screenshot": lambda conn, rng: conn.screenshot.aio(),
+}
+
+DEFAULT_MIX = "mouse_move=4,left_click=2,type=2,screenshot=1"
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    """Parse an action mix like 'mouse_move=4,screenshot=1' into weights"""
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.strip().partition("=")
+        if name not in ACTIONS:
+            raise ValueError(f"Unknown action {name!r}, expected one of {', '.join(ACTIONS)}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+class BenchReport:
+    """Latency, error and throughput results of a benchmark run"""
+
+    def __init__(self) -> None:
+        self.latencies: Dict[str, Histogram] = {}
+        self.errors: Counter = Counter()
+        self.error_types: Counter = Counter()
+        self.elapsed = 0.0
+        self.behind = 0  # actions started late because concurrency was saturated
+
+    def record(self, action: str, seconds: float, error: Optional[BaseException] = None) -> None:
+        if action not in self.latencies:
+            self.latencies[action] = Histogram()
+        self.latencies[action].observe(seconds)
+        if error is not None:
+            self.errors[action] += 1
+            self.error_types[type(error).__name__] += 1
+
+    @property
+    def total(self) -> int:
+        return sum(histogram.count for histogram in self.latencies.values())
+
+    @property
+    def throughput(self) -> float:
+        return self.total / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "elapsed_s": self.elapsed,
+            "total": self.total,
+            "throughput_per_s": self.throughput,
+            "behind": self.behind,
+            "errors": dict(self.error_types),
+            "actions": {
+                action: {**histogram.snapshot(), "errors": self.errors[action], "error_rate": self.errors[action] / histogram.count}
+                for action, histogram in sorted(self.latencies.items())
+            },
+        }
+
+    def format(self) -> str:
+        rows = []
+        for action, histogram in sorted(self.latencies.items()):
+            rows.append(
+                [
+                    action,
+                    histogram.count,
+                    self.errors[action],
+                    f"{self.errors[action] / histogram.count:.1%}",
+                    *(f"{histogram.percentile(q) * 1e3:.1f}" for q in (50, 95, 99)),
+                ]
+            )
+        table = tabulate(rows, headers=["action", "count", "errors", "error %", "p50 ms", "p95 ms", "p99 ms"], tablefmt="simple")
+        summary = f"{self.total} actions in {self.elapsed:.1f}s, {self.throughput:.1f} actions/s"
+        if self.behind:
+            summary += f", {self.behind} started late (raise --concurrency to hold the target rate)"
+        if self.error_types:
+            summary += "\nerrors: " + ", ".join(f"{name} x{count}" for name, count in self.error_types.most_common())
+        return f"{table}\n\n{summary}"
+
+
+async def run_bench(
+    connections: Sequence[Connection],
+    mix: Dict[str, float],
+    rate: float,
+    duration: float,
+    concurrency: int = 16,
+    seed: Optional[int] = None,
+) -> BenchReport:
+    """Issue actions across connections at a target total rate for duration seconds.
+
+    Actions are scheduled open-loop at a fixed rate, so slow responses don't
+    lower the offered load, with at most concurrency in flight at once.
+    """
+    if not connections:
+        raise ValueError("run_bench needs at least one connection")
+    if rate <= 0:
+        raise ValueError(f"rate must be positive, got {rate}")
+    if concurrency < 1:
+        raise ValueError(f"concurrency must be at least 1, got {concurrency}")
+    rng = random.Random(seed)
+    names: List[str] = list(mix)
+    weights = [mix[name] for name in names]
+    report = BenchReport()
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = set()
+
+    async def issue(conn: Connection, action: str) -> None:
+        started = time.perf_counter()
+        try:
+            await ACTIONS[action](conn, rng)
+            report.record(action, time.perf_counter() - started)
+        except Exception as e:
+            report.record(action, time.perf_counter() - started, e)
+        finally:
+            semaphore.release()
+
+    started = time.perf_counter()
+    i = 0
+    while True:
+        scheduled = started + i / rate
+        if scheduled - started >= duration:
+            break
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if semaphore.locked():
+            report.behind += 1
+        await semaphore.acquire()
+        task = asyncio.ensure_future(issue(connections[i % len(connections)], rng.choices(names, weights)[0]))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        i += 1
+
+    if tasks:
+        await asyncio.gather(*tasks)
+    report.elapsed = time.perf_counter() - started
+    return report
@@ -0,0 +1,103 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Mapping, NamedTuple, Optional
+
+
+class CachedResponse(NamedTuple):
+    etag: Optional[str]
+    last_modified: Optional[str]
+    content_type: str
+    body: bytes
+
+
+class ResponseCache:
+    """Validators and bodies of JSON GET responses, for conditional requests.
+
+    APIClient revalidates cached entries with If-None-Match / If-Modified-Since
+    and reuses the stored body when the server answers 304 Not Modified. Only
+    responses carrying an ETag or Last-Modified header are kept, at most
+    max_entries of them, least recently used first out. With path set, entries
+    are loaded from and saved to that file so they outlive the process.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = 256) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        if path is not None:
+            self.load()
+
+    @staticmethod
+    def key(url: str, headers: Mapping[str, str]) -> str:
+        """Entries are keyed by URL and request headers, hashed so credentials are never stored"""
+        material = "\n".join([url, *(f"{name}: {value}" for name, value in sorted(headers.items()))])
+        return hashlib.sha256(material.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, entry: CachedResponse) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def load(self) -> None:
+        """Read entries from path, ignoring a missing or unreadable file"""
+        try:
+            with open(self.path) as f:
+                stored: Dict[str, Dict[str, Optional[str]]] = json.load(f)
+            entries = [
+                (key, CachedResponse(value["etag"], value["last_modified"], value["content_type"], value["body"].encode("utf-8", "surrogateescape")))
+                for key, value in stored.items()
+            ]
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            return
+        with self._lock:
+            self._entries.update(entries[-self.max_entries :])
+
+    def save(self) -> None:
+        """Write entries to path, atomically so concurrent CLI runs never see a partial file"""
+        if self.path is None:
+            return
+        with self._lock:
+            stored = {
+                key: {
+                    "etag": entry.etag,
+                    "last_modified": entry.last_modified,
+                    "content_type": entry.content_type,
+                    "body": entry.body.decode("utf-8", "surrogateescape"),
+                }
+                for key, entry in self._entries.items()
+            }
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".pig-cache-")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(stored, f, separators=(",", ":"))
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 import asyncio
+import json
 import os
 
 import click
@@ -7,10 +8,19 @@ import iso8601
 from simple_term_menu import TerminalMenu
 from tabulate import tabulate
 
+from .bench import DEFAULT_MIX, parse_mix, run_bench
+from .cache import ResponseCache
 from .pig import Client
 
+
+def cache_path():
+    """Where responses are kept between runs, so unchanged listings revalidate as empty 304s"""
+    cache_dir = os.environ.get("PIG_CACHE_DIR") or os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "pig")
+    return os.path.join(cache_dir, "responses.json")
+
+
 # Global client
-client = Client()
+client = Client(cache=ResponseCache(path=cache_path()))
 
 
 # Additional CRUD calls supported in CLI but not via SDK
@@ -273,6 +283,71 @@ def ls(all):
     print_machines(machines, show_terminated=all)
 
 
+def succeeded(results: list) -> list:
+    """Results of gather(..., return_exceptions=True) that aren't exceptions"""
+    return [result for result in results if not isinstance(result, BaseException)]
+
+
+def raise_first_error(results: list) -> None:
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+
+
+@cli.command()
+@click.option("--machines", "-n", "count", default=1, show_default=True, type=click.IntRange(min=1), help="Number of new Machines to create for the run")
+@click.option("--id", "ids", multiple=True, help="Reuse an existing Machine instead of creating one (repeatable)")
+@click.option("--mix", default=DEFAULT_MIX, show_default=True, help="Weighted action mix")
+@click.option("--rate", default=10.0, show_default=True, type=click.FloatRange(min=0, min_open=True), help="Target actions per second across all Machines")
+@click.option("--duration", default=30.0, show_default=True, help="Seconds to run for")
+@click.option("--concurrency", default=16, show_default=True, type=click.IntRange(min=1), help="Maximum actions in flight")
+@click.option("--json", "as_json", is_flag=True, help="Print results as JSON")
+@click.option("-y", "auto_approve", is_flag=True, help="Skip confirmation prompt")
+def bench(count, ids, mix, rate, duration, concurrency, as_json, auto_approve):
+    """Load test Machines with a mix of actions"""
+    try:
+        weights = parse_mix(mix)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--mix") from e
+
+    if not ids and not auto_approve:
+        if not prompt_confirm(f"You're about to create {count} Machine{'' if count == 1 else 's'} for benchmarking, deleted when the run ends."):
+            return
+
+    async def run():
+        created = []
+        try:
+            if ids:
+                machines = await asyncio.gather(*[client.machines.get.aio(id) for id in ids])
+            else:
+                click.echo(f"Creating {count} Machine{'' if count == 1 else 's'}...", err=as_json)
+                # Collect every Machine that was created, even if others failed, so none escape cleanup
+                results = await asyncio.gather(*[client.machines.create.aio() for _ in range(count)], return_exceptions=True)
+                machines = created = succeeded(results)
+                raise_first_error(results)
+            results = await asyncio.gather(*[client.connections.create.aio(machine) for machine in machines], return_exceptions=True)
+            connections = succeeded(results)
+            try:
+                raise_first_error(results)
+                click.echo(
+                    f"Running {mix} at {rate:g} actions/s for {duration:g}s across {len(connections)} Machine{'' if len(connections) == 1 else 's'}...\n",
+                    err=as_json,
+                )
+                return await run_bench(connections, weights, rate=rate, duration=duration, concurrency=concurrency)
+            finally:
+                await asyncio.gather(*[client.connections.delete.aio(conn.machine.id, conn.id) for conn in connections], return_exceptions=True)
+        finally:
+            if created:
+                click.echo("Deleting benchmark Machines...", err=as_json)
+                await asyncio.gather(*[client.machines.delete.aio(machine.id) for machine in created], return_exceptions=True)
+
+    report = asyncio.run(run())
+    if as_json:
+        click.echo(json.dumps(report.as_dict(), indent=2))
+    else:
+        click.echo(report.format())
+
+
 @cli.group()
 def img():
     """Commands for managing Machine images"""
@@ -307,4 +382,10 @@ cli.add_command(img)
 
 
 def main():
-    cli()
+    try:
+        cli()
+    finally:
+        try:
+            client._api_client.cache.save()
+        except OSError:
+            pass  # a read-only home shouldn't break the CLI
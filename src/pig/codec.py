@@ -0,0 +1,57 @@
+import json
+from typing import Any, Optional
+
+
+class JSONCodec:
+    """Encodes request bodies and decodes response bodies. Uses the stdlib json module"""
+
+    name = "json"
+
+    def dumps(self, obj: Any) -> bytes:
+        return json.dumps(obj, separators=(",", ":")).encode()
+
+    def loads(self, data: bytes) -> Any:
+        return json.loads(data)
+
+
+class OrjsonCodec(JSONCodec):
+    """JSON codec backed by orjson"""
+
+    name = "orjson"
+
+    def __init__(self) -> None:
+        import orjson
+
+        self.dumps = orjson.dumps
+        self.loads = orjson.loads
+
+
+class MsgspecCodec(JSONCodec):
+    """JSON codec backed by msgspec"""
+
+    name = "msgspec"
+
+    def __init__(self) -> None:
+        import msgspec
+
+        self.dumps = msgspec.json.Encoder().encode
+        self.loads = msgspec.json.Decoder().decode
+
+
+def default_codec(preferred: Optional[str] = None) -> JSONCodec:
+    """Pick the fastest codec installed: orjson, then msgspec, then the stdlib.
+
+    preferred may name a codec ("orjson", "msgspec" or "json") to use it explicitly.
+    """
+    codecs = {codec.name: codec for codec in (OrjsonCodec, MsgspecCodec, JSONCodec)}
+    if preferred is not None:
+        if preferred not in codecs:
+            raise ValueError(f"Unknown JSON codec {preferred!r}, expected one of {', '.join(codecs)}")
+        return codecs[preferred]()
+
+    for codec in codecs.values():
+        try:
+            return codec()
+        except ImportError:
+            continue
+    return JSONCodec()
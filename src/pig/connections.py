@@ -1,136 +1,292 @@
+import asyncio
 import logging
 import os
+import struct
 import time
-from typing import Optional, Tuple
+from types import MappingProxyType
+from typing import Any, Dict, Optional, Sequence, Tuple
 
+from . import vision
 from .api_client import APIError
 from .machines import LocalMachine, RemoteMachine
 from .sync_wrapper import _MakeSync
 
 UI_BASE_URL = os.environ.get("PIG_UI_BASE_URL", "https://pig.dev")
 
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def _png_dimensions(data: bytes) -> Optional[Tuple[int, int]]:
+    """Read width and height from a PNG's IHDR header, if data is a PNG"""
+    if len(data) < 24 or data[:8] != _PNG_SIGNATURE or data[12:16] != b"IHDR":
+        return None
+    return struct.unpack(">II", data[16:24])
+
+
+# Piglet routes used by Connection, resolved to full URLs once per connection
+_ROUTES = {
+    "dimensions": "computer/display/dimensions",
+    "screenshot": "computer/display/screenshot",
+    "key": "computer/input/keyboard/key",
+    "type": "computer/input/keyboard/type",
+    "cursor_position": "computer/input/mouse/position",
+    "mouse_move": "computer/input/mouse/move",
+    "mouse_click": "computer/input/mouse/click",
+}
+
 
 class Connection:
-    """Represents an active connection to a machine"""
+    """Represents an active connection to a machine.
+
+    Input methods take observe=True to also return a screenshot taken settle
+    seconds after the input, for the common act-then-look step in one call.
+    """
+
+    __slots__ = ("_client", "machine", "id", "_logger", "_dimensions", "_headers", "_urls", "_input_epoch", "_prefetch")
 
     def __init__(self, machine, connection_id: str) -> None:
         self._client = machine._client
         self.machine = machine
         self.id = connection_id
         self._logger = logging.getLogger(f"pig-{machine.id}")
+        self._dimensions: Optional[Tuple[int, int]] = None
+
+        # Counts input sent, so a prefetched screenshot can tell whether the screen may have changed since
+        self._input_epoch = 0
+        self._prefetch: Optional[Tuple[int, asyncio.AbstractEventLoop, asyncio.Future]] = None
+
+        # Routing is fixed for the life of the connection, so build it once rather than per call
+        self._headers = MappingProxyType({"X-Machine-ID": str(machine.id), "X-Connection-ID": str(connection_id)})
+        base = self._client._machine_base(machine)
+        self._urls = MappingProxyType({name: base + route for name, route in _ROUTES.items()})
 
     @_MakeSync
-    async def dimensions(self) -> Tuple[int, int]:
-        """Get the dimensions of the machine"""
-        route = "computer/display/dimensions"
-        headers = {"X-Machine-ID": str(self.machine.id), "X-Connection-ID": str(self.id)}
-        url = self._client._machine_url(self.machine, route)
-        dimensions = await self._client._api_client.get(url, headers=headers)
-        return dimensions["width"], dimensions["height"]
+    async def dimensions(self, refresh: bool = False) -> Tuple[int, int]:
+        """Get the dimensions of the machine. Cached per connection, pass refresh=True to refetch"""
+        if self._dimensions is not None and not refresh:
+            return self._dimensions
+        url = self._urls["dimensions"]
+        dimensions = await self._client._api_client.get(url, headers=self._headers)
+        self._dimensions = dimensions["width"], dimensions["height"]
+        return self._dimensions
+
+    def invalidate_dimensions(self) -> None:
+        """Drop cached dimensions, e.g. after changing the display resolution"""
+        self._dimensions = None
 
     @_MakeSync
     async def width(self) -> int:
         """Get the width of the machine"""
-        return (await self.dimensions())[0]
+        return (await self.dimensions.aio())[0]
 
     @_MakeSync
     async def height(self) -> int:
         """Get the height of the machine"""
-        return (await self.dimensions())[1]
+        return (await self.dimensions.aio())[1]
+
+    async def _send_input(self, route: str, data: Dict[str, Any]) -> None:
+        try:
+            await self._client._api_client.post(self._urls[route], data=data, headers=self._headers)
+        finally:
+            # Sent or not, the screen may have changed, so frames prefetched before now are stale
+            self._input_epoch += 1
 
     @_MakeSync
-    async def key(self, combo: str) -> None:
+    async def key(self, combo: str, observe: bool = False, settle: float = 0.3) -> Optional[bytes]:
         """Send a key combo to the machine. Examples: 'a', 'Return', 'alt+Tab', 'ctrl+c ctrl+v'"""
 
-        route = "computer/input/keyboard/key"
         data = {"text": combo}
-        headers = {"X-Machine-ID": str(self.machine.id), "X-Connection-ID": str(self.id)}
-        url = self._client._machine_url(self.machine, route)
-
-        await self._client._api_client.post(url, data=data, headers=headers)
+        await self._send_input("key", data)
+        return await self._observe(observe, settle)
 
     @_MakeSync
-    async def type(self, text: str) -> None:
+    async def type(self, text: str, observe: bool = False, settle: float = 0.3) -> Optional[bytes]:
         """Type text into the machine"""
-        route = "computer/input/keyboard/type"
         data = {"text": text}
-        headers = {"X-Machine-ID": str(self.machine.id), "X-Connection-ID": str(self.id)}
-        url = self._client._machine_url(self.machine, route)
-        await self._client._api_client.post(url, data=data, headers=headers)
+        await self._send_input("type", data)
+        return await self._observe(observe, settle)
 
     @_MakeSync
     async def cursor_position(self) -> Tuple[int, int]:
         """Get the current cursor position"""
-        route = "computer/input/mouse/position"
-        headers = {"X-Machine-ID": str(self.machine.id), "X-Connection-ID": str(self.id)}
-        url = self._client._machine_url(self.machine, route)
-        response = await self._client._api_client.get(url, headers=headers)
+        url = self._urls["cursor_position"]
+        # Not coalesced: the position must reflect input sent before this call
+        response = await self._client._api_client.get(url, headers=self._headers, coalesce=False)
         return response["x"], response["y"]
 
     @_MakeSync
-    async def mouse_move(self, x: int, y: int) -> None:
+    async def mouse_move(self, x: int, y: int, observe: bool = False, settle: float = 0.3) -> Optional[bytes]:
         """Move mouse to specified coordinates"""
-        route = "computer/input/mouse/move"
         data = {"x": x, "y": y}
-        headers = {"X-Machine-ID": str(self.machine.id), "X-Connection-ID": str(self.id)}
-        url = self._client._machine_url(self.machine, route)
-        await self._client._api_client.post(url, data=data, headers=headers)
+        await self._send_input("mouse_move", data)
+        return await self._observe(observe, settle)
 
     async def _mouse_click(self, button: str, down: bool, x: Optional[int] = None, y: Optional[int] = None) -> None:
         """Internal method for mouse clicks"""
-        route = "computer/input/mouse/click"
         data = {"button": button, "down": down, "x": x, "y": y}
-        headers = {"X-Machine-ID": str(self.machine.id), "X-Connection-ID": str(self.id)}
-        url = self._client._machine_url(self.machine, route)
-        await self._client._api_client.post(url, data=data, headers=headers)
+        await self._send_input("mouse_click", data)
 
     @_MakeSync
-    async def left_click(self, x: Optional[int] = None, y: Optional[int] = None) -> None:
+    async def left_click(self, x: Optional[int] = None, y: Optional[int] = None, observe: bool = False, settle: float = 0.3) -> Optional[bytes]:
         """Left click at specified coordinates"""
         if x is not None and y is not None:
             await self.mouse_move.aio(x, y)
         await self._mouse_click("left", True, x, y)
-        time.sleep(0.1)
+        await asyncio.sleep(0.1)
         await self._mouse_click("left", False, x, y)
+        return await self._observe(observe, settle)
 
     @_MakeSync
-    async def right_click(self, x: Optional[int] = None, y: Optional[int] = None) -> None:
+    async def right_click(self, x: Optional[int] = None, y: Optional[int] = None, observe: bool = False, settle: float = 0.3) -> Optional[bytes]:
         """Right click at specified coordinates"""
         if x is not None and y is not None:
             await self.mouse_move.aio(x, y)
         await self._mouse_click("right", True, x, y)
-        time.sleep(0.1)
+        await asyncio.sleep(0.1)
         await self._mouse_click("right", False, x, y)
+        return await self._observe(observe, settle)
 
     @_MakeSync
-    async def double_click(self, x: Optional[int] = None, y: Optional[int] = None) -> None:
+    async def double_click(self, x: Optional[int] = None, y: Optional[int] = None, observe: bool = False, settle: float = 0.3) -> Optional[bytes]:
         """Double click at specified coordinates"""
         if x is not None and y is not None:
             await self.mouse_move.aio(x, y)
         await self._mouse_click("left", True, x, y)
-        time.sleep(0.1)
+        await asyncio.sleep(0.1)
         await self._mouse_click("left", False, x, y)
-        time.sleep(0.2)
+        await asyncio.sleep(0.2)
         await self._mouse_click("left", True, x, y)
-        time.sleep(0.1)
+        await asyncio.sleep(0.1)
         await self._mouse_click("left", False, x, y)
+        return await self._observe(observe, settle)
 
     @_MakeSync
-    async def left_click_drag(self, x: int, y: int) -> None:
+    async def left_click_drag(self, x: int, y: int, observe: bool = False, settle: float = 0.3) -> Optional[bytes]:
         """Left click at current cursor position and drag to specified coordinates"""
         await self._mouse_click("left", True)
-        time.sleep(0.1)
+        await asyncio.sleep(0.1)
         await self.mouse_move.aio(x, y)
-        time.sleep(0.1)
+        await asyncio.sleep(0.1)
         await self._mouse_click("left", False, x, y)
+        return await self._observe(observe, settle)
 
     @_MakeSync
-    async def screenshot(self) -> bytes:
-        """Take a screenshot of the machine"""
-        route = "computer/display/screenshot"
-        headers = {"X-Machine-ID": str(self.machine.id), "X-Connection-ID": str(self.id)}
-        url = self._client._machine_url(self.machine, route)
-        return await self._client._api_client.get(url, expect_json=False, headers=headers)
+    async def screenshot(self, max_age: float = 0) -> bytes:
+        """Take a screenshot of the machine.
+
+        Every call captures a new frame by default. With max_age > 0, the frame
+        from prefetch_screenshot is reused instead if no input was sent since it
+        started and it was captured at most max_age seconds ago. The screen can
+        change without input, e.g. while a page loads, so keep max_age short.
+        """
+        prefetch, self._prefetch = self._prefetch, None
+        if prefetch is not None:
+            if max_age <= 0:
+                prefetch[2].cancel()
+            else:
+                frame = await self._prefetched_frame(prefetch, max_age)
+                if frame is not None:
+                    return frame
+        return await self._capture()
+
+    def prefetch_screenshot(self, delay: float = 0.0) -> None:
+        """Start taking a screenshot in the background, after delay seconds, for the next screenshot() to reuse.
+
+        Lets the screenshot round trip overlap other waits, e.g. on a model
+        deciding its next step. Input sent in the meantime discards the frame,
+        and only screenshot(max_age=...) calls reuse it.
+        Call from a coroutine: the capture runs on the current event loop.
+        """
+        loop = asyncio.get_running_loop()
+        if self._prefetch is not None:
+            self._prefetch[2].cancel()
+        task = loop.create_task(self._capture_at(delay))
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())  # failures fall back to a fresh capture
+        self._prefetch = (self._input_epoch, loop, task)
+
+    async def _prefetched_frame(self, prefetch: Tuple[int, asyncio.AbstractEventLoop, asyncio.Future], max_age: float) -> Optional[bytes]:
+        epoch, loop, task = prefetch
+        if epoch != self._input_epoch or loop is not asyncio.get_running_loop():
+            task.cancel()
+            outcome = "stale"
+        else:
+            try:
+                frame, captured_at = await task
+            except Exception:
+                frame, captured_at = None, None
+            # Input sent while the capture was in flight also makes it stale
+            if frame is not None and epoch == self._input_epoch and time.monotonic() - captured_at <= max_age:
+                outcome = "hit"
+            else:
+                frame, outcome = None, "stale"
+        if self._client.metrics is not None:
+            self._client.metrics.increment("pig.screenshot.prefetch", outcome=outcome)
+        return frame if outcome == "hit" else None
+
+    async def _observe(self, observe: bool, settle: float) -> Optional[bytes]:
+        # Piglet has no combined act-and-screenshot route, so this is a second request, sent straight after the input
+        if not observe:
+            return None
+        if settle > 0:
+            await asyncio.sleep(settle)
+        return await self._capture()
+
+    async def _capture_at(self, delay: float) -> Tuple[bytes, float]:
+        if delay > 0:
+            await asyncio.sleep(delay)
+        captured_at = time.monotonic()
+        return await self._capture(), captured_at
+
+    async def _capture(self) -> bytes:
+        url = self._urls["screenshot"]
+        screenshot = await self._client._api_client.get(url, expect_json=False, headers=self._headers, coalesce=False)
+        # Screenshots are captured at display resolution, so keep cached dimensions in step for free
+        dimensions = _png_dimensions(screenshot) if isinstance(screenshot, bytes) else None
+        if dimensions is not None:
+            self._dimensions = dimensions
+        return screenshot
+
+    @_MakeSync
+    async def find(
+        self,
+        template: Any,
+        region: Optional[vision.Region] = None,
+        threshold: float = vision.DEFAULT_THRESHOLD,
+        scales: Sequence[float] = vision.DEFAULT_SCALES,
+    ) -> Optional[Tuple[int, int]]:
+        """Find a template image on screen, returning the (x, y) of its center or None if not visible.
+
+        template may be PNG bytes, a file path, a PIL image or a numpy array.
+        region limits the search to (x, y, width, height) in screen pixels.
+        Requires the vision extra: pip install 'pig-python[vision]'
+        """
+        vision._require_vision()
+        screenshot = await self.screenshot.aio()
+        loop = asyncio.get_running_loop()
+        match = await loop.run_in_executor(None, lambda: vision.match_template(screenshot, template, region, threshold, scales))
+        if match is None:
+            return None
+        return match.x, match.y
+
+    @_MakeSync
+    async def wait_for(
+        self,
+        template: Any,
+        region: Optional[vision.Region] = None,
+        threshold: float = vision.DEFAULT_THRESHOLD,
+        scales: Sequence[float] = vision.DEFAULT_SCALES,
+        timeout: float = 30,
+        interval: float = 0.5,
+    ) -> Tuple[int, int]:
+        """Wait until a template image appears on screen, returning the (x, y) of its center"""
+        deadline = time.monotonic() + timeout
+        while True:
+            position = await self.find.aio(template, region=region, threshold=threshold, scales=scales)
+            if position is not None:
+                return position
+            if time.monotonic() + interval > deadline:
+                raise TimeoutError(f"Template not found on screen within {timeout} seconds")
+            await asyncio.sleep(interval)
 
     @_MakeSync
     async def yield_control(self) -> None:
@@ -157,8 +313,9 @@ class Connection:
             machine = await self._client._api_client.get(url)
             if not machine["pause_bots"]:
                 break
-            time.sleep(sleeptime)
+            await asyncio.sleep(sleeptime)
             sleeptime = min(sleeptime * 2, max_sleep)
+        self._input_epoch += 1  # a human has been using the machine
 
 
 class Connections:
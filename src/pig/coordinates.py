@@ -0,0 +1,102 @@
+import io
+from typing import Any, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # optional, batch conversion of arrays needs it
+    np = None
+
+Size = Tuple[int, int]
+Point = Tuple[int, int]
+
+
+class CoordinateMapper:
+    """Maps points between screen pixels and the image space a model sees.
+
+    Computer-use models are trained on screenshots of a fixed size, e.g.
+    1024x768. With letterbox=True the screen is scaled by a single factor to
+    fit inside that size and centered, padding the rest, so aspect ratios
+    are preserved; resize_screenshot produces exactly that image, keeping
+    what the model sees and where its clicks land consistent. With
+    letterbox=False each axis is stretched independently.
+
+        mapper = CoordinateMapper(conn.dimensions(), model_size=(1280, 800))
+        conn.left_click(*mapper.to_screen(x, y))
+        path = mapper.to_screen_points(model_path)
+    """
+
+    __slots__ = ("screen_size", "model_size", "letterbox", "scale_x", "scale_y", "offset_x", "offset_y")
+
+    def __init__(self, screen_size: Size, model_size: Size = (1024, 768), letterbox: bool = True) -> None:
+        self.screen_size = tuple(screen_size)
+        self.model_size = tuple(model_size)
+        self.letterbox = letterbox
+        (screen_w, screen_h), (model_w, model_h) = self.screen_size, self.model_size
+        if letterbox:
+            scale = min(model_w / screen_w, model_h / screen_h)
+            self.scale_x = self.scale_y = scale
+        else:
+            self.scale_x, self.scale_y = model_w / screen_w, model_h / screen_h
+        # model = screen * scale + offset, the offsets being the padding on the left and top
+        self.offset_x = (model_w - screen_w * self.scale_x) / 2
+        self.offset_y = (model_h - screen_h * self.scale_y) / 2
+
+    @property
+    def content_box(self) -> Tuple[int, int, int, int]:
+        """The screen's area within the model image, as (x, y, width, height)"""
+        return (
+            round(self.offset_x),
+            round(self.offset_y),
+            round(self.screen_size[0] * self.scale_x),
+            round(self.screen_size[1] * self.scale_y),
+        )
+
+    def to_screen(self, x: Optional[float], y: Optional[float]) -> Tuple[Optional[int], Optional[int]]:
+        """Model coordinates to screen pixels, clamped to the screen. None passes through, meaning the current position"""
+        if x is None or y is None:
+            return None, None
+        screen_w, screen_h = self.screen_size
+        screen_x = round((x - self.offset_x) / self.scale_x)
+        screen_y = round((y - self.offset_y) / self.scale_y)
+        return max(0, min(screen_x, screen_w - 1)), max(0, min(screen_y, screen_h - 1))
+
+    def to_model(self, x: Optional[float], y: Optional[float]) -> Tuple[Optional[int], Optional[int]]:
+        """Screen pixels to model coordinates, clamped to the screen's area of the model image"""
+        if x is None or y is None:
+            return None, None
+        left, top, width, height = self.content_box
+        model_x = round(x * self.scale_x + self.offset_x)
+        model_y = round(y * self.scale_y + self.offset_y)
+        return max(left, min(model_x, left + width - 1)), max(top, min(model_y, top + height - 1))
+
+    def to_screen_points(self, points: Any) -> Any:
+        """Convert many model points at once. Takes a sequence of (x, y) pairs, or an (N, 2) numpy array for vectorized conversion"""
+        if np is not None and isinstance(points, np.ndarray):
+            scale = np.array([self.scale_x, self.scale_y])
+            offset = np.array([self.offset_x, self.offset_y])
+            upper = np.array(self.screen_size) - 1
+            return np.clip(np.rint((points - offset) / scale), 0, upper).astype(np.int64)
+        return [self.to_screen(x, y) for x, y in points]
+
+    def to_model_points(self, points: Any) -> Any:
+        """Convert many screen points at once. Takes a sequence of (x, y) pairs, or an (N, 2) numpy array for vectorized conversion"""
+        if np is not None and isinstance(points, np.ndarray):
+            left, top, width, height = self.content_box
+            scale = np.array([self.scale_x, self.scale_y])
+            offset = np.array([self.offset_x, self.offset_y])
+            return np.clip(np.rint(points * scale + offset), [left, top], [left + width - 1, top + height - 1]).astype(np.int64)
+        return [self.to_model(x, y) for x, y in points]
+
+    def resize_screenshot(self, png: bytes, fill: Sequence[int] = (0, 0, 0)) -> bytes:
+        """Scale a screenshot to the model size, letterboxed to match this mapping, as PNG. Requires Pillow"""
+        try:
+            from PIL import Image
+        except ImportError:
+            raise ImportError("Resizing screenshots requires Pillow. Install it with `pip install 'pig-python[vision]'`") from None
+        image = Image.open(io.BytesIO(png)).convert("RGB")
+        left, top, width, height = self.content_box
+        canvas = Image.new("RGB", self.model_size, tuple(fill))
+        canvas.paste(image.resize((width, height), Image.BILINEAR), (left, top))
+        output = io.BytesIO()
+        canvas.save(output, format="PNG")
+        return output.getvalue()
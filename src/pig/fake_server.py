@@ -0,0 +1,344 @@
+"""Local stand-in for the Pig control plane, proxy and Piglet, for offline testing and benchmarks.
+
+Serves the machines, connections, computer/input/* and computer/display/* routes
+from one asyncio server, with configurable latency, error injection and
+synthetic screenshots. Point the SDK at it with PIG_API_URL, PIG_PROXY_URL and
+PIGLET_LOCAL_URL, or use FakePig.client().
+
+    python -m pig.fake_server --port 3100 --latency 0.02 --error-rate 0.01
+"""
+
+import argparse
+import asyncio
+import hashlib
+import itertools
+import random
+import struct
+import threading
+import zlib
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+from .pig import Client
+
+
+def _png(width: int, height: int, cursor: Optional[tuple] = None) -> bytes:
+    """Encode a gradient frame with a cursor block as an RGB PNG"""
+    gradient = bytes(((x * 255 // max(width - 1, 1)) for x in range(width)))
+    row = b"".join(bytes((r, 96, 160)) for r in gradient)
+    rows = [b"\x00" + row] * height
+    if cursor is not None:
+        cx, cy = cursor
+        size = 16
+        left, right = max(0, cx), min(width, cx + size)
+        if right > left:
+            for y in range(max(0, cy), min(height, cy + size)):
+                rows[y] = b"\x00" + row[: left * 3] + b"\xff\x3c\xb4" * (right - left) + row[right * 3 :]
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(b"".join(rows), 1)) + chunk(b"IEND", b"")
+
+
+class FakePig:
+    """In-process fake of the Pig API, proxy and Piglet.
+
+    latency and jitter are in seconds and apply to every request. error_rate is
+    the fraction of requests answered with 503 (which the SDK retries), and
+    reset_rate the fraction whose connection is dropped without a response.
+    JSON GETs carry an ETag and answer a matching If-None-Match with 304.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        width: int = 1024,
+        height: int = 768,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        reset_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.width = width
+        self.height = height
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.reset_rate = reset_rate
+        self._random = random.Random(seed)
+
+        self.machines: Dict[str, Dict[str, Any]] = {}
+        self.connections: Dict[str, str] = {}  # connection ID -> machine ID
+        self.cursors: Dict[str, tuple] = {}
+        self.requests: Counter = Counter()  # "METHOD route" -> count
+        self._ids = itertools.count(1)
+        self._screenshots: Dict[tuple, bytes] = {}
+
+        self._runner: Optional[web.AppRunner] = None
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def env(self) -> Dict[str, str]:
+        """Environment variables that point the SDK at this server"""
+        return {"PIG_API_URL": self.url, "PIG_PROXY_URL": self.url, "PIGLET_LOCAL_URL": self.url, "PIG_SECRET_KEY": "SK-fake"}
+
+    def client(self, **kwargs) -> Client:
+        """A Client pointed at this server"""
+        kwargs.setdefault("api_key", "SK-fake")
+        return Client(api_url=self.url, proxy_url=self.url, local_url=self.url, **kwargs)
+
+    def add_machine(self, state: str = "Running", machine_id: Optional[str] = None) -> str:
+        machine_id = machine_id or f"M-FAKE{next(self._ids):07d}"
+        self.machines[machine_id] = {
+            "id": machine_id,
+            "state": state,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "image_id": None,
+            "team_id": "T-FAKE",
+            "pause_bots": False,
+        }
+        return machine_id
+
+    # Server lifecycle
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self._middleware])
+        app.router.add_get("/machines", self._list_machines)
+        app.router.add_post("/machines", self._create_machine)
+        app.router.add_get("/machines/{id}", self._get_machine)
+        app.router.add_delete("/machines/{id}", self._delete_machine)
+        app.router.add_put("/machines/{id}/state/{state}", self._set_state)
+        app.router.add_put("/machines/{id}/pause_bots/{paused}", self._pause_bots)
+        app.router.add_post("/machines/{id}/connections", self._create_connection)
+        app.router.add_get("/machines/{id}/connections/{cid}", self._get_connection)
+        app.router.add_delete("/machines/{id}/connections/{cid}", self._delete_connection)
+        app.router.add_get("/images", self._list_images)
+        app.router.add_get("/computer/display/dimensions", self._dimensions)
+        app.router.add_get("/computer/display/screenshot", self._screenshot)
+        app.router.add_post("/computer/input/keyboard/key", self._input)
+        app.router.add_post("/computer/input/keyboard/type", self._input)
+        app.router.add_get("/computer/input/mouse/position", self._cursor_position)
+        app.router.add_post("/computer/input/mouse/move", self._mouse_move)
+        app.router.add_post("/computer/input/mouse/click", self._mouse_click)
+        return app
+
+    async def start(self) -> None:
+        self._runner = web.AppRunner(self.app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> "FakePig":
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.stop()
+
+    # Sync use runs the server on its own loop in a background thread, so it
+    # keeps serving while the sync SDK blocks the calling thread
+    def __enter__(self) -> "FakePig":
+        started = threading.Event()
+        failure: List[BaseException] = []
+
+        def serve():
+            self._loop = asyncio.new_event_loop()
+            try:
+                self._loop.run_until_complete(self.start())
+            except BaseException as e:
+                failure.append(e)  # e.g. the port is taken, re-raised by __enter__
+                self._loop.run_until_complete(self.stop())
+                self._loop.close()
+                return
+            finally:
+                started.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(self.stop())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=serve, name="pig-fake-server", daemon=True)
+        self._thread.start()
+        if not started.wait(timeout=30):
+            raise TimeoutError("Fake server did not start within 30 seconds")
+        if failure:
+            self._thread.join()
+            raise failure[0]
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    # Behavior shared by every route
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler):
+        resource = request.match_info.route.resource
+        self.requests[f"{request.method} {resource.canonical if resource is not None else request.path}"] += 1
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + self._random.uniform(0, self.jitter))
+        roll = self._random.random()
+        if roll < self.reset_rate:
+            request.transport.abort()
+            raise web.HTTPServiceUnavailable()  # never delivered, the connection is already gone
+        if roll < self.reset_rate + self.error_rate:
+            raise web.HTTPServiceUnavailable()
+        response = await handler(request)
+        if request.method == "GET" and response.status == 200 and response.content_type == "application/json":
+            # Strong validators for JSON reads, so clients can revalidate with If-None-Match
+            etag = f'"{hashlib.sha1(response.body).hexdigest()[:16]}"'
+            if etag in request.headers.get("If-None-Match", ""):
+                return web.Response(status=304, headers={"ETag": etag})
+            response.headers["ETag"] = etag
+        return response
+
+    def _machine(self, request: web.Request, machine_id: Optional[str] = None) -> str:
+        machine_id = machine_id or request.match_info.get("id") or request.headers.get("X-Machine-ID", "local")
+        if machine_id != "local" and machine_id not in self.machines:
+            raise web.HTTPNotFound(text='{"detail": "Machine not found"}', content_type="application/json")
+        return machine_id
+
+    # Control plane
+
+    async def _list_machines(self, request: web.Request) -> web.Response:
+        return web.json_response(list(self.machines.values()))
+
+    async def _create_machine(self, request: web.Request) -> web.Response:
+        return web.json_response([{"id": self.add_machine()}], status=201)
+
+    async def _get_machine(self, request: web.Request) -> web.Response:
+        return web.json_response(self.machines[self._machine(request)])
+
+    async def _delete_machine(self, request: web.Request) -> web.Response:
+        self.machines[self._machine(request)]["state"] = "Terminated"
+        return web.Response(status=204)
+
+    async def _set_state(self, request: web.Request) -> web.Response:
+        machine = self.machines[self._machine(request)]
+        if machine["state"] == "Terminated":
+            raise web.HTTPBadRequest(text='{"detail": "Machine is terminated"}', content_type="application/json")
+        machine["state"] = {"start": "Running", "stop": "Stopped"}.get(request.match_info["state"], machine["state"])
+        return web.Response(status=204)
+
+    async def _pause_bots(self, request: web.Request) -> web.Response:
+        self.machines[self._machine(request)]["pause_bots"] = request.match_info["paused"] == "true"
+        return web.Response(status=204)
+
+    async def _create_connection(self, request: web.Request) -> web.Response:
+        machine_id = self._machine(request)
+        connection_id = f"C-FAKE{next(self._ids):07d}"
+        self.connections[connection_id] = machine_id
+        return web.json_response([{"id": connection_id}], status=201)
+
+    async def _get_connection(self, request: web.Request) -> web.Response:
+        self._machine(request)
+        if request.match_info["cid"] not in self.connections:
+            raise web.HTTPNotFound(text='{"detail": "Connection not found"}', content_type="application/json")
+        return web.json_response({"id": request.match_info["cid"], "machine_id": request.match_info["id"]})
+
+    async def _delete_connection(self, request: web.Request) -> web.Response:
+        self.connections.pop(request.match_info["cid"], None)
+        return web.Response(status=204)
+
+    async def _list_images(self, request: web.Request) -> web.Response:
+        created_at = datetime(2025, 1, 1, tzinfo=timezone.utc).isoformat()
+        return web.json_response([{"id": "I-BASE", "tag": "windows", "parent_id": None, "state": "Ready", "team_id": None, "created_at": created_at}])
+
+    # Piglet
+
+    async def _dimensions(self, request: web.Request) -> web.Response:
+        self._machine(request)
+        return web.json_response({"width": self.width, "height": self.height})
+
+    async def _screenshot(self, request: web.Request) -> web.Response:
+        cursor = self.cursors.get(self._machine(request), (0, 0))
+        key = (self.width, self.height, cursor)
+        if key not in self._screenshots:
+            if len(self._screenshots) > 64:
+                self._screenshots.clear()
+            self._screenshots[key] = _png(self.width, self.height, cursor)
+        return web.Response(body=self._screenshots[key], content_type="image/png")
+
+    async def _input(self, request: web.Request) -> web.Response:
+        self._machine(request)
+        await request.read()
+        return web.Response(status=200)
+
+    async def _cursor_position(self, request: web.Request) -> web.Response:
+        x, y = self.cursors.get(self._machine(request), (0, 0))
+        return web.json_response({"x": x, "y": y})
+
+    async def _mouse_move(self, request: web.Request) -> web.Response:
+        machine_id = self._machine(request)
+        data = await request.json()
+        self.cursors[machine_id] = (data["x"], data["y"])
+        return web.Response(status=200)
+
+    async def _mouse_click(self, request: web.Request) -> web.Response:
+        machine_id = self._machine(request)
+        data = await request.json()
+        if data.get("x") is not None and data.get("y") is not None:
+            self.cursors[machine_id] = (data["x"], data["y"])
+        return web.Response(status=200)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=3100)
+    parser.add_argument("--width", type=int, default=1024)
+    parser.add_argument("--height", type=int, default=768)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Up to this many random seconds added to every request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument("--reset-rate", type=float, default=0.0, help="Fraction of connections dropped without a response")
+    parser.add_argument("--machines", type=int, default=1, help="Number of machines to pre-create")
+    args = parser.parse_args()
+
+    fake = FakePig(
+        host=args.host,
+        port=args.port,
+        width=args.width,
+        height=args.height,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        reset_rate=args.reset_rate,
+    )
+    for _ in range(args.machines):
+        fake.add_machine()
+
+    async def serve():
+        await fake.start()
+        for key, value in fake.env().items():
+            print(f"export {key}={value}")
+        print(f"# machines: {' '.join(fake.machines)}")
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""Drive many machines from several processes at once.
+
+One process tops out at a core's worth of JSON and HTTP work. FleetRunner
+shards items (machine IDs, task specs, ...) across worker processes, each with
+its own Client and event loop running up to concurrency tasks at a time.
+Results, errors and metrics come back to the parent over a queue.
+
+    async def setup(client, machine_id):
+        machine = await client.machines.get.aio(machine_id)
+        async with machine.connect.aio() as conn:
+            await conn.type.aio("hello")
+            return await conn.screenshot.aio()
+
+    if __name__ == "__main__":
+        report = run_fleet(setup, machine_ids, processes=4)
+
+task must be importable by the workers, i.e. defined at module level. On
+Ctrl-C or stop(), workers cancel their running tasks, so async with blocks
+inside them close connections and delete temporary machines before exiting.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import pickle
+import queue as queue_module
+import signal
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from .metrics import MetricsRegistry
+from .pig import Client
+from .transport import AiohttpTransport
+
+Task = Callable[[Client, Any], Awaitable[Any]]
+OnResult = Callable[[int, Any, Optional[BaseException]], None]
+
+
+def _picklable_error(e: BaseException) -> BaseException:
+    try:
+        pickle.loads(pickle.dumps(e))
+        return e
+    except Exception:
+        return RuntimeError(f"{type(e).__name__}: {e}")
+
+
+class FleetReport:
+    """Results of a fleet run, in item order, with metrics merged from every worker"""
+
+    def __init__(self, count: int) -> None:
+        self.results: List[Any] = [None] * count
+        self.errors: Dict[int, BaseException] = {}
+        self.metrics = MetricsRegistry()
+        self.elapsed = 0.0
+        self.stopped = False  # shut down early, some items may be unfinished
+        self._finished = [False] * count
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors and not self.unfinished
+
+    @property
+    def unfinished(self) -> List[int]:
+        """Items that never completed, because the run was stopped or their worker died"""
+        return [i for i, finished in enumerate(self._finished) if not finished]
+
+    def _record(self, index: int, value: Any, error: Optional[BaseException]) -> None:
+        self._finished[index] = True
+        if error is None:
+            self.results[index] = value
+        else:
+            self.errors[index] = error
+
+
+def _worker(
+    worker: int,
+    task: Task,
+    shard: List[Tuple[int, Any]],
+    concurrency: int,
+    client_options: Dict[str, Any],
+    results: "multiprocessing.Queue",
+    stop: "multiprocessing.synchronize.Event",
+    metrics_interval: float,
+) -> None:
+    # The parent turns Ctrl-C and SIGTERM into stop, so cleanup can finish
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    try:
+        asyncio.run(_work(worker, task, shard, concurrency, client_options, results, stop, metrics_interval))
+    finally:
+        results.put(pickle.dumps(("done", worker, None, None)))
+
+
+async def _work(worker, task, shard, concurrency, client_options, results, stop, metrics_interval) -> None:
+    metrics = MetricsRegistry()
+    options = dict(client_options)
+    options.setdefault("transport", AiohttpTransport(persistent=True))  # one loop for the worker's life, so keep its pool
+    client = Client(metrics=metrics, **options)
+    semaphore = asyncio.Semaphore(concurrency)
+    tags = {"worker": str(worker)}
+
+    def send(kind: str, index: Optional[int], payload: Any) -> None:
+        # Pickle here rather than in the queue's feeder thread, so failures surface and metrics can be reset right after
+        try:
+            data = pickle.dumps((kind, worker, index, payload))
+        except Exception as e:
+            data = pickle.dumps(("error", worker, index, RuntimeError(f"Result of item {index} can't be pickled: {e}")))
+        results.put(data)
+
+    def flush_metrics() -> None:
+        send("metrics", None, metrics)
+        metrics.reset()  # the parent merges, so send deltas
+
+    async def run_one(index: int, item: Any) -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                value = await task(client, item)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                send("error", index, _picklable_error(e))
+            else:
+                send("result", index, value)
+            finally:
+                metrics.observe("pig.fleet.task", time.perf_counter() - started, **tags)
+
+    pending = {asyncio.ensure_future(run_one(index, item)) for index, item in shard}
+    last_flush = time.monotonic()
+    try:
+        while pending:
+            _, pending = await asyncio.wait(pending, timeout=min(metrics_interval, 0.1))
+            if stop.is_set():
+                for t in pending:
+                    t.cancel()  # runs the tasks' cleanup, e.g. leaving async with blocks
+                await asyncio.gather(*pending, return_exceptions=True)
+                break
+            if time.monotonic() - last_flush >= metrics_interval:
+                flush_metrics()
+                last_flush = time.monotonic()
+    finally:
+        await client.close.aio()
+        flush_metrics()
+
+
+class FleetRunner:
+    """Runs task(client, item) for every item, sharded across worker processes.
+
+    processes defaults to the CPU count, and each worker runs up to
+    concurrency tasks at once. client_options are passed to each worker's
+    Client, e.g. {"api_key": ...}; without api_key workers read
+    PIG_SECRET_KEY as usual. Workers are started with the spawn method by
+    default, which is safe alongside threads but needs the usual
+    if __name__ == "__main__" guard in scripts.
+    """
+
+    def __init__(
+        self,
+        task: Task,
+        items: Sequence[Any],
+        processes: Optional[int] = None,
+        concurrency: int = 16,
+        client_options: Optional[Dict[str, Any]] = None,
+        metrics_interval: float = 1.0,
+        shutdown_timeout: float = 30.0,
+        start_method: str = "spawn",
+    ) -> None:
+        self.task = task
+        self.items = list(items)
+        self.processes = max(1, min(processes or os.cpu_count() or 1, len(self.items)))
+        self.concurrency = concurrency
+        self.client_options = client_options or {}
+        self.metrics_interval = metrics_interval
+        self.shutdown_timeout = shutdown_timeout
+        self._context = multiprocessing.get_context(start_method)
+        self._stop = self._context.Event()
+
+    def stop(self) -> None:
+        """Ask workers to cancel outstanding tasks and exit. Safe to call from any thread"""
+        self._stop.set()
+
+    def run(self, on_result: Optional[OnResult] = None) -> FleetReport:
+        """Run until every item is done or the run is stopped. on_result(index, value, error) is called as results arrive"""
+        report = FleetReport(len(self.items))
+        if not self.items:
+            return report
+        results = self._context.Queue()
+        shards = [list(enumerate(self.items))[n :: self.processes] for n in range(self.processes)]
+        workers = [
+            self._context.Process(
+                target=_worker,
+                args=(n, self.task, shard, self.concurrency, self.client_options, results, self._stop, self.metrics_interval),
+                name=f"pig-fleet-{n}",
+            )
+            for n, shard in enumerate(shards)
+        ]
+
+        started = time.monotonic()
+        previous_sigterm = None
+        if threading.current_thread() is threading.main_thread():
+            previous_sigterm = signal.signal(signal.SIGTERM, signal.default_int_handler)  # SIGTERM shuts down like Ctrl-C
+        try:
+            for process in workers:
+                process.start()
+            self._collect(report, results, workers, on_result)
+        finally:
+            for process in workers:
+                process.join(timeout=5)
+                if process.is_alive():
+                    process.kill()
+                    process.join()
+            if previous_sigterm is not None:
+                signal.signal(signal.SIGTERM, previous_sigterm)
+        report.elapsed = time.monotonic() - started
+        return report
+
+    def _collect(self, report: FleetReport, results: "multiprocessing.Queue", workers: list, on_result: Optional[OnResult]) -> None:
+        running = len(workers)
+        deadline: Optional[float] = None
+        while running:
+            try:
+                if self._stop.is_set() and deadline is None:
+                    report.stopped = True
+                    deadline = time.monotonic() + self.shutdown_timeout
+                try:
+                    message = results.get(timeout=0.1)
+                except queue_module.Empty:
+                    if deadline is not None and time.monotonic() > deadline:
+                        self._drain(report, results, on_result)
+                        return
+                    if not any(process.is_alive() for process in workers):
+                        # Exiting workers flush their queue first, so anything sent just before is in the pipe by now
+                        running -= self._drain(report, results, on_result)
+                        if running:
+                            return  # a worker died without saying so
+                    continue
+                if self._handle(report, message, on_result):
+                    running -= 1
+            except KeyboardInterrupt:
+                if deadline is not None:
+                    return  # interrupted again, stop waiting for cleanup
+                self.stop()
+
+    def _drain(self, report: FleetReport, results: "multiprocessing.Queue", on_result: Optional[OnResult]) -> int:
+        """Handle every message already queued, returning how many were done messages"""
+        done = 0
+        while True:
+            try:
+                message = results.get_nowait()
+            except queue_module.Empty:
+                return done
+            done += self._handle(report, message, on_result)
+
+    @staticmethod
+    def _handle(report: FleetReport, message: bytes, on_result: Optional[OnResult]) -> bool:
+        """Apply one worker message to report, returning whether it was the worker's done message"""
+        kind, _, index, payload = pickle.loads(message)
+        if kind == "done":
+            return True
+        if kind == "metrics":
+            report.metrics.merge(payload)
+        else:
+            value, error = (payload, None) if kind == "result" else (None, payload)
+            report._record(index, value, error)
+            if on_result is not None:
+                on_result(index, value, error)
+        return False
+
+
+def run_fleet(task: Task, items: Sequence[Any], **kwargs: Any) -> FleetReport:
+    """Run task(client, item) for every item across worker processes. See FleetRunner for options"""
+    return FleetRunner(task, items, **kwargs).run()
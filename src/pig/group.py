@@ -0,0 +1,161 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .connections import Connection
+from .sync_wrapper import _MakeSync
+
+# One step of a batch: a Connection method name followed by its arguments, e.g. ("left_click", 100, 200)
+Step = Tuple[Any, ...]
+
+
+class GroupError(Exception):
+    """Raised by GroupResult.raise_for_errors when any connection failed or timed out"""
+
+    def __init__(self, errors: Dict[Connection, BaseException]) -> None:
+        self.errors = errors
+        summary = ", ".join(f"{conn.machine.id}: {type(e).__name__}" for conn, e in list(errors.items())[:5])
+        more = f" and {len(errors) - 5} more" if len(errors) > 5 else ""
+        super().__init__(f"{len(errors)} connection{'' if len(errors) == 1 else 's'} failed ({summary}{more})")
+
+
+class GroupResult:
+    """Per-connection outcome of a broadcast. Iterates as (connection, result) pairs, None where it failed"""
+
+    def __init__(self, connections: Sequence[Connection]) -> None:
+        self.connections = list(connections)
+        self.results: List[Any] = [None] * len(self.connections)
+        self.errors: Dict[Connection, BaseException] = {}
+        self.stragglers: List[Connection] = []  # cancelled at the deadline, also listed in errors
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    @property
+    def succeeded(self) -> List[Connection]:
+        return [conn for conn in self.connections if conn not in self.errors]
+
+    def raise_for_errors(self) -> "GroupResult":
+        if self.errors:
+            raise GroupError(self.errors)
+        return self
+
+    def __iter__(self) -> Iterator[Tuple[Connection, Any]]:
+        return iter(zip(self.connections, self.results))
+
+    def __len__(self) -> int:
+        return len(self.connections)
+
+
+class ConnectionGroup:
+    """Fans actions out to many connections at once.
+
+    At most concurrency actions are in flight at a time. Failures don't stop
+    the others; they're collected in the returned GroupResult. With timeout
+    set, connections still running that many seconds after the broadcast
+    started are cancelled and reported as stragglers.
+
+        group = ConnectionGroup(connections, concurrency=32, timeout=10)
+        group.type("hello").raise_for_errors()
+        frames = await group.screenshot_all.aio()
+    """
+
+    def __init__(self, connections: Sequence[Connection], concurrency: int = 32, timeout: Optional[float] = None) -> None:
+        self.connections = list(connections)
+        self.concurrency = concurrency
+        self.timeout = timeout
+
+    def __len__(self) -> int:
+        return len(self.connections)
+
+    @property
+    def _client(self):
+        # Lets sync calls find the client's shared loop, if it has one
+        return self.connections[0]._client if self.connections else None
+
+    @_MakeSync
+    async def run(self, fn: Callable[[Connection], Awaitable[Any]], timeout: Optional[float] = None) -> GroupResult:
+        """Call fn(connection) for every connection, e.g. lambda conn: conn.key.aio("enter")"""
+        result = GroupResult(self.connections)
+        if not self.connections:
+            return result
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def call(i: int, conn: Connection) -> None:
+            async with semaphore:
+                try:
+                    result.results[i] = await fn(conn)
+                except Exception as e:
+                    result.errors[conn] = e
+
+        tasks = {asyncio.ensure_future(call(i, conn)): conn for i, conn in enumerate(self.connections)}
+        timeout = self.timeout if timeout is None else timeout
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.wait(pending)
+            for task in pending:
+                conn = tasks[task]
+                result.stragglers.append(conn)
+                result.errors[conn] = asyncio.TimeoutError(f"No response from {conn.machine.id} within {timeout} seconds")
+        return result
+
+    @_MakeSync
+    async def batch(self, steps: Sequence[Step], timeout: Optional[float] = None) -> GroupResult:
+        """Run steps in order on each connection, all connections in parallel. Results are each step's return values"""
+
+        async def run_steps(conn: Connection) -> List[Any]:
+            return [await getattr(conn, name).aio(*args) for name, *args in steps]
+
+        return await self.run.aio(run_steps, timeout=timeout)
+
+    @_MakeSync
+    async def key(self, combo: str) -> GroupResult:
+        return await self.run.aio(lambda conn: conn.key.aio(combo))
+
+    @_MakeSync
+    async def type(self, text: str) -> GroupResult:
+        return await self.run.aio(lambda conn: conn.type.aio(text))
+
+    @_MakeSync
+    async def mouse_move(self, x: int, y: int) -> GroupResult:
+        return await self.run.aio(lambda conn: conn.mouse_move.aio(x, y))
+
+    @_MakeSync
+    async def left_click(self, x: Optional[int] = None, y: Optional[int] = None) -> GroupResult:
+        return await self.run.aio(lambda conn: conn.left_click.aio(x, y))
+
+    @_MakeSync
+    async def right_click(self, x: Optional[int] = None, y: Optional[int] = None) -> GroupResult:
+        return await self.run.aio(lambda conn: conn.right_click.aio(x, y))
+
+    @_MakeSync
+    async def double_click(self, x: Optional[int] = None, y: Optional[int] = None) -> GroupResult:
+        return await self.run.aio(lambda conn: conn.double_click.aio(x, y))
+
+    @_MakeSync
+    async def screenshot_all(self, timeout: Optional[float] = None) -> GroupResult:
+        """Screenshots of every connection, taken concurrently, as PNG bytes in connection order"""
+        return await self.run.aio(lambda conn: conn.screenshot.aio(), timeout=timeout)
+
+    @_MakeSync
+    async def close(self) -> None:
+        """Delete every connection in the group"""
+
+        async def delete(conn: Connection) -> None:
+            await conn._client.connections.delete.aio(conn.machine.id, conn.id)
+
+        await self.run.aio(delete)
+
+    def __enter__(self) -> "ConnectionGroup":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    async def __aenter__(self) -> "ConnectionGroup":
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.close.aio()
@@ -0,0 +1,245 @@
+import bisect
+import re
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from aiohttp import TraceConfig
+
+# Upper bounds in seconds, roughly 0.5ms to 2 minutes in sqrt(2) steps
+DEFAULT_BUCKETS = tuple(0.0005 * 2 ** (i / 2) for i in range(37))
+
+Tags = Tuple[Tuple[str, str], ...]
+Listener = Callable[[str, float, Dict[str, str]], None]
+
+
+class Histogram:
+    """Bucketed distribution of observed values, cheap to update and merge"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # final slot catches values above the last bucket
+        self.count = 0
+        self.sum = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other: "Histogram") -> None:
+        if other.buckets != self.buckets:
+            raise ValueError("Cannot merge histograms with different buckets")
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Estimate the q-th percentile (0-100) by interpolating within buckets"""
+        if self.count == 0:
+            return None
+        rank = q / 100 * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                estimate = lower + (upper - lower) * (rank - seen) / bucket_count
+                return min(max(estimate, self.min), self.max)
+            seen += bucket_count
+        return self.max
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.sum / self.count if self.count else None
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "mean": self.mean,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+        }
+
+
+class MetricsRegistry:
+    """Thread-safe, in-process store of histograms and counters keyed by name and tags"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self._buckets = buckets
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, Tags], Histogram] = {}
+        self._counters: Dict[Tuple[str, Tags], int] = {}
+        self._listeners: List[Listener] = []
+
+    def add_listener(self, listener: Listener) -> None:
+        """Call listener(name, value, tags) for every observation, e.g. to export elsewhere"""
+        self._listeners.append(listener)
+
+    def observe(self, name: str, value: float, **tags: str) -> None:
+        key = (name, tuple(sorted(tags.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self._buckets)
+            histogram.observe(value)
+        for listener in self._listeners:
+            listener(name, value, tags)
+
+    def increment(self, name: str, value: int = 1, **tags: str) -> None:
+        key = (name, tuple(sorted(tags.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def histogram(self, name: str, **tags: str) -> Histogram:
+        """Histogram for name, merged across all tag sets that include the given tags"""
+        merged = Histogram(self._buckets)
+        wanted = set(tags.items())
+        with self._lock:
+            for (metric, metric_tags), histogram in self._histograms.items():
+                if metric == name and wanted.issubset(metric_tags):
+                    merged.merge(histogram)
+        return merged
+
+    def counter(self, name: str, **tags: str) -> int:
+        """Counter total for name, summed across all tag sets that include the given tags"""
+        wanted = set(tags.items())
+        with self._lock:
+            return sum(value for (metric, metric_tags), value in self._counters.items() if metric == name and wanted.issubset(metric_tags))
+
+    def merge(self, other: "MetricsRegistry") -> None:
+        """Fold another registry's data into this one, e.g. from a worker process"""
+        with other._lock:
+            histograms = list(other._histograms.items())
+            counters = list(other._counters.items())
+        with self._lock:
+            for key, histogram in histograms:
+                if key not in self._histograms:
+                    self._histograms[key] = Histogram(self._buckets)
+                self._histograms[key].merge(histogram)
+            for key, value in counters:
+                self._counters[key] = self._counters.get(key, 0) + value
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def snapshot(self) -> Dict[str, List[Dict[str, Any]]]:
+        """All metrics as plain data, suitable for JSON"""
+        with self._lock:
+            histograms = [{"name": name, "tags": dict(tags), **histogram.snapshot()} for (name, tags), histogram in sorted(self._histograms.items())]
+            counters = [{"name": name, "tags": dict(tags), "value": value} for (name, tags), value in sorted(self._counters.items())]
+        return {"histograms": histograms, "counters": counters}
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Locks and listeners don't cross process boundaries
+        state = self.__dict__.copy()
+        del state["_lock"]
+        state["_listeners"] = []
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+class OpenTelemetryExporter:
+    """Forwards every observation to OpenTelemetry histograms. Requires opentelemetry-api"""
+
+    def __init__(self, registry: MetricsRegistry, meter: Any = None) -> None:
+        if meter is None:
+            from opentelemetry import metrics
+
+            meter = metrics.get_meter("pig")
+        self._meter = meter
+        self._instruments: Dict[str, Any] = {}
+        registry.add_listener(self._record)
+
+    def _record(self, name: str, value: float, tags: Dict[str, str]) -> None:
+        instrument = self._instruments.get(name)
+        if instrument is None:
+            instrument = self._instruments[name] = self._meter.create_histogram(name, unit="s")
+        instrument.record(value, attributes=tags)
+
+
+# IDs like M-6HNGAXR-NT0B3VA-P33Q0R2, collapsed so routes stay low-cardinality
+_ID_SEGMENT = re.compile(r"^[A-Z]{1,3}-[A-Z0-9]+(?:-[A-Z0-9]+)*$")
+
+
+def request_tags(url: str, headers: Optional[Dict[str, Any]] = None) -> Dict[str, str]:
+    """Route and machine tags for a request"""
+    segments = urlsplit(url).path.strip("/").split("/")
+    machine_id = headers.get("X-Machine-ID") if headers else None
+    if machine_id is None and len(segments) > 1 and segments[0] == "machines":
+        machine_id = segments[1]
+    route = "/".join("{id}" if _ID_SEGMENT.match(segment) else segment for segment in segments)
+    return {"route": route, "machine_id": str(machine_id or "")}
+
+
+def trace_config(registry: MetricsRegistry) -> TraceConfig:
+    """aiohttp TraceConfig recording connection and request phases into registry.
+
+    Phases, in seconds: queue (waiting for a pooled connection), dns, connect
+    (TCP plus TLS for https), send (request start to headers sent) and ttfb
+    (headers sent to response headers). Expects route and machine_id tags in
+    the request's trace_request_ctx.
+    """
+
+    def context_factory(trace_request_ctx: Optional[Dict[str, Any]] = None) -> SimpleNamespace:
+        return SimpleNamespace(trace_request_ctx=trace_request_ctx or {}, marks={})
+
+    config = TraceConfig(trace_config_ctx_factory=context_factory)
+
+    def tags(ctx: SimpleNamespace) -> Dict[str, str]:
+        return {"route": ctx.trace_request_ctx.get("route", ""), "machine_id": ctx.trace_request_ctx.get("machine_id", "")}
+
+    def start(phase: str):
+        async def hook(session, ctx, params):
+            ctx.marks[phase] = time.perf_counter()
+
+        return hook
+
+    def end(phase: str, since: Optional[str] = None):
+        async def hook(session, ctx, params):
+            started = ctx.marks.get(since or phase)
+            now = time.perf_counter()
+            ctx.marks[f"{phase}_end"] = now
+            if started is not None:
+                registry.observe(f"pig.http.{phase}", now - started, **tags(ctx))
+
+        return hook
+
+    async def on_request_start(session, ctx, params):
+        ctx.marks["send"] = time.perf_counter()
+
+    async def on_request_end(session, ctx, params):
+        await end("ttfb", since="send_end")(session, ctx, params)
+        registry.increment("pig.http.responses", status=str(params.response.status), **tags(ctx))
+
+    async def on_request_exception(session, ctx, params):
+        registry.increment("pig.http.errors", error=type(params.exception).__name__, **tags(ctx))
+
+    config.on_request_start.append(on_request_start)
+    config.on_connection_queued_start.append(start("queue"))
+    config.on_connection_queued_end.append(end("queue"))
+    config.on_dns_resolvehost_start.append(start("dns"))
+    config.on_dns_resolvehost_end.append(end("dns"))
+    config.on_connection_create_start.append(start("connect"))
+    config.on_connection_create_end.append(end("connect"))
+    config.on_request_headers_sent.append(end("send"))
+    config.on_request_end.append(on_request_end)
+    config.on_request_exception.append(on_request_exception)
+    return config
@@ -1,38 +1,126 @@
+import asyncio
 import logging
 import os
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, TypeVar
 from urllib.parse import urljoin
 
 from .api_client import APIClient
+from .cache import ResponseCache
+from .codec import JSONCodec, default_codec
 from .connections import Connections
 from .machines import Machines, MachineType, RemoteMachine
+from .metrics import MetricsRegistry
+from .sync_wrapper import LoopThread, _MakeSync
+from .transport import AiohttpTransport, Transport
+
+T = TypeVar("T")
 
 
 class Client:
-    """Main client for interacting with the Pig API"""
+    """Main client for interacting with the Pig API. Safe to share between threads"""
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        log_level: Optional[str] = None,
+        codec: Optional[JSONCodec] = None,
+        metrics: Optional[MetricsRegistry] = None,
+        transport: Optional[Transport] = None,
+        transports: Optional[Dict[MachineType, Transport]] = None,
+        api_url: Optional[str] = None,
+        proxy_url: Optional[str] = None,
+        local_url: Optional[str] = None,
+        cache: Optional[ResponseCache] = None,
+        shared_loop: bool = False,
+    ) -> None:
+        """transport replaces the default aiohttp transport for all requests, and
+        transports overrides it for requests to a machine type's Piglet, e.g.
+        {MachineType.REMOTE: HTTPXTransport(), MachineType.LOCAL: UnixSocketTransport(path)}
 
-    def __init__(self, api_key: Optional[str] = None, log_level: Optional[str] = None) -> None:
+        cache, e.g. ResponseCache() in memory or ResponseCache(path=...) to keep
+        it across runs, revalidates JSON GETs with ETag / Last-Modified instead
+        of refetching them. Off by default.
+
+        By default each sync call runs in its own short-lived event loop. With
+        shared_loop=True, sync calls from every thread run on one background
+        loop instead, sharing a single pool of connections; prefer it for
+        thread pools making many sync calls.
+        """
         self.api_key = api_key or os.environ.get("PIG_SECRET_KEY")  # can be None for LocalMachine
         self._logger = self._setup_logger(log_level)
-        self._api_client = APIClient(self.api_key)
+        self.metrics = metrics  # set to a MetricsRegistry to record per-request timings
+        codec = codec or default_codec(os.environ.get("PIG_JSON_CODEC"))
+        self._loop_thread = LoopThread() if shared_loop else None
+        if shared_loop and transport is None:
+            transport = AiohttpTransport(persistent=True)  # the loop lives as long as the client, so its pool can too
+        self._api_client = APIClient(self.api_key, codec=codec, metrics=metrics, transport=transport, cache=cache)
+
+        self._api_base = (api_url or os.environ.get("PIG_API_URL", "https://api2.pig.dev")).rstrip("/")  # API for remote machines
+        self._proxy_base = (proxy_url or os.environ.get("PIG_PROXY_URL", "https://proxy.pig.dev")).rstrip("/")  # Proxy API for remote machines
+        self._local_base = (local_url or os.environ.get("PIGLET_LOCAL_URL", "http://localhost:3000")).rstrip("/")  # Local server for local piglet
 
-        self._api_base = os.environ.get("PIG_API_URL", "https://api2.pig.dev").rstrip("/")  # API for remote machines
-        self._proxy_base = os.environ.get("PIG_PROXY_URL", "https://proxy.pig.dev").rstrip("/")  # Proxy API for remote machines
-        self._local_base = os.environ.get("PIGLET_LOCAL_URL", "http://localhost:3000").rstrip("/")  # Local server for local piglet
+        bases = {MachineType.REMOTE: self._proxy_base, MachineType.LOCAL: self._local_base}
+        for machine_type, machine_transport in (transports or {}).items():
+            self._api_client.mount(f"{bases[machine_type]}/", machine_transport)
 
         self.machines = Machines(self)
         self.connections = Connections(self)
 
-    def _machine_url(self, machine: MachineType, path: str) -> str:
+    def _machine_base(self, machine: MachineType) -> str:
+        """Base URL, with trailing slash, for requests to a machine's Piglet"""
         if isinstance(machine, RemoteMachine):
-            return urljoin(f"{self._proxy_base}/", path)
+            return f"{self._proxy_base}/"
         else:
-            return urljoin(f"{self._local_base}/", path)
+            return f"{self._local_base}/"
+
+    def _machine_url(self, machine: MachineType, path: str) -> str:
+        return urljoin(self._machine_base(machine), path)
 
     def _api_url(self, path: str) -> str:
         """Construct full URL for a given path"""
         return urljoin(f"{self._api_base}/", path)
 
+    def map(self, fn: Callable[[Any], T], machines: Iterable[Any], workers: int = 8) -> List[T]:
+        """Call fn(machine) for each machine on a pool of worker threads, returning results in order.
+        The first exception raised by fn is re-raised here.
+
+        def setup(machine):
+            with machine.connect() as conn:
+                conn.type("hello")
+                return conn.screenshot()
+
+        frames = client.map(setup, machines, workers=16)
+        """
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pig-worker") as pool:
+            return list(pool.map(fn, machines))
+
+    @_MakeSync
+    async def close(self) -> None:
+        """Release pooled connections. Pools are per event loop, so use close.aio() from the loop that made the requests;
+        with shared_loop=True, close() releases the shared pool and stops the shared loop's thread
+        """
+        await self._api_client.close()
+        loop_thread = self._loop_thread
+        if loop_thread is not None:
+            shared = loop_thread._loop
+            if shared is not None and shared is not asyncio.get_running_loop():
+                # Called via close.aio() from another loop, so release the shared loop's pool on that loop too
+                await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._api_client.close(), shared))
+            loop_thread.stop()
+
+    def __enter__(self) -> "Client":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    async def __aenter__(self) -> "Client":
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.close.aio()
+
     def _setup_logger(self, log_level: Optional[str] = None) -> logging.Logger:
         """Setup logging for the client"""
         logger = logging.getLogger("pig")
@@ -0,0 +1,269 @@
+"""Record a client's API traffic to disk and replay it later.
+
+A trace is a zip file holding events.jsonl (one line per request, with timing,
+request and response) and blobs/<sha256> for binary bodies such as screenshots,
+stored once per distinct content.
+
+    with Recorder(client, "session.pigtrace"):
+        ...  # use client and its connections as normal
+
+    trace = Trace.load("session.pigtrace")
+    report = await replay(trace, other_client, speed=10)   # re-issue against a server
+    client._api_client = TraceAPIClient(trace)             # or serve it from memory
+"""
+
+import asyncio
+import hashlib
+import json
+import time
+import zipfile
+from collections import defaultdict, deque
+from typing import Any, Awaitable, Deque, Dict, List, Optional, Tuple
+
+from .api_client import APIError
+from .metrics import MetricsRegistry, request_tags
+
+# Request headers worth keeping; auth and client headers are never recorded
+_RECORDED_HEADERS = ("X-Machine-ID", "X-Connection-ID")
+
+
+class Trace:
+    """Recorded requests plus the binary bodies they reference"""
+
+    def __init__(self, events: Optional[List[Dict[str, Any]]] = None, blobs: Optional[Dict[str, bytes]] = None) -> None:
+        self.events = events if events is not None else []
+        self.blobs = blobs if blobs is not None else {}
+
+    def add_blob(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        self.blobs.setdefault(digest, data)
+        return digest
+
+    def save(self, path: str) -> None:
+        with zipfile.ZipFile(path, "w") as archive:
+            lines = "\n".join(json.dumps(event, separators=(",", ":")) for event in self.events)
+            archive.writestr("events.jsonl", lines, compress_type=zipfile.ZIP_DEFLATED)
+            for digest, data in self.blobs.items():
+                # Screenshots are already compressed, deflating them again only costs time
+                archive.writestr(f"blobs/{digest}", data, compress_type=zipfile.ZIP_STORED)
+
+    @classmethod
+    def load(cls, path: str) -> "Trace":
+        with zipfile.ZipFile(path) as archive:
+            text = archive.read("events.jsonl").decode()
+            events = [json.loads(line) for line in text.splitlines() if line]
+            blobs = {name[len("blobs/") :]: archive.read(name) for name in archive.namelist() if name.startswith("blobs/")}
+        return cls(events, blobs)
+
+    def response(self, event: Dict[str, Any]) -> Any:
+        """The response an event's request produced, raising its APIError if it failed"""
+        if "error" in event:
+            raise APIError(event["error"]["status"], event["error"]["message"])
+        if "blob" in event:
+            return self.blobs[event["blob"]]
+        return event.get("response")
+
+
+def _split_url(client, url: str) -> Tuple[str, str]:
+    """Split a URL into the client base it targets and a relative path"""
+    for target, base in (("api", client._api_base), ("proxy", client._proxy_base), ("local", client._local_base)):
+        if url.startswith(f"{base}/"):
+            return target, url[len(base) + 1 :]
+    return "url", url
+
+
+def _join_url(client, target: str, path: str) -> str:
+    bases = {"api": client._api_base, "proxy": client._proxy_base, "local": client._local_base}
+    return f"{bases[target]}/{path}" if target in bases else path
+
+
+class _RecordingAPIClient:
+    """Wraps an APIClient, forwarding every request and appending it to a trace"""
+
+    def __init__(self, inner, recorder: "Recorder") -> None:
+        self._inner = inner
+        self._recorder = recorder
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._inner, name)
+
+    async def _call(self, request: Awaitable, method: str, url: str, data=None, headers=None, expect_json: bool = True):
+        """Await request, the inner client's call, recording it as an event"""
+        recorder = self._recorder
+        target, path = _split_url(recorder.client, url)
+        event: Dict[str, Any] = {
+            "t": time.monotonic() - recorder.started,
+            "method": method,
+            "target": target,
+            "path": path,
+            "expect_json": expect_json,
+        }
+        if headers:
+            event["headers"] = {key: str(headers[key]) for key in _RECORDED_HEADERS if key in headers}
+        if data is not None:
+            event["data"] = data
+
+        try:
+            response = await request
+        except APIError as e:
+            event["error"] = {"status": e.status_code, "message": e.message}
+            raise
+        else:
+            if isinstance(response, (bytes, bytearray)):
+                event["blob"] = recorder.trace.add_blob(bytes(response))
+            else:
+                event["response"] = response
+            return response
+        finally:
+            event["duration"] = time.monotonic() - recorder.started - event["t"]
+            recorder.trace.events.append(event)
+
+    async def get(self, url, headers=None, expect_json=True, coalesce=True):
+        request = self._inner.get(url, headers=headers, expect_json=expect_json, coalesce=coalesce)
+        return await self._call(request, "GET", url, headers=headers, expect_json=expect_json)
+
+    async def post(self, url, data=None, headers=None, expect_json=True):
+        request = self._inner.post(url, data=data, headers=headers, expect_json=expect_json)
+        return await self._call(request, "POST", url, data=data, headers=headers, expect_json=expect_json)
+
+    async def put(self, url, data=None, headers=None, expect_json=True):
+        request = self._inner.put(url, data=data, headers=headers, expect_json=expect_json)
+        return await self._call(request, "PUT", url, data=data, headers=headers, expect_json=expect_json)
+
+    async def delete(self, url, headers=None, expect_json=True):
+        request = self._inner.delete(url, headers=headers, expect_json=expect_json)
+        return await self._call(request, "DELETE", url, headers=headers, expect_json=expect_json)
+
+
+class Recorder:
+    """Records all requests made through a client while active, saving them to path on exit"""
+
+    def __init__(self, client, path: Optional[str] = None) -> None:
+        self.client = client
+        self.path = path
+        self.trace = Trace()
+        self.started = 0.0
+        self._original = None
+
+    def start(self) -> None:
+        self.started = time.monotonic()
+        self._original = self.client._api_client
+        self.client._api_client = _RecordingAPIClient(self._original, self)
+
+    def stop(self) -> Trace:
+        self.client._api_client = self._original
+        self.trace.events.sort(key=lambda event: event["t"])
+        if self.path:
+            self.trace.save(self.path)
+        return self.trace
+
+    def __enter__(self) -> "Recorder":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.stop()
+
+    async def __aenter__(self) -> "Recorder":
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.stop()
+
+
+class TraceAPIClient:
+    """Stands in for APIClient, answering requests from a trace instead of the network.
+
+    Requests are matched to recorded ones by method and path, in recorded
+    order. With speed set, each response is delayed by its recorded
+    duration divided by speed; speed=0 answers immediately.
+    """
+
+    def __init__(self, trace: Trace, client=None, speed: float = 0) -> None:
+        self.trace = trace
+        self.speed = speed
+        self._client = client
+        self._queues: Dict[Tuple[str, str], Deque[Dict[str, Any]]] = defaultdict(deque)
+        for event in trace.events:
+            self._queues[(event["method"], event["path"])].append(event)
+
+    def _path(self, url: str) -> str:
+        if self._client is not None:
+            return _split_url(self._client, url)[1]
+        # Without a client, match on everything after the host
+        return url.split("://", 1)[-1].split("/", 1)[-1]
+
+    async def _request(self, method: str, url: str, data=None, headers=None, expect_json: bool = True):
+        queue = self._queues.get((method, self._path(url)))
+        if not queue:
+            raise APIError(404, f"No recorded response for {method} {url}")
+        event = queue.popleft() if len(queue) > 1 else queue[0]  # the last response repeats
+        if self.speed:
+            await asyncio.sleep(event.get("duration", 0) / self.speed)
+        return self.trace.response(event)
+
+    async def get(self, url, headers=None, expect_json=True, coalesce=True):
+        return await self._request("GET", url, headers=headers, expect_json=expect_json)
+
+    async def post(self, url, data=None, headers=None, expect_json=True):
+        return await self._request("POST", url, data=data, headers=headers, expect_json=expect_json)
+
+    async def put(self, url, data=None, headers=None, expect_json=True):
+        return await self._request("PUT", url, data=data, headers=headers, expect_json=expect_json)
+
+    async def delete(self, url, headers=None, expect_json=True):
+        return await self._request("DELETE", url, headers=headers, expect_json=expect_json)
+
+
+class ReplayReport:
+    """Recorded vs replayed latency for every request in a replay"""
+
+    def __init__(self) -> None:
+        self.metrics = MetricsRegistry()
+        self.mismatches: List[Dict[str, Any]] = []  # requests whose outcome differed from the recording
+        self.elapsed = 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"elapsed_s": self.elapsed, "mismatches": self.mismatches, **self.metrics.snapshot()}
+
+
+async def replay(trace: Trace, client, speed: float = 1.0) -> ReplayReport:
+    """Re-issue a trace's requests through client, keeping their original start times divided by speed.
+
+    Requests that overlapped in the recording overlap in the replay. speed=0
+    instead issues requests one after another, as fast as they complete.
+    """
+    report = ReplayReport()
+    started = time.monotonic()
+
+    async def issue(event: Dict[str, Any]) -> None:
+        url = _join_url(client, event["target"], event["path"])
+        tags = request_tags(url, event.get("headers"))
+        headers = dict(event.get("headers") or {}) or None
+        request_started = time.monotonic()
+        outcome: Any = None
+        try:
+            await client._api_client._request(event["method"], url, data=event.get("data"), headers=headers, expect_json=event["expect_json"])
+        except APIError as e:
+            outcome = e.status_code
+        except Exception as e:
+            outcome = type(e).__name__
+        report.metrics.observe("replay.duration", time.monotonic() - request_started, **tags)
+        report.metrics.observe("recorded.duration", event.get("duration", 0), **tags)
+        expected = event["error"]["status"] if "error" in event else None
+        if outcome != expected:
+            report.mismatches.append({"method": event["method"], "path": event["path"], "recorded": expected, "replayed": outcome})
+
+    tasks = []
+    for event in trace.events:
+        if not speed:
+            await issue(event)
+            continue
+        delay = started + event["t"] / speed - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.ensure_future(issue(event)))
+    await asyncio.gather(*tasks)
+    report.elapsed = time.monotonic() - started
+    return report
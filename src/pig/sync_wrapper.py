@@ -1,5 +1,6 @@
 import asyncio
-from typing import Any, Awaitable, Callable, Generic, TypeVar, overload
+import threading
+from typing import Any, Awaitable, Callable, Generic, Optional, TypeVar, overload
 
 from typing_extensions import ParamSpec
 
@@ -13,6 +14,93 @@ class AsyncContextError(Exception):
     pass
 
 
+class AsyncContextWrapper(Generic[T]):
+    """Wrapper that provides an async context manager interface"""
+
+    __slots__ = ("coro", "_obj")
+
+    def __init__(self, coro: Awaitable[T]):
+        self.coro = coro
+        self._obj = None
+
+    def __await__(self):
+        async def _await():
+            if not self._obj:
+                self._obj = await self.coro
+            return self._obj
+
+        return _await().__await__()
+
+    async def __aenter__(self):
+        if not self._obj:
+            self._obj = await self.coro
+        if hasattr(self._obj, "__aenter__"):
+            return await self._obj.__aenter__()
+        return self._obj
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if hasattr(self._obj, "__aexit__"):
+            await self._obj.__aexit__(exc_type, exc_val, exc_tb)
+
+
+class LoopThread:
+    """An event loop running in a daemon thread, shared by sync calls from any thread.
+
+    Started on first use. Keeping one long-lived loop lets pooled connections
+    be reused across sync calls and threads, where asyncio.run per call would
+    start from scratch each time.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._serve, args=(loop,), name="pig-loop", daemon=True)
+                self._thread.start()
+                self._loop = loop
+            return self._loop
+
+    @staticmethod
+    def _serve(loop: asyncio.AbstractEventLoop) -> None:
+        loop.run_forever()
+        loop.close()
+
+    def run(self, coro: Awaitable[T]) -> T:
+        """Run coro on the shared loop, blocking the calling thread until it finishes"""
+        loop = self.loop
+        thread = self._thread
+        try:
+            return asyncio.run_coroutine_threadsafe(coro, loop).result()
+        finally:
+            if self._loop is not loop and thread is not None:
+                thread.join()  # coro stopped the loop, e.g. Client.close(), so let its thread finish first
+
+    def stop(self) -> None:
+        """Stop the loop and its thread. A later call starts a new one.
+        Safe to call from a coroutine on the loop itself, which then stops once that coroutine returns
+        """
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is None:
+            return
+        loop.call_soon_threadsafe(loop.stop)
+        if thread is not threading.current_thread():
+            thread.join()
+
+
+def _loop_thread(obj: Any) -> Optional[LoopThread]:
+    """The shared loop of the Client behind obj, if it has one"""
+    client = getattr(obj, "_client", obj)
+    return getattr(client, "_loop_thread", None)
+
+
 class _MakeSync(Generic[P, T]):
     @overload
     def __get__(self, obj: None, objtype: Any) -> "_MakeSync[P, T]": ...
@@ -36,41 +124,14 @@ class _MakeSync(Generic[P, T]):
                     f"{self.async_func.__name__}.aio() instead"
                 )
             except RuntimeError:
-                # Happy path - no running loop - safe to use asyncio.run
-                return asyncio.run(aio_wrapper(*args, **kwargs))
-
-        async def aio_wrapper(*args: P.args, **kwargs: P.kwargs) -> T:
-            result = await self.async_func(obj, *args, **kwargs)
-            return result
-
-        class AsyncContextWrapper:
-            """Wrapper that provides an async context manager interface"""
-
-            def __init__(self, coro: Awaitable[T]):
-                self.coro = coro
-                self._obj = None
-
-            def __await__(self):
-                async def _await():
-                    if not self._obj:
-                        self._obj = await self.coro
-                    return self._obj
-
-                return _await().__await__()
-
-            async def __aenter__(self):
-                if not self._obj:
-                    self._obj = await self.coro
-                if hasattr(self._obj, "__aenter__"):
-                    return await self._obj.__aenter__()
-                return self._obj
-
-            async def __aexit__(self, exc_type, exc_val, exc_tb):
-                if hasattr(self._obj, "__aexit__"):
-                    await self._obj.__aexit__(exc_type, exc_val, exc_tb)
+                # Happy path - no running loop - safe to block this thread
+                loop_thread = _loop_thread(obj)
+                if loop_thread is not None:
+                    return loop_thread.run(self.async_func(obj, *args, **kwargs))
+                return asyncio.run(self.async_func(obj, *args, **kwargs))
 
         def aio(*args: P.args, **kwargs: P.kwargs) -> AsyncContextWrapper:
-            return AsyncContextWrapper(aio_wrapper(*args, **kwargs))
+            return AsyncContextWrapper(self.async_func(obj, *args, **kwargs))
 
         sync_wrapper.aio = aio
         return sync_wrapper
@@ -0,0 +1,159 @@
+import asyncio
+import time
+import weakref
+from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Callable, Dict, Mapping, Optional
+
+from aiohttp import ClientSession, ClientTimeout, TCPConnector, UnixConnector
+
+from .metrics import MetricsRegistry, trace_config
+
+TIMEOUT = 900  # 15 minute total timeout
+
+
+class TransportResponse:
+    """A fully read HTTP response"""
+
+    __slots__ = ("status", "headers", "body")
+
+    def __init__(self, status: int, headers: Mapping[str, str], body: bytes) -> None:
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    @property
+    def content_type(self) -> str:
+        return self.headers.get("Content-Type", "application/octet-stream").split(";")[0].strip()
+
+
+class Transport(ABC):
+    """Sends one HTTP request and returns the full response. Retries and decoding happen in APIClient"""
+
+    @abstractmethod
+    async def request(
+        self, method: str, url: str, body: Optional[bytes], headers: Mapping[str, str], trace_ctx: Optional[Dict[str, Any]] = None
+    ) -> TransportResponse:
+        pass
+
+    def instrument(self, metrics: MetricsRegistry) -> None:  # noqa: B027
+        """Record per-phase request timings into metrics, where the transport supports it"""
+        pass
+
+    async def close(self) -> None:  # noqa: B027
+        """Release pooled connections held for the running event loop"""
+        pass
+
+
+class _PerLoop:
+    """One pooled client per event loop, since sockets can't be shared across loops"""
+
+    def __init__(self, factory: Callable[[], Any]) -> None:
+        self._factory = factory
+        self._clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Any]" = weakref.WeakKeyDictionary()
+
+    def get(self) -> Any:
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = self._clients[loop] = self._factory()
+        return client
+
+    def pop(self) -> Optional[Any]:
+        return self._clients.pop(asyncio.get_running_loop(), None)
+
+
+class AiohttpTransport(Transport):
+    """HTTP/1.1 over aiohttp.
+
+    By default each request gets a fresh session, which is safe across the
+    short-lived event loops the sync API uses. With persistent=True a pooled
+    session is kept per event loop and reused, which suits long-lived loops
+    driving many requests; call close() from that loop when done.
+    """
+
+    def __init__(self, persistent: bool = False, unix_socket: Optional[str] = None, limit: int = 100) -> None:
+        self.persistent = persistent
+        self.unix_socket = unix_socket
+        self.limit = limit
+        self._trace_configs = []
+        self._metrics: Optional[MetricsRegistry] = None
+        self._sessions = _PerLoop(self._new_session)
+
+    def instrument(self, metrics: MetricsRegistry) -> None:
+        self._metrics = metrics
+        self._trace_configs.append(trace_config(metrics))
+
+    def _new_session(self) -> ClientSession:
+        if self.unix_socket is not None:
+            connector = UnixConnector(path=self.unix_socket, limit=self.limit)
+        else:
+            connector = TCPConnector(limit=self.limit)
+        return ClientSession(connector=connector, timeout=ClientTimeout(total=TIMEOUT), trace_configs=self._trace_configs or None)
+
+    async def _send(self, session: ClientSession, method, url, body, headers, trace_ctx) -> TransportResponse:
+        async with session.request(method, url, data=body, headers=headers, trace_request_ctx=trace_ctx) as response:
+            started = time.perf_counter()
+            data = await response.read()
+            if self._metrics is not None and trace_ctx is not None:
+                self._metrics.observe("pig.http.body", time.perf_counter() - started, **trace_ctx)
+            return TransportResponse(response.status, response.headers, data)
+
+    async def request(self, method, url, body, headers, trace_ctx=None) -> TransportResponse:
+        if self.persistent:
+            return await self._send(self._sessions.get(), method, url, body, headers, trace_ctx)
+        async with self._new_session() as session:
+            return await self._send(session, method, url, body, headers, trace_ctx)
+
+    async def close(self) -> None:
+        session = self._sessions.pop()
+        if session is not None:
+            await session.close()
+
+
+class UnixSocketTransport(AiohttpTransport):
+    """HTTP over a Unix domain socket, for a Piglet running on the same host"""
+
+    def __init__(self, path: str, persistent: bool = True) -> None:
+        super().__init__(persistent=persistent, unix_socket=path)
+
+
+class HTTPXTransport(Transport):
+    """HTTP/2 over httpx, multiplexing concurrent requests on few sockets.
+
+    Requires httpx with HTTP/2 support: pip install 'pig-python[http2]'. Keeps
+    one pooled client per event loop; call close() from that loop when done.
+    """
+
+    def __init__(self, http2: bool = True, max_connections: int = 10) -> None:
+        import httpx
+
+        self._httpx = httpx
+        self.http2 = http2
+        self.max_connections = max_connections
+        self._clients = _PerLoop(self._new_client)
+
+    def _new_client(self):
+        limits = self._httpx.Limits(max_connections=self.max_connections)
+        return self._httpx.AsyncClient(http2=self.http2, limits=limits, timeout=TIMEOUT)
+
+    async def request(self, method, url, body, headers, trace_ctx=None) -> TransportResponse:
+        response = await self._clients.get().request(method, url, content=body, headers=dict(headers))
+        return TransportResponse(response.status_code, response.headers, response.content)
+
+    async def close(self) -> None:
+        client = self._clients.pop()
+        if client is not None:
+            await client.aclose()
+
+
+Handler = Callable[[str, str, Optional[bytes], Mapping[str, str]], Awaitable[TransportResponse]]
+
+
+class InMemoryTransport(Transport):
+    """Answers requests by calling handler(method, url, body, headers) directly, with no network"""
+
+    def __init__(self, handler: Handler) -> None:
+        self.handler = handler
+
+    async def request(self, method, url, body, headers, trace_ctx=None) -> TransportResponse:
+        return await self.handler(method, url, body, headers)
@@ -0,0 +1,195 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, List, NamedTuple, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+    from PIL import Image
+except ImportError:  # optional dependency, see pig-python[vision]
+    np = None
+    Image = None
+
+# Region to search within, as (x, y, width, height) in screen pixels
+Region = Tuple[int, int, int, int]
+
+DEFAULT_SCALES = (1.0, 0.9, 1.1, 0.8, 1.25)
+DEFAULT_THRESHOLD = 0.9
+
+
+class Match(NamedTuple):
+    """A template match on a screenshot, in screen pixels"""
+
+    x: int  # center of the match, suitable for clicks
+    y: int
+    score: float  # normalized cross-correlation, -1.0 to 1.0
+    scale: float  # template scale that produced the match
+    left: int
+    top: int
+    width: int
+    height: int
+
+
+def _require_vision() -> None:
+    if np is None or Image is None:
+        raise ImportError("Template matching requires numpy and Pillow. Install them with `pip install 'pig-python[vision]'`")
+
+
+def load_image(image: Any) -> "np.ndarray":
+    """Load bytes, a file path, a PIL image or an array as a float32 grayscale array"""
+    _require_vision()
+    if isinstance(image, np.ndarray):
+        if image.ndim == 3:
+            image = image[..., :3].astype(np.float32) @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+        return np.ascontiguousarray(image, dtype=np.float32)
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        image = Image.open(io.BytesIO(bytes(image)))
+    elif isinstance(image, str):
+        image = Image.open(image)
+    return np.asarray(image.convert("L"), dtype=np.float32)
+
+
+def _image_key(image: Any) -> Optional[str]:
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        return hashlib.sha1(bytes(image)).hexdigest()
+    if isinstance(image, str):
+        # Keyed by modification time and size too, so an edited template file is reloaded
+        try:
+            stat = os.stat(image)
+        except OSError:
+            return None  # load_image reports the error
+        return f"path:{image}:{stat.st_mtime_ns}:{stat.st_size}"
+    if np is not None and isinstance(image, np.ndarray):
+        return hashlib.sha1(image.tobytes()).hexdigest() + str(image.shape)
+    return None  # PIL images aren't cheaply hashable, so skip the cache
+
+
+class _Template(NamedTuple):
+    scale: float
+    height: int
+    width: int
+    zero_mean: "np.ndarray"
+    norm: float
+
+
+class TemplateMatcher:
+    """Multi-scale normalized cross-correlation with cached template pyramids.
+    Safe to share across threads, e.g. executor threads matching for several connections
+    """
+
+    def __init__(self, cache_size: int = 64) -> None:
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+        self._pyramids: "OrderedDict[Tuple[str, Tuple[float, ...]], List[_Template]]" = OrderedDict()
+
+    def _pyramid(self, template: Any, scales: Sequence[float]) -> List[_Template]:
+        key = _image_key(template)
+        cache_key = (key, tuple(scales)) if key is not None else None
+        if cache_key is not None:
+            with self._lock:
+                pyramid = self._pyramids.get(cache_key)
+                if pyramid is not None:
+                    self._pyramids.move_to_end(cache_key)
+                    return pyramid
+
+        base = load_image(template)
+        pyramid = []
+        for scale in scales:
+            h = int(round(base.shape[0] * scale))
+            w = int(round(base.shape[1] * scale))
+            if h < 2 or w < 2:
+                continue
+            if scale == 1.0:
+                scaled = base
+            else:
+                scaled = np.asarray(Image.fromarray(base).resize((w, h), Image.BILINEAR), dtype=np.float32)
+            zero_mean = scaled - scaled.mean()
+            norm = float(np.sqrt((zero_mean * zero_mean).sum()))
+            if norm == 0:
+                continue  # flat templates match everything equally, skip
+            pyramid.append(_Template(scale, h, w, zero_mean, norm))
+
+        if cache_key is not None:
+            # Built outside the lock, so two threads may build the same pyramid; the last one is kept
+            with self._lock:
+                self._pyramids[cache_key] = pyramid
+                self._pyramids.move_to_end(cache_key)
+                while len(self._pyramids) > self._cache_size:
+                    self._pyramids.popitem(last=False)
+        return pyramid
+
+    @staticmethod
+    def _ncc(screen: "np.ndarray", integral: "np.ndarray", integral_sq: "np.ndarray", template: _Template) -> "np.ndarray":
+        """Normalized cross-correlation score for every valid placement of template on screen"""
+        sh, sw = screen.shape
+        h, w = template.height, template.width
+
+        # Cross-correlation via FFT
+        fh, fw = sh + h - 1, sw + w - 1
+        spectrum = np.fft.rfft2(screen, (fh, fw)) * np.fft.rfft2(template.zero_mean[::-1, ::-1], (fh, fw))
+        corr = np.fft.irfft2(spectrum, (fh, fw))[h - 1 : sh, w - 1 : sw]
+
+        # Windowed sums via integral images
+        n = h * w
+        window = integral[h:, w:] - integral[:-h, w:] - integral[h:, :-w] + integral[:-h, :-w]
+        window_sq = integral_sq[h:, w:] - integral_sq[:-h, w:] - integral_sq[h:, :-w] + integral_sq[:-h, :-w]
+        variance = np.maximum(window_sq - window * window / n, 0)
+
+        denominator = np.sqrt(variance) * template.norm
+        scores = np.zeros_like(corr)
+        np.divide(corr, denominator, out=scores, where=denominator > 1e-6)
+        return scores
+
+    def match(
+        self,
+        screen: Any,
+        template: Any,
+        region: Optional[Region] = None,
+        threshold: float = DEFAULT_THRESHOLD,
+        scales: Sequence[float] = DEFAULT_SCALES,
+    ) -> Optional[Match]:
+        """Find the best match for template on screen, or None if nothing scores above threshold"""
+        screen = load_image(screen)
+        offset_x, offset_y = 0, 0
+        if region is not None:
+            x, y, w, h = region
+            offset_x, offset_y = max(0, x), max(0, y)
+            screen = screen[offset_y : y + h, offset_x : x + w]
+
+        sh, sw = screen.shape
+        integral = np.zeros((sh + 1, sw + 1), dtype=np.float64)
+        integral[1:, 1:] = screen.cumsum(0).cumsum(1)
+        integral_sq = np.zeros((sh + 1, sw + 1), dtype=np.float64)
+        integral_sq[1:, 1:] = (screen.astype(np.float64) ** 2).cumsum(0).cumsum(1)
+
+        best: Optional[Match] = None
+        for tmpl in self._pyramid(template, scales):
+            if tmpl.height > sh or tmpl.width > sw:
+                continue
+            scores = self._ncc(screen, integral, integral_sq, tmpl)
+            top, left = np.unravel_index(int(np.argmax(scores)), scores.shape)
+            score = float(scores[top, left])
+            if best is None or score > best.score:
+                left, top = int(left) + offset_x, int(top) + offset_y
+                best = Match(left + tmpl.width // 2, top + tmpl.height // 2, score, tmpl.scale, left, top, tmpl.width, tmpl.height)
+
+        if best is None or best.score < threshold:
+            return None
+        return best
+
+
+# Shared across connections so template pyramids are only built once per process
+_default_matcher = TemplateMatcher()
+
+
+def match_template(
+    screen: Any,
+    template: Any,
+    region: Optional[Region] = None,
+    threshold: float = DEFAULT_THRESHOLD,
+    scales: Sequence[float] = DEFAULT_SCALES,
+) -> Optional[Match]:
+    """Find template on screen using the shared matcher"""
+    return _default_matcher.match(screen, template, region=region, threshold=threshold, scales=scales)
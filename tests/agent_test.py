@@ -0,0 +1,462 @@
+# Drives the example agents in examples/chat against the local fake server, with a scripted model in place of a real one
+
+import asyncio
+import base64
+import io
+import itertools
+import os
+import sys
+import tempfile
+import threading
+
+import pytest
+
+from pig import AiohttpTransport, Client, MetricsRegistry
+from pig.fake_server import FakePig
+
+pytest.importorskip("langgraph")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "examples", "chat"))
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage  # noqa: E402
+
+from agent import PigAgent  # noqa: E402
+from agent.scheduler import AgentScheduler  # noqa: E402
+from agent.state import ScreenshotRetention, message_update, tool_call_ran, track_tool_calls  # noqa: E402
+from agent.trajectory import TrajectoryCache  # noqa: E402
+
+
+class ScriptedLLM:
+    """Plays back a fixed list of turns, each a list of (tool name, args) calls. Once they run out it answers "done" """
+
+    def __init__(self, turns):
+        self.turns = list(turns)
+        self.seen = []  # the messages of every call
+        self._ids = itertools.count()
+
+    def bind_tools(self, tools):
+        return self
+
+    async def ainvoke(self, messages, *args, **kwargs):
+        self.seen.append(list(messages))
+        calls = self.turns.pop(0) if self.turns else []
+        tool_calls = [{"name": name, "args": tool_args, "id": f"call_{next(self._ids)}"} for name, tool_args in calls]
+        return AIMessage(content="" if tool_calls else "done", tool_calls=tool_calls)
+
+
+def run_agent(fake, llm, task="open excel", client=None, **options):
+    options.setdefault("prefetch_delay", None)
+    options.setdefault("letterbox", False)  # resizing needs Pillow
+
+    async def run():
+        async with PigAgent(client or fake.client(), fake.add_machine(), llm, **options) as agent:
+            return await agent.graph.ainvoke({"messages": [HumanMessage(task)]})
+
+    return asyncio.run(run())
+
+
+def full_screenshots(messages):
+    # Thumbnails are JPEGs, full-size screenshots PNGs
+    return [message for message in messages if isinstance(message, HumanMessage) and "data:image/png" in str(message.content)]
+
+
+def test_prune_window():
+    retention = ScreenshotRetention(keep_last=2)
+    assert [m.id for m in retention.prune([], ["a"])] == []
+    assert [m.id for m in retention.prune(["a"], ["b", "c"])] == ["a"]
+    assert [m.id for m in retention.prune(["a", "b", "c"], ["d"])] == ["b"]
+
+
+def test_prune_within_turn():
+    # A turn taking more screenshots than keep_last prunes its own extras too
+    retention = ScreenshotRetention(keep_last=1)
+    assert [m.id for m in retention.prune([], ["a", "b", "c"])] == ["a", "b"]
+    assert [m.id for m in retention.prune(["a", "b", "c"], ["d"])] == ["c"]
+    assert all(isinstance(m.content, str) for m in retention.prune(["a", "b", "c", "d"], ["e", "f"]))
+
+
+def test_screenshot_history_pruned():
+    llm = ScriptedLLM([[("screenshot", {})] * 3, [("screenshot", {})], [("screenshot", {})]])
+    with FakePig() as fake:
+        state = run_agent(fake, llm, screenshot_retention=ScreenshotRetention(keep_last=1))
+    assert len(state["screenshot_ids"]) == 5
+    assert len(full_screenshots(state["messages"])) == 1
+    assert full_screenshots(state["messages"])[0].id == state["screenshot_ids"][-1]
+
+
+def test_screenshot_thumbnails():
+    pytest.importorskip("PIL")
+    llm = ScriptedLLM([[("screenshot", {})]] * 3)
+    with FakePig() as fake:
+        state = run_agent(fake, llm, screenshot_retention=ScreenshotRetention(keep_last=1, thumbnail_width=64))
+    images = [message.content for message in state["messages"] if isinstance(message, HumanMessage) and isinstance(message.content, list)]
+    assert len(images) == 3
+    assert [image[-1]["image_url"]["url"].split(";")[0] for image in images] == ["data:image/jpeg", "data:image/jpeg", "data:image/png"]
+    # The model saw each screenshot at full size before it was pruned
+    assert all(len(full_screenshots(messages)) == 1 for messages in llm.seen[1:])
+
+
+def test_screenshots_kept_without_limit():
+    llm = ScriptedLLM([[("screenshot", {})]] * 4)
+    with FakePig() as fake:
+        state = run_agent(fake, llm, screenshot_retention=ScreenshotRetention(keep_last=None))
+    assert len(full_screenshots(state["messages"])) == 4
+
+
+def test_track_tool_calls():
+    calls = AIMessage(content="", tool_calls=[{"name": "screenshot", "args": {}, "id": "a"}, {"name": "screenshot", "args": {}, "id": "b"}])
+    pending = track_tool_calls([], [HumanMessage("hi"), calls])
+    assert pending == ["a", "b"]
+    assert track_tool_calls(pending, [ToolMessage(tool_call_id="a", content="ok")]) == ["b"]
+    assert track_tool_calls(["b"], [ToolMessage(tool_call_id="zzz", content="stray")]) == ["b"]
+    assert message_update(calls, screenshot_ids=["x"]) == {"messages": [calls], "pending_tool_calls": [calls], "screenshot_ids": ["x"]}
+
+
+def test_unanswered_tool_calls_resolved():
+    # e.g. a run cut short by the recursion limit, picked up again from its state
+    calls = AIMessage(content="", tool_calls=[{"name": "left_click", "args": {}, "id": "a"}])
+    state = {"messages": [HumanMessage("open excel"), calls], "pending_tool_calls": ["a"]}
+    llm = ScriptedLLM([])
+    agent = PigAgent(Client(api_key="SK-test"), "M-1", llm)
+    update = asyncio.run(agent.call_model(state))
+    ignored, response = update["messages"]
+    assert ignored.tool_call_id == "a" and ignored.content == "tool call ignored"
+    assert llm.seen[0][-1] is ignored
+    assert not track_tool_calls(state["pending_tool_calls"], update["pending_tool_calls"])
+
+
+def test_tool_calls_grouped_and_skipped():
+    llm = ScriptedLLM(
+        [
+            [("screenshot", {}), ("cursor_position", {}), ("left_click", {"x": 10, "y": 20}), ("type_text", {"text": "hi"}), ("cursor_position", {})],
+            [("key_press", {"combo": "a"}), ("no_such_tool", {}), ("type_text", {"text": "never"})],
+        ]
+    )
+    reads = {"active": 0, "peak": 0}
+
+    def counted(handler):
+        async def read(**kwargs):
+            reads["active"] += 1
+            reads["peak"] = max(reads["peak"], reads["active"])
+            try:
+                await asyncio.sleep(0.05)
+                return await handler(**kwargs)
+            finally:
+                reads["active"] -= 1
+
+        return read
+
+    async def run(fake):
+        async with PigAgent(fake.client(), fake.add_machine(), llm, prefetch_delay=None, letterbox=False) as agent:
+            for name in ("screenshot", "cursor_position"):
+                agent.tool_handlers[name] = counted(agent.tool_handlers[name])
+            return await agent.graph.ainvoke({"messages": [HumanMessage("open excel")]})
+
+    with FakePig() as fake:
+        state = asyncio.run(run(fake))
+        assert fake.requests["POST /computer/input/keyboard/type"] == 1  # "never" was skipped
+    assert reads["peak"] == 2  # neighbouring reads ran together
+    results = [message for message in state["messages"] if isinstance(message, ToolMessage)]
+    turns = [message for message in state["messages"] if isinstance(message, AIMessage) and message.tool_calls]
+    assert [result.tool_call_id for result in results] == [call["id"] for turn in turns for call in turn.tool_calls]
+    assert results[4].content == "Mouse coordinates: x=10, y=20"  # read after the actions before it
+    assert [result.content.split(":")[0] for result in results[5:]] == ["Pressed key combo", "Error", "Skipped"]
+    assert [tool_call_ran(result) for result in results[5:]] == [True, True, False]
+
+
+def test_agents_share_a_loop():
+    class SlowLLM(ScriptedLLM):
+        active = peak = 0
+
+        async def ainvoke(self, messages, *args, **kwargs):
+            SlowLLM.active += 1
+            SlowLLM.peak = max(SlowLLM.peak, SlowLLM.active)
+            try:
+                await asyncio.sleep(0.1)
+                return await super().ainvoke(messages, *args, **kwargs)
+            finally:
+                SlowLLM.active -= 1
+
+    async def run(fake):
+        client = fake.client()
+        agents = [PigAgent(client, fake.add_machine(), SlowLLM([[("left_click", {"x": 1, "y": 2})]]), prefetch_delay=None) for _ in range(3)]
+        try:
+            return await asyncio.gather(*[agent.graph.ainvoke({"messages": [HumanMessage("open excel")]}) for agent in agents])
+        finally:
+            await asyncio.gather(*[agent.close() for agent in agents])
+
+    with FakePig() as fake:
+        states = asyncio.run(run(fake))
+        assert not fake.connections
+    assert [state["messages"][-1].content for state in states] == ["done"] * 3
+    assert SlowLLM.peak == 3  # each agent's model calls overlapped the others'
+
+
+def test_screenshot_prefetched():
+    llm = ScriptedLLM([[("left_click", {"x": 1, "y": 2})], [("screenshot", {})]])
+    with FakePig() as fake:
+        metrics = MetricsRegistry()
+        run_agent(fake, llm, client=fake.client(metrics=metrics), prefetch_delay=0, prefetch_max_age=5)
+        assert fake.requests["GET /computer/display/screenshot"] == 1
+    assert metrics.counter("pig.screenshot.prefetch", outcome="hit") == 1
+
+
+def test_prefetched_screenshot_expires():
+    class SlowLLM(ScriptedLLM):
+        async def ainvoke(self, messages, *args, **kwargs):
+            await asyncio.sleep(0.2)
+            return await super().ainvoke(messages, *args, **kwargs)
+
+    llm = SlowLLM([[("left_click", {"x": 1, "y": 2})], [("screenshot", {})]])
+    with FakePig() as fake:
+        metrics = MetricsRegistry()
+        run_agent(fake, llm, client=fake.client(metrics=metrics), prefetch_delay=0, prefetch_max_age=0.05)
+        assert fake.requests["GET /computer/display/screenshot"] == 2
+    assert metrics.counter("pig.screenshot.prefetch", outcome="stale") == 1
+
+
+def test_prefetched_screenshot_discarded_after_input():
+    llm = ScriptedLLM([[("left_click", {"x": 1, "y": 2})], [("key_press", {"combo": "a"}), ("screenshot", {})]])
+    with FakePig() as fake:
+        metrics = MetricsRegistry()
+        state = run_agent(fake, llm, client=fake.client(metrics=metrics), prefetch_delay=0, prefetch_max_age=5)
+    assert metrics.counter("pig.screenshot.prefetch", outcome="hit") == 0
+    assert len(full_screenshots(state["messages"])) == 1
+
+
+def test_last_action_observed():
+    llm = ScriptedLLM([[("key_press", {"combo": "a"}), ("left_click", {"x": 1, "y": 2})]])
+    with FakePig() as fake:
+        state = run_agent(fake, llm, observe_actions=0, prefetch_delay=0)
+        # The observed screenshot stands in for a prefetched one
+        assert fake.requests["GET /computer/display/screenshot"] == 1
+    tool_messages = [m for m in state["messages"] if isinstance(m, ToolMessage)]
+    assert not tool_messages[0].content.endswith("follows")
+    assert tool_messages[1].content.endswith("A screenshot taken after this action follows")
+    assert state["messages"].index(tool_messages[1]) + 1 == state["messages"].index(full_screenshots(state["messages"])[0])
+
+
+def test_connection_reused_across_tasks():
+    with FakePig() as fake:
+        machine_id = fake.add_machine()
+
+        async def run():
+            llm = ScriptedLLM([[("key_press", {"combo": "a"})], [], [("key_press", {"combo": "b"})]])
+            async with PigAgent(fake.client(), machine_id, llm, prefetch_delay=None, letterbox=False) as agent:
+                for task in ["open excel", "open word"]:
+                    await agent.graph.ainvoke({"messages": [HumanMessage(task)]})
+                assert len(fake.connections) == 1
+
+        asyncio.run(run())
+        assert fake.requests["POST /machines/{id}/connections"] == 1
+        assert not fake.connections
+
+
+def test_reconnect_after_lost_connection():
+    class MachineBlip(ScriptedLLM):
+        # The machine is gone while the first action runs, and back for the second
+        async def ainvoke(self, messages, *args, **kwargs):
+            if len(self.seen) == 0:
+                self.machines = dict(fake.machines)
+                fake.machines.clear()
+            elif len(self.seen) == 1:
+                fake.machines.update(self.machines)
+            return await super().ainvoke(messages, *args, **kwargs)
+
+    llm = MachineBlip([[("key_press", {"combo": "a"})], [("key_press", {"combo": "b"})]])
+    with FakePig() as fake:
+        state = run_agent(fake, llm)
+        assert fake.requests["POST /machines/{id}/connections"] == 2
+    results = [message.content for message in state["messages"] if isinstance(message, ToolMessage)]
+    assert results[0].startswith("Error:")
+    assert results[1] == "Pressed key combo: b"
+
+
+def screenshot_size(message):
+    from PIL import Image
+
+    url = message.content[-1]["image_url"]["url"]
+    return Image.open(io.BytesIO(base64.b64decode(url.split(",", 1)[1]))).size
+
+
+def test_coordinates_letterboxed():
+    pytest.importorskip("PIL")
+    llm = ScriptedLLM([[("left_click", {"x": 256, "y": 192}), ("screenshot", {})]])
+    with FakePig(width=1920, height=1080) as fake:
+        state = run_agent(fake, llm, letterbox=True)
+        # 1920x1080 scales by 8/15 to 1024x576, centered with 96 pixels of padding above and below
+        assert list(fake.cursors.values()) == [(480, 180)]
+    assert screenshot_size(full_screenshots(state["messages"])[0]) == (1024, 768)
+
+
+def test_coordinates_stretched():
+    pytest.importorskip("PIL")
+    llm = ScriptedLLM([[("left_click", {"x": 256, "y": 192}), ("screenshot", {})]])
+    with FakePig(width=1920, height=1080) as fake:
+        state = run_agent(fake, llm, letterbox=False)
+        assert list(fake.cursors.values()) == [(480, 270)]
+    assert screenshot_size(full_screenshots(state["messages"])[0]) == (1920, 1080)
+
+
+def test_reconnect_failure_answers_tool_calls():
+    class MachineLost(ScriptedLLM):
+        async def ainvoke(self, messages, *args, **kwargs):
+            if len(self.seen) == 1:
+                fake.machines.clear()
+                fake.connections.clear()
+            return await super().ainvoke(messages, *args, **kwargs)
+
+    llm = MachineLost([[("key_press", {"combo": "a"})], [("key_press", {"combo": "b"})], [("key_press", {"combo": "c"}), ("screenshot", {})]])
+    with FakePig() as fake:
+        state = run_agent(fake, llm)
+    results = [message.content for message in state["messages"] if isinstance(message, ToolMessage)]
+    assert results[0] == "Pressed key combo: a"
+    assert results[1].startswith("Error:")
+    assert all(result.startswith("Not run: couldn't connect") for result in results[2:4])
+    assert state["messages"][-1].content == "done"
+    assert not state["pending_tool_calls"]
+
+
+def test_trajectory_replayed():
+    cache = TrajectoryCache()
+    with FakePig() as fake:
+        run_agent(fake, ScriptedLLM([[("left_click", {"x": 100, "y": 100})], [("screenshot", {})]]), trajectory_cache=cache)
+        steps = next(iter(cache.trajectories.values()))[0]["steps"]
+        assert [step.get("name") for step in steps] == ["left_click", None]
+
+        # A fresh machine shows the same starting screen, so the model is only asked to check the result
+        llm = ScriptedLLM([])
+        state = run_agent(fake, llm, trajectory_cache=cache, checkpoint_timeout=0)
+    assert len(llm.seen) == 1
+    assert llm.seen[0][-1].content.startswith("All 2 steps of an earlier run of this task were replayed, which ended with: done")
+    assert not any(isinstance(message, ToolMessage) for message in state["messages"])
+
+
+def test_trajectory_mismatch_hands_over():
+    cache = TrajectoryCache()
+    with FakePig() as fake:
+        run_agent(fake, ScriptedLLM([[("left_click", {"x": 100, "y": 100})], [("screenshot", {})]]), trajectory_cache=cache)
+        trajectory = next(iter(cache.trajectories.values()))[0]
+        trajectory["steps"][-1]["checkpoint"] = "sha256:elsewhere"
+
+        llm = ScriptedLLM([])
+        run_agent(fake, llm, trajectory_cache=cache, checkpoint_timeout=0)
+    assert llm.seen[0][-1].content.startswith("1 steps of an earlier run of this task were replayed, then the screen stopped matching")
+
+
+def test_trajectory_not_recorded():
+    cache = TrajectoryCache()
+    with FakePig() as fake:
+        run_agent(fake, ScriptedLLM([[("key_press", {"combo": "a"})]]), trajectory_cache=cache, task_succeeded=lambda task, answer: False)
+        run_agent(fake, ScriptedLLM([[("key_press", {"combo": "a"}), ("no_such_tool", {})]]), trajectory_cache=cache)
+        run_agent(fake, ScriptedLLM([[("screenshot", {})]]), trajectory_cache=cache)  # nothing to replay
+    assert not cache.trajectories
+
+
+def test_trajectory_saved_off_loop():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = TrajectoryCache(path=os.path.join(tmp, "trajectories.json"))
+        threads = []
+        write = cache._write
+        cache._write = lambda *args: threads.append(threading.current_thread()) or write(*args)
+        asyncio.run(cache.arecord("Open  Excel", "sha256:abc", [{"name": "key_press", "args": {"combo": "super"}}], "done"))
+        assert threads and threads[0] is not threading.main_thread()
+        assert TrajectoryCache(path=cache.path).lookup("open excel", "sha256:abc")["result"] == "done"
+
+
+def scheduler_options(fake):
+    return {"api_key": "SK-fake", "api_url": fake.url, "proxy_url": fake.url, "local_url": fake.url}
+
+
+def test_scheduler_timeouts():
+    class TaskLLM(ScriptedLLM):
+        async def ainvoke(self, messages, *args, **kwargs):
+            task = messages[1].content
+            if task == "slow":
+                await asyncio.sleep(10)
+            if task == "inner timeout":
+                raise asyncio.TimeoutError()  # e.g. an HTTP timeout, not the scheduler's
+            return AIMessage(content=f"finished {task}")
+
+    with FakePig() as fake:
+        machine_ids = [fake.add_machine() for _ in range(2)]
+        scheduler = AgentScheduler(machine_ids, TaskLLM([]), "system", task_timeout=0.5, client_options=scheduler_options(fake))
+        report = asyncio.run(scheduler.run(["slow", "inner timeout", "quick"]))
+    slow, inner, quick = report.results
+    assert slow.timed_out and not slow.ok
+    assert not inner.timed_out and isinstance(inner.error, asyncio.TimeoutError)
+    assert quick.ok and quick.answer == "finished quick"
+    assert report.summary()["failures"] == {"timeout": 1, "TimeoutError": 1}
+    assert report.metrics.counter("agent.tasks", outcome="timeout") == 1
+
+
+def test_scheduler_bounds_and_counts():
+    class TaskLLM:
+        # Each task presses a key, calls a tool that fails and has a third call skipped, then finishes
+        def __init__(self):
+            self.in_flight = self.peak = 0
+
+        def bind_tools(self, tools):
+            return self
+
+        async def ainvoke(self, messages, *args, **kwargs):
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+            await asyncio.sleep(0.05)
+            self.in_flight -= 1
+            if any(isinstance(message, AIMessage) for message in messages):
+                return AIMessage(content=f"finished {messages[1].content}")
+            calls = [("key_press", {"combo": "a"}), ("no_such_tool", {}), ("key_press", {"combo": "b"})]
+            return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": f"call_{n}"} for n, (name, args) in enumerate(calls)])
+
+    class CountingTransport(AiohttpTransport):
+        in_flight = peak = 0
+
+        async def request(self, *args, **kwargs):
+            CountingTransport.in_flight += 1
+            CountingTransport.peak = max(CountingTransport.peak, CountingTransport.in_flight)
+            try:
+                return await super().request(*args, **kwargs)
+            finally:
+                CountingTransport.in_flight -= 1
+
+    llm = TaskLLM()
+    with FakePig(latency=0.01) as fake:
+        machine_ids = [fake.add_machine() for _ in range(2)]
+        options = dict(scheduler_options(fake), transport=CountingTransport(persistent=True))
+        scheduler = AgentScheduler(machine_ids, llm, "system", api_concurrency=1, client_options=options, agent_options={"prefetch_delay": None})
+        report = asyncio.run(scheduler.run([f"task {n}" for n in range(5)]))
+        assert fake.requests["POST /machines/{id}/connections"] == 2  # one per machine, kept between tasks
+        assert not fake.connections
+    assert [result.answer for result in report.results] == [f"finished task {n}" for n in range(5)]
+    assert llm.peak == 2  # one task per machine at a time
+    assert CountingTransport.peak == 1
+    assert all(result.steps == 2 and result.model_calls == 2 for result in report.results)
+    steps, model_calls = report.counts.histogram("agent.steps"), report.counts.histogram("agent.model_calls")
+    assert (steps.count, steps.mean, model_calls.mean) == (5, 2, 2)
+
+
+if __name__ == "__main__":
+    test_prune_window()
+    test_prune_within_turn()
+    test_screenshot_history_pruned()
+    test_screenshot_thumbnails()
+    test_screenshots_kept_without_limit()
+    test_track_tool_calls()
+    test_unanswered_tool_calls_resolved()
+    test_tool_calls_grouped_and_skipped()
+    test_agents_share_a_loop()
+    test_screenshot_prefetched()
+    test_prefetched_screenshot_expires()
+    test_prefetched_screenshot_discarded_after_input()
+    test_last_action_observed()
+    test_connection_reused_across_tasks()
+    test_reconnect_after_lost_connection()
+    test_coordinates_letterboxed()
+    test_coordinates_stretched()
+    test_reconnect_failure_answers_tool_calls()
+    test_trajectory_replayed()
+    test_trajectory_mismatch_hands_over()
+    test_trajectory_not_recorded()
+    test_trajectory_saved_off_loop()
+    test_scheduler_timeouts()
+    test_scheduler_bounds_and_counts()
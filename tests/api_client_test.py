@@ -0,0 +1,235 @@
+# Offline tests for APIClient against a throwaway local aiohttp server
+
+import asyncio
+import os
+import tempfile
+
+from aiohttp import web
+
+from pig import APIClient, APIError, InMemoryTransport, MetricsRegistry, ResponseCache, TransportResponse
+from pig.codec import JSONCodec, default_codec
+from pig.metrics import Histogram, request_tags
+
+
+async def serve(app):
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+def make_app():
+    async def echo(request):
+        return web.json_response({"content_type": request.content_type, "body": await request.json()})
+
+    async def error(request):
+        return web.json_response({"detail": "machine not found"}, status=404)
+
+    async def empty(request):
+        return web.Response(status=200)
+
+    attempts = {"count": 0}
+
+    async def flaky(request):
+        attempts["count"] += 1
+        if attempts["count"] < 3:
+            return web.Response(status=503)
+        return web.json_response({"x": 1, "y": 2})
+
+    app = web.Application()
+    app.router.add_get("/computer/input/mouse/position", flaky)
+    app.router.add_post("/echo", echo)
+    app.router.add_get("/error", error)
+    app.router.add_get("/empty", empty)
+    return app
+
+
+def test_codecs_roundtrip():
+    payload = {"button": "left", "down": True, "x": 1, "y": None, "text": "héllo"}
+    for name in ("json", "orjson", "msgspec"):
+        try:
+            codec = default_codec(name)
+        except ImportError:
+            continue
+        assert codec.loads(codec.dumps(payload)) == payload
+    assert isinstance(default_codec(), JSONCodec)
+
+
+def test_request_paths():
+    async def run():
+        runner, base = await serve(make_app())
+        try:
+            client = APIClient("SK-test", codec=JSONCodec())
+            response = await client.post(f"{base}/echo", data={"x": 1, "y": 2})
+            assert response == {"content_type": "application/json", "body": {"x": 1, "y": 2}}
+
+            assert await client.get(f"{base}/empty") == {}
+
+            try:
+                await client.get(f"{base}/error")
+                raise AssertionError("expected APIError")
+            except APIError as e:
+                assert e.status_code == 404
+                assert e.message == "machine not found"
+        finally:
+            await runner.cleanup()
+
+    asyncio.run(run())
+
+
+def test_request_tags():
+    assert request_tags("https://api2.pig.dev/machines/M-6HNGAXR-NT0B3VA-P33Q0R2/connections") == {
+        "route": "machines/{id}/connections",
+        "machine_id": "M-6HNGAXR-NT0B3VA-P33Q0R2",
+    }
+    assert request_tags("http://localhost:3000/computer/display/screenshot", {"X-Machine-ID": "local"})["machine_id"] == "local"
+
+
+def test_histogram_percentiles():
+    histogram = Histogram()
+    for i in range(1, 101):
+        histogram.observe(i / 1000)
+    assert histogram.count == 100
+    assert abs(histogram.percentile(50) - 0.050) < 0.01
+    assert abs(histogram.percentile(99) - 0.099) < 0.02
+    assert histogram.percentile(100) == 0.1
+
+
+def test_trace_metrics():
+    async def run():
+        runner, base = await serve(make_app())
+        try:
+            metrics = MetricsRegistry()
+            observed = []
+            metrics.add_listener(lambda name, value, tags: observed.append(name))
+            client = APIClient("SK-test", metrics=metrics)
+            headers = {"X-Machine-ID": "M-TEST", "X-Connection-ID": "C-TEST"}
+            assert await client.get(f"{base}/computer/input/mouse/position", headers=headers) == {"x": 1, "y": 2}
+
+            tags = {"route": "computer/input/mouse/position", "machine_id": "M-TEST"}
+            assert metrics.counter("pig.http.retries", **tags) == 2
+            assert metrics.counter("pig.http.responses", status="503") == 2
+            assert metrics.counter("pig.http.responses", status="200", **tags) == 1
+            for phase in ("connect", "send", "ttfb", "body", "total"):
+                assert metrics.histogram(f"pig.http.{phase}", **tags).count >= 1, phase
+            assert "pig.http.total" in observed
+            assert metrics.snapshot()["histograms"]
+        finally:
+            await runner.cleanup()
+
+    asyncio.run(run())
+
+
+def test_concurrent_gets_coalesce():
+    calls = []
+
+    async def handler(method, url, body, headers):
+        calls.append(url)
+        await asyncio.sleep(0.05)
+        if url.endswith("/missing"):
+            return TransportResponse(404, {"Content-Type": "application/json"}, b'{"detail": "gone"}')
+        return TransportResponse(200, {"Content-Type": "application/json"}, b'{"width": 1024, "height": 768}')
+
+    async def run():
+        metrics = MetricsRegistry()
+        client = APIClient("SK-test", metrics=metrics, transport=InMemoryTransport(handler))
+        url = "http://pig.invalid/computer/display/dimensions"
+        results = await asyncio.gather(*[client.get(url) for _ in range(10)])
+        assert results == [{"width": 1024, "height": 768}] * 10
+        assert len(calls) == 1
+        assert metrics.counter("pig.http.coalesced") == 9
+
+        # Errors are shared too, and nothing lingers once the request completes
+        errors = await asyncio.gather(*[client.get("http://pig.invalid/missing") for _ in range(3)], return_exceptions=True)
+        assert all(isinstance(e, APIError) and e.status_code == 404 for e in errors)
+        assert len(calls) == 2
+
+        # Different headers or opting out each get their own request
+        await asyncio.gather(client.get(url, headers={"X-Machine-ID": "M-1"}), client.get(url, headers={"X-Machine-ID": "M-2"}))
+        await asyncio.gather(*[client.get(url, coalesce=False) for _ in range(3)])
+        assert len(calls) == 7
+
+    asyncio.run(run())
+
+
+def test_coalescing_after_writes():
+    state = {"value": "Running"}
+
+    async def handler(method, url, body, headers):
+        if method == "POST":
+            state["value"] = "Stopped"
+        body = ('{"state": "%s", "tags": []}' % state["value"]).encode()
+        await asyncio.sleep(0.05)  # reads the state when the request arrives, responds later
+        return TransportResponse(200, {"Content-Type": "application/json"}, body)
+
+    async def run():
+        client = APIClient("SK-test", transport=InMemoryTransport(handler))
+        url = "http://pig.invalid/machines/M-1"
+
+        # Callers each get their own copy, so one mutating its result doesn't touch the others
+        first, second = await asyncio.gather(client.get(url), client.get(url))
+        first["tags"].append("mine")
+        assert second == {"state": "Running", "tags": []}
+
+        # A read after a write doesn't join a GET that started before it
+        before = asyncio.ensure_future(client.get(url))
+        await asyncio.sleep(0.01)  # the GET has reached the server
+        await client.post("http://pig.invalid/machines/M-1/stop")
+        after = await client.get(url)
+        assert (await before)["state"] == "Running"
+        assert after["state"] == "Stopped"
+
+    asyncio.run(run())
+
+
+def test_conditional_requests():
+    sent = []
+    machine = {"body": b'{"id": "M-1", "state": "Running"}', "etag": '"v1"'}
+
+    async def handler(method, url, body, headers):
+        sent.append(headers.get("If-None-Match"))
+        if headers.get("If-None-Match") == machine["etag"]:
+            return TransportResponse(304, {"ETag": machine["etag"]}, b"")
+        return TransportResponse(200, {"Content-Type": "application/json", "ETag": machine["etag"]}, machine["body"])
+
+    async def run(cache):
+        metrics = MetricsRegistry()
+        client = APIClient("SK-test", metrics=metrics, transport=InMemoryTransport(handler), cache=cache)
+        url = "http://pig.invalid/machines/M-1"
+        first = await client.get(url)
+        first["state"] = "mutated"  # callers get a fresh decode, never the cached object
+        assert await client.get(url) == {"id": "M-1", "state": "Running"}
+        machine.update(body=b'{"id": "M-1", "state": "Stopped"}', etag='"v2"')
+        assert await client.get(url) == {"id": "M-1", "state": "Stopped"}
+        return metrics.counter("pig.http.not_modified")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "pig", "responses.json")
+        cache = ResponseCache(path=path)
+        assert asyncio.run(run(cache)) == 1
+        assert sent == [None, '"v1"', '"v1"']
+        cache.save()
+
+        # A fresh process picks up where the last left off
+        sent.clear()
+        machine.update(body=b'{"id": "M-1", "state": "Running"}', etag='"v1"')
+        assert len(ResponseCache(path=path)) == 1
+        assert asyncio.run(run(ResponseCache(path=path))) == 1
+        assert sent[0] == '"v2"'
+
+        with open(path, "w") as f:
+            f.write("not json")
+        assert len(ResponseCache(path=path)) == 0
+
+
+if __name__ == "__main__":
+    test_codecs_roundtrip()
+    test_request_paths()
+    test_request_tags()
+    test_histogram_percentiles()
+    test_trace_metrics()
+    test_concurrent_gets_coalesce()
+    test_coalescing_after_writes()
+    test_conditional_requests()
@@ -0,0 +1,87 @@
+import asyncio
+
+from click.testing import CliRunner
+
+from pig import APIError, _MakeSync
+from pig import cli as pig_cli
+from pig.bench import parse_mix, run_bench
+from pig.fake_server import FakePig
+from pig.machines import Machines
+
+
+def test_parse_mix():
+    assert parse_mix("mouse_move=4,screenshot") == {"mouse_move": 4.0, "screenshot": 1.0}
+    try:
+        parse_mix("teleport=1")
+        raise AssertionError("expected ValueError")
+    except ValueError:
+        pass
+
+
+def test_run_bench():
+    async def run():
+        async with FakePig(error_rate=0.1, seed=2) as fake:
+            client = fake.client()
+            machines = [await client.machines.get.aio(fake.add_machine()) for _ in range(3)]
+            connections = [await client.connections.create.aio(machine) for machine in machines]
+            report = await run_bench(connections, parse_mix("mouse_move=3,cursor_position=1,screenshot=1"), rate=200, duration=0.5, seed=2)
+
+            assert 90 <= report.total <= 100
+            assert set(report.latencies) == {"mouse_move", "cursor_position", "screenshot"}
+            assert not report.errors  # 503s are retried
+            assert report.as_dict()["actions"]["mouse_move"]["p99"] is not None
+            assert "actions/s" in report.format()
+
+    asyncio.run(run())
+
+
+def test_run_bench_validates():
+    for kwargs in ({"connections": []}, {"rate": 0}, {"concurrency": 0}):
+        options = {"connections": [object()], "mix": {"key": 1.0}, "rate": 10, "duration": 1, **kwargs}
+        try:
+            asyncio.run(run_bench(**options))
+            raise AssertionError(f"expected ValueError for {kwargs}")
+        except ValueError:
+            pass
+
+
+class FlakyMachines(Machines):
+    """Fails every second create, after the first has succeeded"""
+
+    calls = 0
+
+    @_MakeSync
+    async def create(self, image_id=None):
+        FlakyMachines.calls += 1
+        if FlakyMachines.calls % 2 == 0:
+            await asyncio.sleep(0.05)
+            raise APIError(500, "no capacity")
+        return await super().create.aio(image_id)
+
+
+def test_bench_cleans_up_after_partial_failure():
+    with FakePig() as fake:
+        client = fake.client()
+        client.machines = FlakyMachines(client)
+        original, pig_cli.client = pig_cli.client, client
+        try:
+            runner = CliRunner()
+            result = runner.invoke(pig_cli.cli, ["bench", "-n", "3", "--duration", "0.1", "-y"])
+            assert isinstance(result.exception, APIError)
+            # The two Machines that were created are deleted
+            assert [machine["state"] for machine in fake.machines.values()] == ["Terminated", "Terminated"]
+            assert not fake.connections
+
+            result = runner.invoke(pig_cli.cli, ["bench", "-n", "0", "-y"])
+            assert result.exit_code == 2 and "--machines" in result.output
+            result = runner.invoke(pig_cli.cli, ["bench", "--rate", "0", "-y"])
+            assert result.exit_code == 2 and "--rate" in result.output
+        finally:
+            pig_cli.client = original
+
+
+if __name__ == "__main__":
+    test_parse_mix()
+    test_run_bench()
+    test_run_bench_validates()
+    test_bench_cleans_up_after_partial_failure()
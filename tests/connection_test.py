@@ -0,0 +1,130 @@
+# Offline tests for Connection behavior, with the API client swapped for a recorder
+
+import asyncio
+import struct
+import zlib
+
+from pig import Client, Connection
+
+
+def png_bytes(width, height):
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + struct.pack(">I", len(ihdr)) + b"IHDR" + ihdr + struct.pack(">I", zlib.crc32(b"IHDR" + ihdr))
+
+
+class RecordingAPIClient:
+    def __init__(self, screenshot=None):
+        self.calls = []
+        self._screenshot = screenshot
+
+    async def get(self, url, headers=None, expect_json=True, coalesce=True):
+        self.calls.append(("GET", url))
+        if url.endswith("computer/display/dimensions"):
+            return {"width": 1280, "height": 720}
+        if url.endswith("computer/display/screenshot"):
+            return self._screenshot
+        return {}
+
+    async def post(self, url, data=None, headers=None, expect_json=True):
+        self.calls.append(("POST", url))
+        return {}
+
+
+def make_connection(api_client):
+    client = Client(api_key="SK-test")
+    client._api_client = api_client
+    return Connection(client.machines.local(), None)
+
+
+def test_dimensions_cached():
+    api = RecordingAPIClient()
+    conn = make_connection(api)
+    assert conn.dimensions() == (1280, 720)
+    assert conn.width() == 1280
+    assert conn.height() == 720
+    assert len(api.calls) == 1
+
+    conn.dimensions(refresh=True)
+    assert len(api.calls) == 2
+    conn.invalidate_dimensions()
+    conn.width()
+    assert len(api.calls) == 3
+
+
+def test_dimensions_from_screenshot():
+    api = RecordingAPIClient(screenshot=png_bytes(1920, 1080))
+    conn = make_connection(api)
+    conn.screenshot()
+    assert conn.dimensions() == (1920, 1080)
+    assert api.calls == [("GET", "http://localhost:3000/computer/display/screenshot")]
+
+
+def test_prefetched_screenshot_reused():
+    api = RecordingAPIClient(screenshot=png_bytes(1920, 1080))
+    conn = make_connection(api)
+
+    async def run():
+        conn.prefetch_screenshot()
+        await asyncio.sleep(0)
+        return await conn.screenshot.aio(max_age=2)
+
+    assert asyncio.run(run()) == png_bytes(1920, 1080)
+    assert api.calls == [("GET", "http://localhost:3000/computer/display/screenshot")]
+
+
+def test_prefetched_screenshot_discarded_after_input():
+    api = RecordingAPIClient(screenshot=png_bytes(1920, 1080))
+    conn = make_connection(api)
+
+    async def run():
+        conn.prefetch_screenshot()
+        await asyncio.sleep(0)
+        await conn.key.aio("a")
+        await conn.screenshot.aio(max_age=2)
+
+    asyncio.run(run())
+    assert [method for method, _ in api.calls] == ["GET", "POST", "GET"]
+
+
+def test_prefetched_screenshot_expires():
+    api = RecordingAPIClient(screenshot=png_bytes(1920, 1080))
+    conn = make_connection(api)
+
+    async def run():
+        conn.prefetch_screenshot()
+        await asyncio.sleep(0.05)
+        await conn.screenshot.aio(max_age=0.01)
+
+    asyncio.run(run())
+    assert len(api.calls) == 2
+
+
+def test_screenshot_fresh_by_default():
+    api = RecordingAPIClient(screenshot=png_bytes(1920, 1080))
+    conn = make_connection(api)
+
+    async def run():
+        conn.prefetch_screenshot(delay=0.05)
+        await asyncio.sleep(0)
+        await conn.screenshot.aio()
+
+    asyncio.run(run())
+    assert len(api.calls) == 1  # the prefetch was cancelled before capturing
+
+
+def test_observe_after_input():
+    api = RecordingAPIClient(screenshot=png_bytes(1920, 1080))
+    conn = make_connection(api)
+    assert conn.key("a") is None
+    assert conn.left_click(10, 20, observe=True, settle=0) == png_bytes(1920, 1080)
+    assert [method for method, _ in api.calls] == ["POST", "POST", "POST", "POST", "GET"]
+
+
+if __name__ == "__main__":
+    test_dimensions_cached()
+    test_dimensions_from_screenshot()
+    test_prefetched_screenshot_reused()
+    test_prefetched_screenshot_discarded_after_input()
+    test_prefetched_screenshot_expires()
+    test_screenshot_fresh_by_default()
+    test_observe_after_input()
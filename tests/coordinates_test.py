@@ -0,0 +1,53 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+from pig import CoordinateMapper
+
+
+def test_stretch_round_trip():
+    mapper = CoordinateMapper((1920, 1080), (1024, 768), letterbox=False)
+    assert mapper.to_screen(512, 384) == (960, 540)
+    assert mapper.to_model(960, 540) == (512, 384)
+    assert mapper.to_screen(None, None) == (None, None)
+    # Clamped to the screen
+    assert mapper.to_screen(2000, -5) == (1919, 0)
+
+
+def test_letterbox():
+    # 16:9 into 4:3 scales by 1024/1920 and pads top and bottom
+    mapper = CoordinateMapper((1920, 1080), (1024, 768))
+    assert mapper.content_box == (0, 96, 1024, 576)
+    assert mapper.to_model(0, 0) == (0, 96)
+    assert mapper.to_model(1919, 1079) == (1023, 671)
+    assert mapper.to_screen(512, 384) == (960, 540)
+    # Points in the padding land on the nearest screen edge
+    assert mapper.to_screen(512, 10) == (960, 0)
+
+
+def test_batch_matches_scalar():
+    mapper = CoordinateMapper((1366, 768), (1280, 800))
+    points = [(0, 0), (683, 384), (1365, 767), (100, 700)]
+    model = mapper.to_model_points(points)
+    assert model == [mapper.to_model(x, y) for x, y in points]
+    array = mapper.to_model_points(np.array(points))
+    assert array.tolist() == [list(p) for p in model]
+    assert mapper.to_screen_points(array).tolist() == [list(p) for p in mapper.to_screen_points(model)]
+
+
+def test_resize_screenshot():
+    buf = io.BytesIO()
+    Image.new("RGB", (1920, 1080), (255, 255, 255)).save(buf, format="PNG")
+    mapper = CoordinateMapper((1920, 1080), (1024, 768))
+    image = Image.open(io.BytesIO(mapper.resize_screenshot(buf.getvalue())))
+    assert image.size == (1024, 768)
+    assert image.getpixel((512, 50)) == (0, 0, 0)  # padding
+    assert image.getpixel((512, 384)) == (255, 255, 255)
+
+
+if __name__ == "__main__":
+    test_stretch_round_trip()
+    test_letterbox()
+    test_batch_matches_scalar()
+    test_resize_screenshot()
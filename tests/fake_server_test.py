@@ -0,0 +1,122 @@
+# Exercises the SDK end to end against the local fake server, no pig.dev access needed
+
+import asyncio
+import os
+import tempfile
+
+from pig import APIError, MetricsRegistry, ResponseCache
+from pig.fake_server import FakePig
+
+
+def test_sync_lifecycle():
+    with FakePig() as fake:
+        client = fake.client()
+        vm = client.machines.create()
+        assert vm.id in fake.machines
+        with vm.connect() as conn:
+            assert conn.id in fake.connections
+            conn.type("Hello, World!")
+            conn.key("ctrl+c")
+            conn.left_click(100, 100)
+            assert conn.cursor_position() == (100, 100)
+            conn.left_click_drag(200, 200)
+            assert conn.cursor_position() == (200, 200)
+            assert conn.dimensions() == (1024, 768)
+            assert conn.screenshot().startswith(b"\x89PNG")
+        assert not fake.connections
+
+        vm.stop()
+        assert fake.machines[vm.id]["state"] == "Stopped"
+        client.machines.delete(vm.id)
+        try:
+            vm.start()
+            raise AssertionError("terminated machine should not start")
+        except APIError as e:
+            assert e.status_code == 400
+
+
+def test_local_machine():
+    with FakePig() as fake:
+        with fake.client().machines.local().connect() as conn:
+            conn.mouse_move(x=10, y=20)
+            assert conn.cursor_position() == (10, 20)
+        assert fake.requests["POST /computer/input/mouse/move"] == 1
+
+
+def test_async_with_injected_errors():
+    async def run():
+        # 503s are retried by the SDK, so every call should still succeed
+        async with FakePig(error_rate=0.3, latency=0.001, seed=1) as fake:
+            client = fake.client()
+            async with client.machines.temporary.aio() as vm:
+                async with vm.connect.aio() as conn:
+                    await asyncio.gather(*[conn.mouse_move.aio(x=i, y=i) for i in range(20)])
+            assert fake.machines[vm.id]["state"] == "Terminated"
+
+    asyncio.run(run())
+
+
+def test_connection_reset():
+    async def run():
+        async with FakePig(reset_rate=1.0) as fake:
+            try:
+                await fake.client().machines.create.aio()
+                raise AssertionError("expected a dropped connection")
+            except APIError:
+                raise
+            except Exception:
+                pass
+
+    asyncio.run(run())
+
+
+def test_etag_revalidation():
+    with FakePig() as fake:
+        machine_id = fake.add_machine()
+        metrics = MetricsRegistry()
+        assert fake.client()._api_client.cache is None  # only on when asked for
+        client = fake.client(metrics=metrics, cache=ResponseCache())
+        url = client._api_url("machines")
+        assert len(client._api_client.cache) == 0
+        for _ in range(3):
+            assert [m["id"] for m in asyncio.run(client._api_client.get(url))] == [machine_id]
+        assert metrics.counter("pig.http.not_modified", route="machines") == 2
+
+        client.machines.get(machine_id).stop()
+        machines = asyncio.run(client._api_client.get(url))
+        assert machines[0]["state"] == "Stopped"
+        assert metrics.counter("pig.http.not_modified", route="machines") == 2
+
+
+def test_persistent_cache():
+    with FakePig() as fake, tempfile.TemporaryDirectory() as tmp:
+        fake.add_machine()
+        path = os.path.join(tmp, "responses.json")
+        client = fake.client(cache=ResponseCache(path=path))
+        # An empty cache is falsy, and must still be the one the client uses
+        assert client._api_client.cache.path == path
+        asyncio.run(client._api_client.get(client._api_url("machines")))
+        client._api_client.cache.save()
+        assert os.path.exists(path)
+        assert len(ResponseCache(path=path)) == 1
+
+
+def test_start_failure_raises():
+    with FakePig() as fake:
+        try:
+            with FakePig(port=fake.port):
+                pass
+        except OSError:
+            pass
+        else:
+            raise AssertionError("binding a port in use should raise")
+
+
+if __name__ == "__main__":
+    test_sync_lifecycle()
+    test_local_machine()
+    test_async_with_injected_errors()
+    test_connection_reset()
+    test_etag_revalidation()
+    test_persistent_cache()
+    test_start_failure_raises()
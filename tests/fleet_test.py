@@ -0,0 +1,94 @@
+# Multi-process fleet runs against the local fake server
+
+import asyncio
+import pickle
+import queue
+import threading
+
+from pig.fake_server import FakePig
+from pig.fleet import FleetReport, FleetRunner, run_fleet
+
+
+async def drive(client, machine_id):
+    if machine_id == "M-MISSING":
+        await client.machines.get.aio(machine_id)
+    machine = await client.machines.get.aio(machine_id, fetch=False)
+    async with machine.connect.aio() as conn:
+        await conn.mouse_move.aio(3, 4)
+        return await conn.cursor_position.aio()
+
+
+async def hang(client, _):
+    async with client.machines.temporary.aio() as vm:
+        async with vm.connect.aio():
+            await asyncio.sleep(60)
+
+
+def options(fake):
+    return {"api_key": "SK-fake", "api_url": fake.url, "proxy_url": fake.url, "local_url": fake.url}
+
+
+def test_run_fleet():
+    with FakePig() as fake:
+        machine_ids = [fake.add_machine() for _ in range(6)] + ["M-MISSING"]
+        seen = []
+        report = FleetRunner(drive, machine_ids, processes=2, concurrency=2, client_options=options(fake)).run(
+            on_result=lambda index, value, error: seen.append(index)
+        )
+        assert report.results[:6] == [(3, 4)] * 6
+        assert list(report.errors) == [6] and report.errors[6].status_code == 404
+        assert sorted(seen) == list(range(7))
+        assert not report.unfinished and not report.stopped
+        assert report.metrics.histogram("pig.fleet.task").count == 7
+        assert report.metrics.histogram("pig.fleet.task", worker="1").count == 3
+        assert report.metrics.counter("pig.http.responses", status="200") >= 12
+        assert not fake.connections
+
+
+def test_graceful_stop():
+    with FakePig() as fake:
+        runner = FleetRunner(hang, range(4), processes=2, client_options=options(fake), shutdown_timeout=10)
+        threading.Timer(3, runner.stop).start()
+        report = runner.run()
+        assert report.stopped
+        assert report.unfinished == [0, 1, 2, 3]
+        # Cancelled tasks still left their async with blocks, deleting connections and temporary machines
+        assert len(fake.machines) == 4
+        assert all(machine["state"] == "Terminated" for machine in fake.machines.values())
+        assert not fake.connections
+
+
+def test_empty_fleet():
+    assert run_fleet(drive, []).ok
+
+
+def test_results_sent_just_before_exit():
+    class LateQueue:
+        # Messages that land in the pipe just as the parent's get times out
+        def __init__(self, messages):
+            self.messages = [pickle.dumps(message) for message in messages]
+
+        def get(self, timeout=None):
+            raise queue.Empty
+
+        def get_nowait(self):
+            if not self.messages:
+                raise queue.Empty
+            return self.messages.pop(0)
+
+    class Exited:
+        def is_alive(self):
+            return False
+
+    runner = FleetRunner(drive, ["M-1", "M-2"], processes=2)
+    report = FleetReport(2)
+    messages = [("result", 0, 0, (3, 4)), ("done", 0, None, None), ("result", 1, 1, (5, 6)), ("done", 1, None, None)]
+    runner._collect(report, LateQueue(messages), [Exited(), Exited()], None)
+    assert report.results == [(3, 4), (5, 6)] and report.ok
+
+
+if __name__ == "__main__":
+    test_run_fleet()
+    test_graceful_stop()
+    test_empty_fleet()
+    test_results_sent_just_before_exit()
@@ -0,0 +1,69 @@
+# Broadcasting actions across many connections, against the local fake server
+
+import asyncio
+
+from pig import ConnectionGroup, GroupError
+from pig.fake_server import FakePig
+
+
+def test_broadcast_actions():
+    async def run():
+        async with FakePig(latency=0.01) as fake:
+            client = fake.client()
+            machines = [await client.machines.create.aio() for _ in range(8)]
+            connections = await asyncio.gather(*[client.connections.create.aio(machine) for machine in machines])
+            async with ConnectionGroup(connections, concurrency=4) as group:
+                result = await group.left_click.aio(40, 50)
+                assert result.ok and len(result) == 8
+                assert all(fake.cursors[machine.id] == (40, 50) for machine in machines)
+
+                result = await group.batch.aio([("mouse_move", 5, 6), ("type", "hi"), ("cursor_position",)])
+                assert [steps[-1] for _, steps in result] == [(5, 6)] * 8
+
+                frames = await group.screenshot_all.aio()
+                assert all(frame.startswith(b"\x89PNG") for _, frame in frames)
+            assert not fake.connections
+
+    asyncio.run(run())
+
+
+def test_errors_and_stragglers():
+    async def run():
+        async with FakePig() as fake:
+            client = fake.client()
+            connections = [await client.connections.create.aio(await client.machines.create.aio()) for _ in range(4)]
+            slow, broken = connections[0], connections[1]
+            fake.machines.pop(broken.machine.id)  # requests for it now 404
+
+            async def action(conn):
+                if conn is slow:
+                    await asyncio.sleep(10)
+                return await conn.cursor_position.aio()
+
+            result = await ConnectionGroup(connections, timeout=0.5).run.aio(action)
+            assert result.stragglers == [slow]
+            assert set(result.errors) == {slow, broken}
+            assert result.succeeded == connections[2:]
+            assert [value for _, value in result] == [None, None, (0, 0), (0, 0)]
+            try:
+                result.raise_for_errors()
+                raise AssertionError("expected GroupError")
+            except GroupError as e:
+                assert len(e.errors) == 2
+
+    asyncio.run(run())
+
+
+def test_sync_group():
+    with FakePig() as fake:
+        client = fake.client()
+        connections = [client.connections.create(client.machines.create()) for _ in range(3)]
+        group = ConnectionGroup(connections)
+        group.mouse_move(7, 8).raise_for_errors()
+        assert [position for _, position in group.run(lambda conn: conn.cursor_position.aio())] == [(7, 8)] * 3
+
+
+if __name__ == "__main__":
+    test_broadcast_actions()
+    test_errors_and_stragglers()
+    test_sync_group()
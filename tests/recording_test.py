@@ -0,0 +1,89 @@
+import asyncio
+import os
+import tempfile
+
+from pig.fake_server import FakePig
+from pig.recording import Recorder, Trace, TraceAPIClient, replay
+
+
+def record_session(fake, path):
+    client = fake.client()
+    machine_id = fake.add_machine()
+    with Recorder(client, path) as recorder:
+        machine = client.machines.get(machine_id)
+        with machine.connect() as conn:
+            conn.mouse_move(10, 20)
+            conn.type("hello")
+            assert conn.cursor_position() == (10, 20)
+            conn.screenshot()
+            conn.screenshot()
+    return machine_id, recorder.trace
+
+
+def test_record_and_load():
+    with FakePig() as fake, tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "session.pigtrace")
+        machine_id, recorded = record_session(fake, path)
+
+        trace = Trace.load(path)
+        methods = [(event["method"], event["path"]) for event in trace.events]
+        assert methods[0] == ("GET", f"machines/{machine_id}")
+        assert ("POST", "computer/input/mouse/move") in methods
+        assert methods[-1][0] == "DELETE"
+        assert len(trace.blobs) == 1  # identical screenshots stored once
+        assert trace.events == recorded.events
+        assert all("Authorization" not in event.get("headers", {}) for event in trace.events)
+
+
+def test_in_memory_replay():
+    with FakePig() as fake, tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "session.pigtrace")
+        machine_id, _ = record_session(fake, path)
+        trace = Trace.load(path)
+
+    # The server is gone, responses now come from the trace
+    client = FakePig().client()
+    client._api_client = TraceAPIClient(trace, client)
+    machine = client.machines.get(machine_id)
+    with machine.connect() as conn:
+        assert conn.cursor_position() == (10, 20)
+        assert conn.screenshot().startswith(b"\x89PNG")
+
+
+def test_replay_against_server():
+    with FakePig() as fake:
+        machine_id, trace = record_session(fake, None)
+
+    async def run():
+        async with FakePig() as fake:
+            fake.add_machine(machine_id=machine_id)
+            report = await replay(trace, fake.client(), speed=100)
+            assert not report.mismatches
+            assert report.metrics.histogram("replay.duration").count == len(trace.events)
+            assert fake.cursors[machine_id] == (10, 20)
+
+            report = await replay(trace, fake.client(), speed=0)
+            assert not report.mismatches
+
+    asyncio.run(run())
+
+
+def test_recording_keeps_coalescing():
+    async def run():
+        async with FakePig() as fake:
+            client = fake.client()
+            machine_id = fake.add_machine()
+            with Recorder(client) as recorder:
+                await asyncio.gather(*[client.machines.get.aio(machine_id) for _ in range(5)])
+            assert fake.requests["GET /machines/{id}"] == 1
+            assert sum(event["path"] == f"machines/{machine_id}" for event in recorder.trace.events) == 5
+            await client.close.aio()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_record_and_load()
+    test_in_memory_replay()
+    test_replay_against_server()
+    test_recording_keeps_coalescing()
@@ -0,0 +1,74 @@
+# Sync API use from many threads at once, against the local fake server
+
+import threading
+
+from pig.fake_server import FakePig
+
+
+def drive(machine):
+    with machine.connect() as conn:
+        for i in range(5):
+            conn.mouse_move(i, i)
+        return conn.cursor_position(), threading.current_thread().name
+
+
+def test_shared_loop_map():
+    with FakePig() as fake:
+        client = fake.client(shared_loop=True)
+        machines = [client.machines.get(fake.add_machine()) for _ in range(12)]
+        results = client.map(drive, machines, workers=4)
+        assert [position for position, _ in results] == [(4, 4)] * 12
+        assert len({thread for _, thread in results}) > 1
+
+        # Every sync call ran on the one shared loop, reusing pooled sockets
+        loop = client._loop_thread.loop
+        assert not loop.is_closed() and loop.is_running()
+        sessions = client._api_client.transport._sessions._clients
+        assert list(sessions) == [loop]
+        assert fake.requests["POST /computer/input/mouse/move"] == 60
+        client.close()
+
+
+def test_map_without_shared_loop():
+    with FakePig() as fake:
+        client = fake.client()
+        assert client._loop_thread is None
+        machines = [client.machines.get(fake.add_machine()) for _ in range(4)]
+        assert [position for position, _ in client.map(drive, machines, workers=4)] == [(4, 4)] * 4
+
+
+def test_map_raises():
+    with FakePig() as fake:
+        client = fake.client(shared_loop=True)
+        try:
+            client.map(lambda machine_id: client.machines.get(machine_id), ["M-MISSING"], workers=2)
+            raise AssertionError("expected APIError")
+        except Exception as e:
+            assert getattr(e, "status_code", None) == 404
+        finally:
+            client.close()
+
+
+def test_close_stops_shared_loop():
+    with FakePig() as fake:
+        client = fake.client(shared_loop=True)
+        client.machines.get(fake.add_machine())
+        thread = client._loop_thread._thread
+        assert thread.name == "pig-loop" and thread.is_alive()
+        client.close()
+        assert not thread.is_alive()
+
+        # Closing via the context manager, after sync calls from several threads
+        with fake.client(shared_loop=True) as client:
+            machines = [client.machines.get(fake.add_machine()) for _ in range(3)]
+            client.map(drive, machines, workers=3)
+            thread = client._loop_thread._thread
+        assert not thread.is_alive()
+        assert client._loop_thread._thread is None
+
+
+if __name__ == "__main__":
+    test_shared_loop_map()
+    test_map_without_shared_loop()
+    test_map_raises()
+    test_close_stops_shared_loop()
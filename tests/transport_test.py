@@ -0,0 +1,79 @@
+import asyncio
+import os
+import tempfile
+
+import pytest
+from aiohttp import web
+
+from pig import Client, HTTPXTransport, InMemoryTransport, MachineType, TransportResponse, UnixSocketTransport
+from pig.fake_server import FakePig
+
+
+def test_in_memory_transport_per_machine_type():
+    seen = []
+
+    async def handler(method, url, body, headers):
+        seen.append((method, url, headers["Authorization"]))
+        return TransportResponse(200, {"Content-Type": "application/json"}, b'{"x": 7, "y": 8}')
+
+    client = Client(api_key="SK-test", local_url="http://piglet.invalid", transports={MachineType.LOCAL: InMemoryTransport(handler)})
+    with client.machines.local().connect() as conn:
+        assert conn.cursor_position() == (7, 8)
+    assert seen == [("GET", "http://piglet.invalid/computer/input/mouse/position", "Bearer SK-test")]
+
+
+def test_retries_apply_to_every_transport():
+    statuses = [503, 503, 200]
+
+    async def handler(method, url, body, headers):
+        return TransportResponse(statuses.pop(0), {"Content-Type": "application/json"}, b'{"width": 1, "height": 2}')
+
+    client = Client(api_key="SK-test", transport=InMemoryTransport(handler))
+    with client.machines.local().connect() as conn:
+        assert conn.dimensions() == (1, 2)
+    assert not statuses
+
+
+def test_httpx_transport():
+    pytest.importorskip("httpx")
+
+    async def run():
+        async with FakePig() as fake:
+            client = fake.client(transport=HTTPXTransport())
+            machine = await client.machines.create.aio()
+            async with machine.connect.aio() as conn:
+                await asyncio.gather(*[conn.mouse_move.aio(i, i) for i in range(10)])
+                # The moves were concurrent, so any of them may have landed last
+                assert await conn.cursor_position.aio() in {(i, i) for i in range(10)}
+                await conn.mouse_move.aio(42, 24)
+                assert await conn.cursor_position.aio() == (42, 24)
+            await client.close.aio()
+
+    asyncio.run(run())
+
+
+def test_unix_socket_transport():
+    async def run():
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "piglet.sock")
+            fake = FakePig()
+            runner = web.AppRunner(fake.app())
+            await runner.setup()
+            await web.UnixSite(runner, path).start()
+            try:
+                client = Client(api_key="SK-test", transports={MachineType.LOCAL: UnixSocketTransport(path)})
+                async with client.machines.local().connect() as conn:
+                    await conn.mouse_move.aio(3, 4)
+                    assert await conn.cursor_position.aio() == (3, 4)
+                await client.close.aio()
+            finally:
+                await runner.cleanup()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_in_memory_transport_per_machine_type()
+    test_retries_apply_to_every_transport()
+    test_httpx_transport()
+    test_unix_socket_transport()
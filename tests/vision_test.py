@@ -0,0 +1,102 @@
+import io
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from pig.vision import TemplateMatcher, match_template
+
+np = pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+
+
+def synthetic_screen(w=400, h=300, seed=0):
+    rng = np.random.default_rng(seed)
+    return (rng.random((h, w)) * 255).astype(np.float32)
+
+
+def to_png(array):
+    buf = io.BytesIO()
+    Image.fromarray(array.astype(np.uint8)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def test_exact_match():
+    screen = synthetic_screen()
+    template = screen[120:150, 200:260].copy()
+    match = match_template(to_png(screen), to_png(template))
+    assert match is not None
+    assert (match.left, match.top) == (200, 120)
+    assert (match.x, match.y) == (230, 135)
+    assert match.score > 0.99
+
+
+def test_region_and_threshold():
+    screen = synthetic_screen()
+    template = screen[20:50, 30:70].copy()
+    # Outside the region, so nothing should score above threshold
+    assert match_template(screen, template, region=(200, 150, 200, 150)) is None
+    match = match_template(screen, template, region=(10, 10, 100, 100))
+    assert match is not None and (match.left, match.top) == (30, 20)
+
+
+def test_multi_scale():
+    base = Image.fromarray(synthetic_screen(60, 40, seed=1).astype(np.uint8)).resize((240, 160), Image.BILINEAR)
+    screen = np.zeros((300, 400), dtype=np.float32)
+    screen[50:210, 100:340] = np.asarray(base, dtype=np.float32)
+    template = np.asarray(base.resize((192, 128), Image.BILINEAR), dtype=np.float32)
+    match = match_template(screen, template, threshold=0.8, scales=(1.0, 1.25))
+    assert match is not None
+    assert match.scale == 1.25
+    assert abs(match.left - 100) <= 2 and abs(match.top - 50) <= 2
+
+
+def test_pyramid_cache():
+    matcher = TemplateMatcher(cache_size=1)
+    screen = synthetic_screen()
+    template = to_png(screen[0:20, 0:20])
+    matcher.match(screen, template)
+    pyramid = next(iter(matcher._pyramids.values()))
+    matcher.match(screen, template)
+    assert next(iter(matcher._pyramids.values())) is pyramid
+    matcher.match(screen, to_png(screen[20:40, 20:40]))
+    assert len(matcher._pyramids) == 1
+
+
+def test_template_file_changed():
+    matcher = TemplateMatcher()
+    screen = synthetic_screen()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "button.png")
+        with open(path, "wb") as f:
+            f.write(to_png(screen[0:20, 0:30]))
+        assert (matcher.match(screen, path).left, matcher.match(screen, path).top) == (0, 0)
+        with open(path, "wb") as f:
+            f.write(to_png(screen[100:125, 200:240]))
+        os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 10**9))  # coarse filesystem clocks may not tick between writes
+        assert (matcher.match(screen, path).left, matcher.match(screen, path).top) == (200, 100)
+
+
+def test_shared_matcher_across_threads():
+    matcher = TemplateMatcher(cache_size=2)
+    screen = synthetic_screen()
+    corners = [(top, left) for top in (0, 100, 200) for left in (0, 150, 300)]
+    templates = [to_png(screen[top : top + 30, left : left + 40]) for top, left in corners]
+
+    def find(i):
+        return matcher.match(screen, templates[i % len(templates)])
+
+    with ThreadPoolExecutor(8) as pool:
+        matches = list(pool.map(find, range(64)))
+    assert [(m.top, m.left) for m in matches] == [corners[i % len(corners)] for i in range(64)]
+    assert len(matcher._pyramids) <= 2
+
+
+if __name__ == "__main__":
+    test_exact_match()
+    test_region_and_threshold()
+    test_multi_scale()
+    test_pyramid_cache()
+    test_template_file_changed()
+    test_shared_matcher_across_threads()